@@ -15,24 +15,16 @@ import logging
 import traceback
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
-from logging.handlers import RotatingFileHandler
 from fake_useragent import UserAgent
 
-# Configure logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
+from bot_rate_limit import polite_get, fetch_concurrently, get_host_limiter
+from bot_pipeline import run_pipeline
+from bot_seen import SeenAsins
+from bot_cards import extract_card_details, card_is_complete
+from bot_logging import setup_bot_logger
 
-logger = logging.getLogger('amazon_bot')
-logger.setLevel(logging.INFO)
-
-file_handler = RotatingFileHandler('logs/amazon_bot.log', maxBytes=10240, backupCount=5)
-file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(file_handler)
-
-stream_handler = logging.StreamHandler(sys.stdout)
-stream_handler.setLevel(logging.INFO)
-stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(stream_handler)
+# Configure logging: JSON lines to a rotating file, written off-thread (see bot_logging.py)
+logger = setup_bot_logger('amazon_bot', 'logs/amazon_bot.log')
 
 # Initialize user agent generator
 ua = UserAgent()
@@ -46,6 +38,9 @@ BOT_PASSWORD = os.environ.get('BOT_PASSWORD', 'StrongBotPassword123!')  # Set vi
 MAX_PRODUCTS_TO_ADD = 10
 MIN_DISCOUNT_PERCENT = 10  # Minimum 10% discount
 
+# SQLite file holding the ASINs the bot has already seen (see bot_seen.py)
+BOT_SEEN_DB = os.environ.get('BOT_SEEN_DB', 'instance/bot_seen.db')
+
 def get_random_headers():
     """Generate random headers to avoid bot detection"""
     return {
@@ -92,103 +87,122 @@ def ensure_bot_user_exists():
             logger.error(f"Failed to create bot user: {str(e)}")
             raise
 
-def find_amazon_deals():
-    """
-    Find top Amazon.sa deals by scraping Amazon deals pages
-    Returns a list of product URLs with good discounts
-    """
-    deal_pages = [
-        'https://www.amazon.sa/-/en/deals-and-promotions/b/?ie=UTF8&node=15195542031',
-        'https://www.amazon.sa/-/en/gp/goldbox',
-        'https://www.amazon.sa/-/ar/deals-and-promotions/b/?ie=UTF8&node=15195542031',
-        'https://www.amazon.sa/-/ar/gp/goldbox'
-    ]
+DEAL_PAGES = [
+    'https://www.amazon.sa/-/en/deals-and-promotions/b/?ie=UTF8&node=15195542031',
+    'https://www.amazon.sa/-/en/gp/goldbox',
+    'https://www.amazon.sa/-/ar/deals-and-promotions/b/?ie=UTF8&node=15195542031',
+    'https://www.amazon.sa/-/ar/gp/goldbox'
+]
+
+def fetch_deal_page(url):
+    """Fetch one deal page under the amazon.sa rate limit"""
+    response = polite_get(url, headers=get_random_headers(), timeout=15)
+    response.raise_for_status()
+    return response.text
+
+def parse_deal_page(html):
+    """Candidate dicts (url plus card details) for every deal card at or above MIN_DISCOUNT_PERCENT"""
+    soup = BeautifulSoup(html, 'lxml')
+    found = []
     
-    product_links = []
+    # Look for deal cards/items with discount info
+    deal_elements = soup.select('.a-carousel-card, .octopus-dlp-asin-card, .dealCard, .dealContainer')
     
-    for deal_page in deal_pages:
+    for deal in deal_elements:
         try:
-            logger.info(f"Checking deal page: {deal_page}")
-            headers = get_random_headers()
-            response = requests.get(deal_page, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'lxml')
+            candidate = extract_card_details(deal)
             
-            # Look for deal cards/items with discount info
-            deal_elements = soup.select('.a-carousel-card, .octopus-dlp-asin-card, .dealCard, .dealContainer')
-            
-            for deal in deal_elements:
-                try:
-                    # Try to find discount percentage
-                    discount_elements = deal.select('span.a-color-secondary span.a-text-bold, .dealPriceText .savingsPercentage')
-                    
-                    discount_percent = 0
-                    for discount_el in discount_elements:
-                        discount_text = discount_el.text.strip()
-                        if '%' in discount_text:
-                            try:
-                                # Extract just the number
-                                discount_percent = float(discount_text.replace('%', '').replace('-', '').replace('(', '').replace(')', '').strip())
-                                break
-                            except ValueError:
-                                continue
+            # If discount is 10% or greater
+            if (candidate['discount_percent'] or 0) >= MIN_DISCOUNT_PERCENT:
+                # Find the product link
+                link_element = deal.select_one('a.a-link-normal')
+                if link_element and 'href' in link_element.attrs:
+                    href = link_element['href']
                     
-                    # If discount is 10% or greater
-                    if discount_percent >= MIN_DISCOUNT_PERCENT:
-                        # Find the product link
-                        link_element = deal.select_one('a.a-link-normal')
-                        if link_element and 'href' in link_element.attrs:
-                            href = link_element['href']
-                            
-                            # Make sure it's a full URL
-                            if href.startswith('/'):
-                                href = f"https://www.amazon.sa{href}"
-                                
-                            # Clean up the URL to get the basic product link
-                            # Remove ref parameters
-                            if '?' in href:
-                                href = href.split('?')[0]
-                                
-                            # Only keep unique product URLs
-                            if href not in product_links:
-                                logger.info(f"Found product with {discount_percent}% discount: {href}")
-                                product_links.append(href)
-                except Exception as product_error:
-                    logger.error(f"Error processing a product: {str(product_error)}")
-                    continue
+                    # Make sure it's a full URL
+                    if href.startswith('/'):
+                        href = f"https://www.amazon.sa{href}"
+                        
+                    # Clean up the URL to get the basic product link
+                    # Remove ref parameters
+                    if '?' in href:
+                        href = href.split('?')[0]
                     
-            # Add a delay between pages to avoid being flagged
-            time.sleep(random.uniform(3, 5))
-            
-        except Exception as e:
-            logger.error(f"Error scraping deal page {deal_page}: {str(e)}")
+                    candidate['url'] = href
+                    found.append(candidate)
+        except Exception as product_error:
+            logger.error(f"Error processing a product: {str(product_error)}")
             continue
+    return found
+
+def iter_amazon_deals():
+    """
+    Find top Amazon.sa deals by scraping Amazon deals pages
+    Yields a candidate dict per unique product as soon as the page it is on arrives
+    """
+    seen = set()
     
-    return product_links
+    # Deal pages are fetched concurrently; the host rate limiter keeps the pace polite
+    for deal_page, html, error in fetch_concurrently(DEAL_PAGES, fetch_deal_page):
+        if error:
+            logger.error(f"Error scraping deal page {deal_page}: {str(error)}")
+            continue
+        logger.info(f"Checked deal page: {deal_page}")
+        for candidate in parse_deal_page(html):
+            # Only keep unique product URLs
+            if candidate['url'] not in seen:
+                seen.add(candidate['url'])
+                logger.info(f"Found product with {candidate['discount_percent']}% discount: {candidate['url']}")
+                yield candidate
 
-def add_product_to_system(bot_user, product_url):
-    """Add a product to the tracking system for the bot user"""
+def find_amazon_deals():
+    """
+    Find top Amazon.sa deals by scraping Amazon deals pages
+    Returns a list of product URLs with good discounts
+    """
+    return [candidate['url'] for candidate in iter_amazon_deals()]
+
+def validate_product(candidate, seen=None):
+    """
+    Product data to insert for a discovery candidate, or None if it should be skipped
+    Deal-card data is used as is; the product page is only fetched when the card is incomplete
+    Failed fetches are remembered in seen (a SeenAsins) when given
+    """
     import trackers
-    from app import app, db
-    from app.models import Product
     
-    logger.info(f"Adding product: {product_url}")
+    product_url = candidate['url']
+    if card_is_complete(candidate):
+        return dict(candidate, source='card')
     
-    with app.app_context():
-        try:
+    # trackers shares the host rate limit with the other fetch workers
+    get_host_limiter(product_url).acquire()
+    product_data = trackers.fetch_product_data(product_url)
+    
+    if not product_data or not product_data.get('price'):
+        logger.warning(f"Failed to fetch product data for {product_url}")
+        if seen:
+            seen.mark(product_url, 'fetch_failed')
+        return None
+    return dict(candidate, **{key: value for key, value in product_data.items() if value}, source='page')
+
+def insert_products(user_id, products):
+    """
+    Add validated products for the bot user in one commit
+    Must run inside an app context; returns the products actually added
+    """
+    from app import db
+    from app.models import Product
+    
+    added = []
+    try:
+        for product_data in products:
+            product_url = product_data['url']
+            
             # Check if product already exists for this user
-            existing_product = Product.query.filter_by(user_id=bot_user.id, url=product_url).first()
+            existing_product = Product.query.filter_by(user_id=user_id, url=product_url).first()
             if existing_product:
                 logger.info(f"Product already exists: {product_url}")
-                return None
-            
-            # Fetch product data from Amazon
-            product_data = trackers.fetch_product_data(product_url)
-            
-            if not product_data or not product_data.get('price'):
-                logger.warning(f"Failed to fetch product data for {product_url}")
-                return None
+                continue
             
             # Create new product
             price_history = [{
@@ -213,55 +227,98 @@ def add_product_to_system(bot_user, product_url):
                 last_image_update=datetime.utcnow(),
                 tracking_enabled=True,
                 notify_on_any_change=True,
-                user_id=bot_user.id,
+                user_id=user_id,
                 price_history=json.dumps(price_history)
             )
-            
             db.session.add(product)
-            db.session.commit()
-            logger.info(f"Product added successfully: {product_data['name']}")
-            return product
+            added.append(product)
+        
+        db.session.commit()
+        for product in added:
+            logger.info(f"Product added successfully: {product.name}")
+        return added
+    except Exception:
+        db.session.rollback()
+        raise
+
+def add_product_to_system(bot_user, product_url):
+    """Add a product to the tracking system for the bot user"""
+    from app import app
+    from app.models import Product
+    
+    logger.info(f"Adding product: {product_url}")
+    
+    with app.app_context():
+        try:
+            # Check if product already exists for this user
+            existing_product = Product.query.filter_by(user_id=bot_user.id, url=product_url).first()
+            if existing_product:
+                logger.info(f"Product already exists: {product_url}")
+                return None
+            
+            product_data = validate_product({'url': product_url})
+            if not product_data:
+                return None
+            
+            added = insert_products(bot_user.id, [product_data])
+            return added[0] if added else None
             
         except Exception as e:
-            db.session.rollback()
             logger.error(f"Error adding product {product_url}: {str(e)}")
             traceback.print_exc()
             return None
 
 def run_amazon_bot():
-    """Main function to run the Amazon bot"""
+    """
+    Main function to run the Amazon bot
+    
+    Discovery, product validation and inserts run as a streaming pipeline
+    (see bot_pipeline.py) that stops once MAX_PRODUCTS_TO_ADD are added.
+    """
+    from app import app, db
+    from app.models import Product
+    
     logger.info("Starting Amazon.sa bot")
     
     try:
         # Ensure bot user exists
         bot_user = ensure_bot_user_exists()
         
-        # Find top Amazon deals
-        product_urls = find_amazon_deals()
-        
-        if not product_urls:
-            logger.warning("No suitable products found")
-            return
-        
-        logger.info(f"Found {len(product_urls)} potential products")
-        
-        # Shuffle to get random products if we have more than needed
-        random.shuffle(product_urls)
+        os.makedirs(os.path.dirname(BOT_SEEN_DB) or '.', exist_ok=True)
+        seen = SeenAsins(BOT_SEEN_DB)
         
-        # Limit to max number of products
-        product_urls = product_urls[:MAX_PRODUCTS_TO_ADD]
+        # The writer runs on this thread inside a single app context
+        try:
+            with app.app_context():
+                known_urls = {url for (url,) in db.session.query(Product.url).filter_by(user_id=bot_user.id)}
+                logger.info(f"Remembering {seen.load()} recently seen ASINs")
+                
+                def write_batch(products):
+                    added = insert_products(bot_user.id, products)
+                    added_urls = {product.url for product in added}
+                    for product in products:
+                        known_urls.add(product['url'])
+                        seen.mark(product['url'], 'added' if product['url'] in added_urls else 'tracked')
+                    seen.flush()
+                    return len(added)
+                
+                # Tracked URLs and recently seen ASINs are dropped before any product-page fetch
+                stats = run_pipeline(
+                    iter_amazon_deals(),
+                    lambda candidate: validate_product(candidate, seen),
+                    write_batch,
+                    MAX_PRODUCTS_TO_ADD,
+                    skip=lambda candidate: candidate['url'] in known_urls or seen.is_known(candidate['url']),
+                    logger=logger
+                )
+        finally:
+            seen.close()
         
-        # Add products to the system
-        added_count = 0
-        for url in product_urls:
-            product = add_product_to_system(bot_user, url)
-            if product:
-                added_count += 1
-            
-            # Add delay between product additions
-            time.sleep(random.uniform(2, 4))
+        if not stats['discovery'].get('candidates'):
+            logger.warning("No suitable products found")
         
-        logger.info(f"Bot run complete. Added {added_count} new products")
+        logger.info(f"Bot run complete. Added {stats['written']} new products")
+        return stats
         
     except Exception as e:
         logger.error(f"Error running Amazon bot: {str(e)}")
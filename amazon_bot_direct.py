@@ -7,6 +7,7 @@ It connects directly to the database without going through Flask.
 """
 
 import os
+import re
 import sys
 import json
 import time
@@ -14,10 +15,8 @@ import random
 import requests
 import logging
 import traceback
-import sqlite3
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
-from logging.handlers import RotatingFileHandler
 from fake_useragent import UserAgent
 from werkzeug.security import generate_password_hash
 from dotenv import load_dotenv
@@ -25,21 +24,18 @@ from dotenv import load_dotenv
 # Load environment variables from .env file if it exists
 load_dotenv()
 
-# Configure logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
+from bot_rate_limit import polite_get, fetch_concurrently, get_host_limiter
+from bot_pipeline import run_pipeline
+from bot_seen import SeenAsins, asin_from_url
+from bot_cards import extract_card_details, card_is_complete
+from bot_runs import BotRun, start_run, finish_run
+from bot_logging import setup_bot_logger, set_run_id, log_fields
+from bot_config import config as bot_config
+from bot_db import connection_manager
+from bot_prices import price_columns, ensure_price_columns
 
-logger = logging.getLogger('amazon_bot')
-logger.setLevel(logging.INFO)
-
-file_handler = RotatingFileHandler('logs/amazon_bot.log', maxBytes=10240, backupCount=5)
-file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(file_handler)
-
-stream_handler = logging.StreamHandler(sys.stdout)
-stream_handler.setLevel(logging.INFO)
-stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(stream_handler)
+# Configure logging: JSON lines to a rotating file, written off-thread (see bot_logging.py)
+logger = setup_bot_logger('amazon_bot', 'logs/amazon_bot.log')
 
 # Initialize user agent generator
 ua = UserAgent()
@@ -60,41 +56,43 @@ else:
     DATABASE_PATH = 'instance/amazon_tracker.db'
     logger.info(f"Running in local environment, using database at {DATABASE_PATH}")
 
-# Load bot settings from config file
-BOT_CONFIG_FILE = 'bot_config.json'
-DEFAULT_SETTINGS = {
-    'enabled': True,
-    'run_time': '09:00',
-    'max_products': 10,
-    'min_discount': 10,
-    'bot_username': 'amazon_bot',
-    'bot_email': 'bot@amazontracker.sa',
-    'cleanup_old_products': False,
-    'categories': ['electronics', 'home', 'kitchen', 'fashion', 'beauty', 'toys', 'sports']
-}
-
-def get_bot_settings():
-    """Get bot settings from config file or return defaults"""
-    if os.path.exists(BOT_CONFIG_FILE):
-        try:
-            with open(BOT_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading bot settings: {str(e)}")
-    return DEFAULT_SETTINGS.copy()
-
-# Get settings and configure bot
-settings = get_bot_settings()
-MAX_PRODUCTS_TO_ADD = settings.get('max_products', 10)
-MIN_DISCOUNT_PERCENT = settings.get('min_discount', 10)
-BOT_USERNAME = settings.get('bot_username', 'amazon_bot')
-BOT_EMAIL = settings.get('bot_email', 'bot@amazontracker.sa')
+# Bot settings come from bot_config.json through the cached config in
+# bot_config.py; apply_settings re-runs whenever the file changes, so a
+# running bot picks up new values without a restart
+def apply_settings(settings):
+    """Update the module's bot settings"""
+    global MAX_PRODUCTS_TO_ADD, MIN_DISCOUNT_PERCENT, BOT_USERNAME, BOT_EMAIL, SEARCH_CATEGORIES
+    MAX_PRODUCTS_TO_ADD = settings['max_products']
+    MIN_DISCOUNT_PERCENT = settings['min_discount']
+    BOT_USERNAME = settings['bot_username']
+    BOT_EMAIL = settings['bot_email']
+    SEARCH_CATEGORIES = list(settings['categories'])
+
+bot_config.subscribe(apply_settings)
+
+# Indexes for the bot's hot queries: duplicate check by (user_id, url) and
+# per-day counts / recent listings by (user_id, created_at)
+BOT_DB_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_product_user_url ON product(user_id, url)',
+    'CREATE INDEX IF NOT EXISTS idx_product_user_created_at ON product(user_id, created_at)',
+]
+
+# One WAL-mode connection per thread, reused across helper calls (see bot_db.py)
+db = connection_manager(DATABASE_PATH)
 
 def get_db_connection():
-    """Get a connection to the SQLite database"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get this thread's connection to the SQLite database"""
+    return db.get()
+
+def ensure_bot_indexes():
+    """Create the indexes the bot and admin pages rely on, if missing"""
+    conn = get_db_connection()
+    try:
+        for statement in BOT_DB_INDEXES:
+            conn.execute(statement)
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Could not create bot indexes: {str(e)}")
 
 def get_random_headers():
     """Generate random headers to avoid bot detection"""
@@ -141,151 +139,144 @@ def ensure_bot_user_exists():
         conn.rollback()
         logger.error(f"Failed to create bot user: {str(e)}")
         raise
-    finally:
-        conn.close()
 
-def find_amazon_deals():
-    """
-    Find top Amazon.sa deals by scraping Amazon deals pages
-    Returns a list of product URLs with good discounts
-    """
-    deal_pages = [
-        'https://www.amazon.sa/-/en/gp/goldbox',
-        'https://www.amazon.sa/-/ar/gp/goldbox',
-        'https://www.amazon.sa/s?k=discount&rh=p_n_deal_type%3A26931847031',
-        'https://www.amazon.sa/-/en/deals?ref_=nav_cs_gb',
-        'https://www.amazon.sa/-/ar/deals?ref_=nav_cs_gb',
-        'https://www.amazon.sa/gcx/-/gfhz/?categoryId=departments&scrollState=eyJpdGVtSW5kZXgiOjAsInNjcm9sbE9mZnNldCI6MH0%3D&ingress=0',
-        'https://www.amazon.sa/gp/bestsellers/?ref_=nav_cs_bestsellers',
-        'https://www.amazon.sa/-/en/s?k=sale&ref=nb_sb_noss_1',
-        'https://www.amazon.sa/-/ar/s?k=sale&ref=nb_sb_noss_1'
-    ]
+DEAL_PAGES = [
+    'https://www.amazon.sa/-/en/gp/goldbox',
+    'https://www.amazon.sa/-/ar/gp/goldbox',
+    'https://www.amazon.sa/s?k=discount&rh=p_n_deal_type%3A26931847031',
+    'https://www.amazon.sa/-/en/deals?ref_=nav_cs_gb',
+    'https://www.amazon.sa/-/ar/deals?ref_=nav_cs_gb',
+    'https://www.amazon.sa/gcx/-/gfhz/?categoryId=departments&scrollState=eyJpdGVtSW5kZXgiOjAsInNjcm9sbE9mZnNldCI6MH0%3D&ingress=0',
+    'https://www.amazon.sa/gp/bestsellers/?ref_=nav_cs_bestsellers',
+    'https://www.amazon.sa/-/en/s?k=sale&ref=nb_sb_noss_1',
+    'https://www.amazon.sa/-/ar/s?k=sale&ref=nb_sb_noss_1'
+]
+def clean_product_url(href):
+    """Canonical https://www.amazon.sa/dp/<ASIN> URL for a product link, or None"""
+    # Make sure it's a full URL
+    if href.startswith('/'):
+        href = f"https://www.amazon.sa{href}"
+    asin_match = re.search(r'/dp/([A-Z0-9]{10})', href)
+    if asin_match:
+        return f"https://www.amazon.sa/dp/{asin_match.group(1)}"
+    return None
+
+def fetch_discovery_page(url):
+    """Fetch one deal or search page under the amazon.sa rate limit"""
+    started = time.monotonic()
+    response = polite_get(url, headers=get_random_headers(), timeout=15)
+    response.raise_for_status()
+    logger.info(f"Fetched discovery page {url}", extra=log_fields('discovery', outcome='fetched', started=started))
+    return response.text
+
+def parse_deal_page(html):
+    """Candidate dicts (url plus card details) for every deal card at or above MIN_DISCOUNT_PERCENT"""
+    soup = BeautifulSoup(html, 'lxml')
+    found = []
     
-    product_links = []
+    # Look for deal cards/items with discount info
+    deal_elements = soup.select('.a-carousel-card, .octopus-dlp-asin-card, .dealCard, .dealContainer, .a-list-item, .s-result-item, div.sg-col-inner')
     
-    # First, try to find deals on the deal pages
-    for deal_page in deal_pages:
+    for deal in deal_elements:
         try:
-            logger.info(f"Checking deal page: {deal_page}")
-            headers = get_random_headers()
-            response = requests.get(deal_page, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'lxml')
+            candidate = extract_card_details(deal)
             
-            # Look for deal cards/items with discount info
-            deal_elements = soup.select('.a-carousel-card, .octopus-dlp-asin-card, .dealCard, .dealContainer, .a-list-item, .s-result-item, div.sg-col-inner')
-            
-            for deal in deal_elements:
-                try:
-                    # Try to find discount percentage
-                    discount_elements = deal.select('span.a-color-secondary span.a-text-bold, .dealPriceText .savingsPercentage, span.a-text-strike, .a-text-price, .a-price-savings')
-                    
-                    discount_percent = 0
-                    for discount_el in discount_elements:
-                        discount_text = discount_el.text.strip()
-                        if '%' in discount_text:
-                            try:
-                                # Extract just the number
-                                discount_percent = float(discount_text.replace('%', '').replace('-', '').replace('(', '').replace(')', '').strip())
-                                break
-                            except ValueError:
-                                continue
-                    
-                    # If discount is 10% or greater
-                    if discount_percent >= MIN_DISCOUNT_PERCENT:
-                        # Find the product link
-                        link_element = deal.select_one('a.a-link-normal, .a-size-base a, h2 a, .a-text-normal, h3 a')
-                        if link_element and 'href' in link_element.attrs:
-                            href = link_element['href']
-                            
-                            # Make sure it's a full URL
-                            if href.startswith('/'):
-                                href = f"https://www.amazon.sa{href}"
-                                
-                            # Clean up the URL to get the basic product link
-                            # Extract the product ID (ASIN)
-                            import re
-                            asin_match = re.search(r'/dp/([A-Z0-9]{10})', href)
-                            if asin_match:
-                                asin = asin_match.group(1)
-                                clean_url = f"https://www.amazon.sa/dp/{asin}"
-                                
-                                # Only keep unique product URLs
-                                if clean_url not in product_links:
-                                    logger.info(f"Found product with {discount_percent}% discount: {clean_url}")
-                                    product_links.append(clean_url)
-                except Exception as product_error:
-                    logger.error(f"Error processing a product: {str(product_error)}")
-                    continue
-                    
-            # Add a delay between pages to avoid being flagged
-            time.sleep(random.uniform(3, 5))
-            
-        except Exception as e:
-            logger.error(f"Error scraping deal page {deal_page}: {str(e)}")
+            # If discount is 10% or greater
+            if (candidate['discount_percent'] or 0) >= MIN_DISCOUNT_PERCENT:
+                # Find the product link
+                link_element = deal.select_one('a.a-link-normal, .a-size-base a, h2 a, .a-text-normal, h3 a')
+                if link_element and 'href' in link_element.attrs:
+                    clean_url = clean_product_url(link_element['href'])
+                    if clean_url:
+                        candidate['url'] = clean_url
+                        found.append(candidate)
+        except Exception as product_error:
+            logger.error(f"Error processing a product: {str(product_error)}")
             continue
+    return found
+
+def parse_category_page(html):
+    """
+    Candidate dicts from a category search page
+    Results whose card shows too small a discount are dropped; unknown discounts are checked later
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    found = []
     
-    # If we still don't have enough products, try searching for popular categories
-    if len(product_links) < MAX_PRODUCTS_TO_ADD:
-        categories = ['electronics', 'home', 'kitchen', 'fashion', 'beauty', 'toys', 'sports']
-        for category in categories:
-            if len(product_links) >= MAX_PRODUCTS_TO_ADD * 2:  # Get double what we need so we can shuffle later
-                break
-                
-            search_url = f"https://www.amazon.sa/s?k={category}&rh=p_n_deal_type%3A26931847031"
-            try:
-                logger.info(f"Searching additional category: {category}")
-                headers = get_random_headers()
-                response = requests.get(search_url, headers=headers, timeout=15)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, 'lxml')
-                
-                # Find all product links
-                product_elements = soup.select('.s-result-item')
-                
-                for product in product_elements:
-                    # Check if we already have enough products
-                    if len(product_links) >= MAX_PRODUCTS_TO_ADD * 2:
-                        break
-                        
-                    try:
-                        # Find the link to the product
-                        link_element = product.select_one('h2 a, .a-link-normal')
-                        if not link_element or 'href' not in link_element.attrs:
-                            continue
-                            
-                        href = link_element['href']
-                        
-                        # Make sure it's a full URL
-                        if href.startswith('/'):
-                            href = f"https://www.amazon.sa{href}"
-                            
-                        # Extract the product ID (ASIN)
-                        import re
-                        asin_match = re.search(r'/dp/([A-Z0-9]{10})', href)
-                        if asin_match:
-                            asin = asin_match.group(1)
-                            clean_url = f"https://www.amazon.sa/dp/{asin}"
-                            
-                            # Only keep unique product URLs
-                            if clean_url not in product_links:
-                                # Since we don't know the discount yet, we'll check later when fetching the product data
-                                logger.info(f"Found potential product in {category} category: {clean_url}")
-                                product_links.append(clean_url)
-                    except Exception as product_error:
-                        logger.error(f"Error processing a product in category search: {str(product_error)}")
-                        continue
-                
-                # Add a delay between searches to avoid being flagged
-                time.sleep(random.uniform(3, 5))
-                
-            except Exception as e:
-                logger.error(f"Error searching category {category}: {str(e)}")
+    for product in soup.select('.s-result-item'):
+        try:
+            # Find the link to the product
+            link_element = product.select_one('h2 a, .a-link-normal')
+            if not link_element or 'href' not in link_element.attrs:
                 continue
+            clean_url = clean_product_url(link_element['href'])
+            if not clean_url:
+                continue
+            candidate = extract_card_details(product)
+            if candidate['discount_percent'] is not None and candidate['discount_percent'] < MIN_DISCOUNT_PERCENT:
+                continue
+            candidate['url'] = clean_url
+            found.append(candidate)
+        except Exception as product_error:
+            logger.error(f"Error processing a product in category search: {str(product_error)}")
+            continue
+    return found
+
+def iter_amazon_deals(run=None):
+    """
+    Find top Amazon.sa deals by scraping Amazon deals pages
+    Yields a candidate dict per unique product as soon as the page it is on arrives
+    Pages checked are counted on run (a BotRun) when given
+    """
+    seen = set()
+    
+    # First, try to find deals on the deal pages (fetched concurrently, rate limited per host)
+    for deal_page, html, error in fetch_concurrently(DEAL_PAGES, fetch_discovery_page):
+        if error:
+            logger.error(f"Error scraping deal page {deal_page}: {str(error)}", extra=log_fields('discovery', outcome='error'))
+            continue
+        logger.info(f"Checked deal page: {deal_page}")
+        if run:
+            run.add('pages_checked')
+        for candidate in parse_deal_page(html):
+            # Only keep unique product URLs
+            if candidate['url'] not in seen:
+                seen.add(candidate['url'])
+                logger.info(f"Found product with {candidate['discount_percent']}% discount: {candidate['url']}",
+                            extra=log_fields('discovery', asin_from_url(candidate['url']), 'candidate'))
+                yield candidate
     
-    return product_links
+    # If we still don't have enough products, try searching for popular categories
+    if len(seen) >= MAX_PRODUCTS_TO_ADD:
+        return
+    search_urls = {
+        f"https://www.amazon.sa/s?k={category}&rh=p_n_deal_type%3A26931847031": category
+        for category in SEARCH_CATEGORIES
+    }
+    for search_url, html, error in fetch_concurrently(list(search_urls), fetch_discovery_page):
+        category = search_urls[search_url]
+        if error:
+            logger.error(f"Error searching category {category}: {str(error)}", extra=log_fields('discovery', outcome='error'))
+            continue
+        logger.info(f"Searched additional category: {category}")
+        if run:
+            run.add('pages_checked')
+        for candidate in parse_category_page(html):
+            # Stop after double what we need
+            if len(seen) >= MAX_PRODUCTS_TO_ADD * 2:
+                return
+            if candidate['url'] not in seen:
+                seen.add(candidate['url'])
+                logger.info(f"Found potential product in {category} category: {candidate['url']}",
+                            extra=log_fields('discovery', asin_from_url(candidate['url']), 'candidate'))
+                yield candidate
+
+def find_amazon_deals():
+    """
+    Find top Amazon.sa deals by scraping Amazon deals pages
+    Returns a list of product URLs with good discounts
+    """
+    return [candidate['url'] for candidate in iter_amazon_deals()]
 
 def fetch_product_data(url):
     """Fetch product data from Amazon.sa"""
@@ -294,7 +285,8 @@ def fetch_product_data(url):
         sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
         import trackers
         
-        # Use the trackers module to fetch data
+        # Use the trackers module to fetch data; it shares the host rate limit with the fetch workers
+        get_host_limiter(url).acquire()
         return trackers.fetch_product_data(url)
     except ImportError:
         logger.error("Could not import trackers module, using fallback method")
@@ -305,7 +297,7 @@ def fetch_product_data_direct(url):
     """Fallback method to fetch product data directly"""
     try:
         headers = get_random_headers()
-        response = requests.get(url, headers=headers, timeout=15)
+        response = polite_get(url, headers=headers, timeout=15)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.text, 'lxml')
@@ -358,159 +350,293 @@ def fetch_product_data_direct(url):
         logger.error(f"Error fetching product data directly: {str(e)}")
         return None
 
-def add_product_to_system(user_id, product_url):
-    """Add a product to the tracking system for the bot user"""
-    logger.info(f"Adding product: {product_url}")
+def check_discount(product_url, price):
+    """
+    Look for a strike-through price or "Save X%" text on the product page
+    Returns (has_discount, discount_percent)
+    """
+    headers = get_random_headers()
+    response = polite_get(product_url, headers=headers, timeout=15)
+    soup = BeautifulSoup(response.text, 'lxml')
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    has_discount = False
+    discount_percent = 0
     
+    # Check for strike-through price
+    strike_price_el = soup.select_one('.a-text-price .a-offscreen, .a-text-strike')
+    if strike_price_el:
+        strike_price_text = strike_price_el.text.strip()
+        strike_price_text = ''.join(filter(lambda x: x.isdigit() or x == '.', strike_price_text))
+        try:
+            strike_price = float(strike_price_text)
+            if strike_price > price:
+                discount_percent = ((strike_price - price) / strike_price) * 100
+                has_discount = discount_percent >= MIN_DISCOUNT_PERCENT
+        except ValueError:
+            pass
+    
+    # Check for "Save X%" text
+    if not has_discount:
+        discount_elements = soup.select('.savingsPercentage, .a-color-price')
+        for el in discount_elements:
+            text = el.text.strip()
+            if '%' in text:
+                try:
+                    perc_text = ''.join(filter(lambda x: x.isdigit() or x == '.', text.split('%')[0]))
+                    discount_percent = float(perc_text)
+                    has_discount = discount_percent >= MIN_DISCOUNT_PERCENT
+                    if has_discount:
+                        break
+                except ValueError:
+                    continue
+    
+    return has_discount, discount_percent
+
+def validate_product(candidate, seen=None):
+    """
+    Check a candidate from discovery has a significant discount
+    Deal-card data is used as is; the product page is only fetched for what the card is missing
+    Returns the product data to insert, or None if it should be skipped
+    Rejections are remembered in seen (a SeenAsins) when given
+    """
+    started = time.monotonic()
+    product_url = candidate['url']
+    asin = asin_from_url(product_url)
+    if card_is_complete(candidate):
+        logger.info(f"Using deal card data ({candidate['discount_percent']:.1f}% off) for {product_url}",
+                    extra=log_fields('fetch', asin, 'card', started))
+        return dict(candidate, source='card')
+    
+    product_data = fetch_product_data(product_url)
+    
+    if not product_data or not product_data.get('price'):
+        logger.warning(f"Failed to fetch product data for {product_url}", extra=log_fields('fetch', asin, 'fetch_failed', started))
+        if seen:
+            seen.mark(product_url, 'fetch_failed')
+        return None
+    
+    # A discount shown on the card was already checked against MIN_DISCOUNT_PERCENT
+    if candidate.get('discount_percent') is not None:
+        logger.info(f"Fetched product page for {product_url}", extra=log_fields('fetch', asin, 'page', started))
+        return dict(candidate, **{key: value for key, value in product_data.items() if value}, source='page')
+    
+    # For products found in category search, check if they have a significant discount
     try:
-        # Check if product already exists for this user
-        cursor.execute('SELECT id FROM product WHERE user_id = ? AND url = ?', (user_id, product_url))
-        existing_product = cursor.fetchone()
+        has_discount, discount_percent = check_discount(product_url, product_data['price'])
         
-        if existing_product:
-            logger.info(f"Product already exists: {product_url}")
-            conn.close()
+        # Only add products with significant discount
+        if not has_discount:
+            logger.info(f"Product {product_url} has insufficient discount ({discount_percent:.1f}%), skipping",
+                        extra=log_fields('fetch', asin, 'no_discount', started))
+            if seen:
+                seen.mark(product_url, 'no_discount')
             return None
         
-        # Fetch product data from Amazon
-        product_data = fetch_product_data(product_url)
+        logger.info(f"Confirmed discount of {discount_percent:.1f}% for {product_url}",
+                    extra=log_fields('fetch', asin, 'page', started))
+        candidate = dict(candidate, discount_percent=discount_percent)
         
-        if not product_data or not product_data.get('price'):
-            logger.warning(f"Failed to fetch product data for {product_url}")
-            conn.close()
-            return None
-        
-        # For products found in category search, check if they have a significant discount
-        # We'll try to estimate this by checking for price info in the product details
-        try:
-            headers = get_random_headers()
-            response = requests.get(product_url, headers=headers, timeout=15)
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            # Find any strike-through prices or "Save X%" texts
-            has_discount = False
-            discount_percent = 0
+    except Exception as e:
+        # If we fail to check discount, assume it's acceptable
+        logger.warning(f"Failed to check discount for {product_url}: {str(e)}",
+                       extra=log_fields('fetch', asin, 'page', started))
+    
+    return dict(candidate, **{key: value for key, value in product_data.items() if value}, source='page')
+
+def insert_products(conn, user_id, products):
+    """
+    Insert validated products for the bot user in one transaction
+    Products the user already tracks are skipped; returns the number inserted
+    """
+    started = time.monotonic()
+    ensure_price_columns(conn)
+    cursor = conn.cursor()
+    added = 0
+    try:
+        for product_data in products:
+            product_url = product_data['url']
             
-            # Check for strike-through price
-            strike_price_el = soup.select_one('.a-text-price .a-offscreen, .a-text-strike')
-            if strike_price_el:
-                strike_price_text = strike_price_el.text.strip()
-                strike_price_text = ''.join(filter(lambda x: x.isdigit() or x == '.', strike_price_text))
-                try:
-                    strike_price = float(strike_price_text)
-                    if strike_price > product_data['price']:
-                        discount_percent = ((strike_price - product_data['price']) / strike_price) * 100
-                        has_discount = discount_percent >= MIN_DISCOUNT_PERCENT
-                except ValueError:
-                    pass
+            # Check if product already exists for this user
+            cursor.execute('SELECT id FROM product WHERE user_id = ? AND url = ?', (user_id, product_url))
+            if cursor.fetchone():
+                logger.info(f"Product already exists: {product_url}",
+                            extra=log_fields('write', asin_from_url(product_url), 'tracked'))
+                continue
             
-            # Check for "Save X%" text
-            if not has_discount:
-                discount_elements = soup.select('.savingsPercentage, .a-color-price')
-                for el in discount_elements:
-                    text = el.text.strip()
-                    if '%' in text:
-                        try:
-                            perc_text = ''.join(filter(lambda x: x.isdigit() or x == '.', text.split('%')[0]))
-                            discount_percent = float(perc_text)
-                            has_discount = discount_percent >= MIN_DISCOUNT_PERCENT
-                            if has_discount:
-                                break
-                        except ValueError:
-                            continue
+            # Prepare data for insertion
+            now = datetime.utcnow().isoformat()
+            price_history = json.dumps([{
+                'price': product_data['price'],
+                'date': now
+            }])
             
-            # Only add products with significant discount
-            if not has_discount:
-                logger.info(f"Product {product_url} has insufficient discount ({discount_percent:.1f}%), skipping")
-                conn.close()
-                return None
+            # Add "العروض اليومية" to custom name to indicate it was added by the bot
+            custom_name = f"العروض اليومية: {product_data['name']}"
+            if len(custom_name) > 200:  # Truncate if too long
+                custom_name = custom_name[:197] + "..."
             
-            logger.info(f"Confirmed discount of {discount_percent:.1f}% for {product_url}")
+            # Reference price, lowest price and discount are stored for the admin analytics
+            prices = price_columns(product_data['price'], product_data.get('list_price'),
+                                   product_data.get('discount_percent'))
             
-        except Exception as e:
-            # If we fail to check discount, assume it's acceptable
-            logger.warning(f"Failed to check discount for {product_url}: {str(e)}")
+            # Insert the product
+            cursor.execute('''
+                INSERT INTO product (
+                    url, name, custom_name, current_price, image_url,
+                    price_history, tracking_enabled, notify_on_any_change,
+                    last_checked, user_id, created_at,
+                    initial_price, lowest_price, discount_pct
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                product_url, product_data['name'], custom_name, product_data['price'],
+                product_data.get('image_url'), price_history, True, True,
+                now, user_id, now,
+                prices['initial_price'], prices['lowest_price'], prices['discount_pct']
+            ))
+            product_data['id'] = cursor.lastrowid
+            added += 1
+            logger.info(f"Product added successfully: {product_data['name']} with ID {cursor.lastrowid}",
+                        extra=log_fields('write', asin_from_url(product_url), 'added'))
         
-        # Prepare data for insertion
-        now = datetime.utcnow().isoformat()
-        price_history = json.dumps([{
-            'price': product_data['price'],
-            'date': now
-        }])
+        conn.commit()
+        logger.info(f"Committed {added} of {len(products)} products", extra=log_fields('write', started=started))
+        return added
+    except Exception:
+        conn.rollback()
+        raise
+
+def add_product_to_system(user_id, product_url):
+    """Add a product to the tracking system for the bot user"""
+    logger.info(f"Adding product: {product_url}")
+    
+    conn = get_db_connection()
+    
+    try:
+        # Check if product already exists for this user
+        existing_product = conn.execute(
+            'SELECT id FROM product WHERE user_id = ? AND url = ?', (user_id, product_url)
+        ).fetchone()
         
-        # Add "العروض اليومية" to custom name to indicate it was added by the bot
-        custom_name = f"العروض اليومية: {product_data['name']}"
-        if len(custom_name) > 200:  # Truncate if too long
-            custom_name = custom_name[:197] + "..."
+        if existing_product:
+            logger.info(f"Product already exists: {product_url}")
+            return None
         
-        # Insert the product
-        cursor.execute('''
-            INSERT INTO product (
-                url, name, custom_name, current_price, image_url,
-                price_history, tracking_enabled, notify_on_any_change,
-                last_checked, user_id, created_at
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            product_url, product_data['name'], custom_name, product_data['price'],
-            product_data.get('image_url'), price_history, True, True,
-            now, user_id, now
-        ))
+        product_data = validate_product({'url': product_url})
+        if not product_data:
+            return None
         
-        conn.commit()
-        product_id = cursor.lastrowid
-        logger.info(f"Product added successfully: {product_data['name']} with ID {product_id}")
-        return product_id
+        if not insert_products(conn, user_id, [product_data]):
+            return None
+        return product_data['id']
         
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error adding product {product_url}: {str(e)}")
         traceback.print_exc()
         return None
-    finally:
-        conn.close()
 
-def run_amazon_bot():
-    """Main function to run the Amazon bot"""
-    logger.info("Starting Amazon.sa bot")
+def record_run_start(run):
+    """Insert the bot_runs row for this run; returns its id, or None if metrics can't be written"""
+    conn = get_db_connection()
+    try:
+        return start_run(conn, run)
+    except Exception as e:
+        logger.warning(f"Could not record bot run: {str(e)}")
+        return None
+
+def record_run_finish(run_id, run, status):
+    """Store the run's metrics in its bot_runs row"""
+    if run_id is None:
+        return
+    conn = get_db_connection()
+    try:
+        finish_run(conn, run_id, run, status)
+    except Exception as e:
+        logger.warning(f"Could not record bot run metrics: {str(e)}")
+
+def run_amazon_bot(cancel=None, on_progress=None):
+    """
+    Main function to run the Amazon bot
+    
+    Discovery, product validation and inserts run as a streaming pipeline
+    (see bot_pipeline.py) that stops once MAX_PRODUCTS_TO_ADD are added,
+    or early when the optional cancel Event is set.
+    The run's metrics are stored in the bot_runs table (see bot_runs.py);
+    on_progress(key, counts) is called whenever one of them changes.
+    """
+    # Pick up any change to bot_config.json before this run reads its settings
+    bot_config.get()
+    
+    # Count this run's errors and pages and record them when it ends; log records carry its id
+    run = BotRun(on_change=on_progress)
+    logger.addHandler(run)
+    run_id = record_run_start(run)
+    set_run_id(run_id or run.started_at.strftime('%Y%m%d%H%M%S'))
+    status = 'failed'
+    
+    logger.info("Starting Amazon.sa bot", extra=log_fields('run', outcome='started'))
     
     try:
-        # Ensure bot user exists
+        # Ensure bot user and indexes exist
         user_id = ensure_bot_user_exists()
+        ensure_bot_indexes()
         
-        # Find top Amazon deals
-        product_urls = find_amazon_deals()
-        
-        if not product_urls:
-            logger.warning("No suitable products found")
-            return
-        
-        logger.info(f"Found {len(product_urls)} potential products")
-        
-        # Shuffle to get random products if we have more than needed
-        random.shuffle(product_urls)
+        # One connection for the writer. URLs the bot tracks and ASINs it saw
+        # recently (added or rejected) are skipped before any product-page fetch
+        conn = get_db_connection()
+        seen = SeenAsins(DATABASE_PATH)
+        try:
+            known_urls = {row['url'] for row in conn.execute('SELECT url FROM product WHERE user_id = ?', (user_id,))}
+            logger.info(f"Remembering {seen.load()} recently seen ASINs")
+            
+            sources = {'card': 0, 'page': 0}
+            
+            def write_batch(products):
+                added = insert_products(conn, user_id, products)
+                for product in products:
+                    known_urls.add(product['url'])
+                    seen.mark(product['url'], 'added' if product.get('id') else 'tracked')
+                    if product.get('id'):
+                        sources[product['source']] += 1
+                        run.add_discount(product.get('discount_percent'))
+                seen.flush()
+                run.add('added', added)
+                return added
+            
+            stats = run_pipeline(
+                iter_amazon_deals(run),
+                lambda candidate: validate_product(candidate, seen),
+                write_batch,
+                MAX_PRODUCTS_TO_ADD,
+                skip=lambda candidate: candidate['url'] in known_urls or seen.is_known(candidate['url']),
+                cancel=cancel,
+                logger=logger
+            )
+            stats['sources'] = sources
+            logger.info(f"Added {sources['card']} products from deal card data, {sources['page']} needed a product page")
+        finally:
+            seen.close()
+            db.release()
         
-        # Limit to max number of products
-        product_urls = product_urls[:MAX_PRODUCTS_TO_ADD]
+        run.add('candidates', stats['discovery'].get('candidates', 0))
+        run.add('skipped', stats['discovery'].get('skipped', 0))
+        status = 'cancelled' if cancel is not None and cancel.is_set() else 'success'
         
-        # Add products to the system
-        added_count = 0
-        for url in product_urls:
-            product_id = add_product_to_system(user_id, url)
-            if product_id:
-                added_count += 1
-            
-            # Add delay between product additions
-            time.sleep(random.uniform(2, 4))
+        if not stats['discovery'].get('candidates'):
+            logger.warning("No suitable products found")
         
-        logger.info(f"Bot run complete. Added {added_count} new products")
+        logger.info(f"Bot run {'cancelled' if status == 'cancelled' else 'complete'}. Added {stats['written']} new products",
+                    extra=log_fields('run', outcome=status))
+        return stats
         
     except Exception as e:
         logger.error(f"Error running Amazon bot: {str(e)}")
         traceback.print_exc()
+    finally:
+        logger.removeHandler(run)
+        record_run_finish(run_id, run, status)
+        set_run_id(None)
+        db.release()
 
 if __name__ == "__main__":
     run_amazon_bot() 
\ No newline at end of file
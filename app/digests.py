@@ -0,0 +1,205 @@
+"""
+Per-user price alert digests.
+
+Price changes are recorded as AlertEvent rows instead of being mailed one
+by one. A target-price hit flushes the user's pending events straight
+away; ordinary changes wait until the user's oldest pending event is
+ALERT_DIGEST_WINDOW_MINUTES old. Either way the user gets one email, one
+notification row and one push per digest.
+"""
+
+import os
+import secrets
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy.sql import func
+
+from app import db, metrics
+from app.models import User, Notification, AlertEvent
+from app.outbox import enqueue_email
+from app.email_templates import render_email, translate_email, build_price_alert_email
+from app.push import build_messages, dispatch
+from app.notification_policy import allow_alert
+
+ALERT_DIGEST_WINDOW_MINUTES = int(os.environ.get('ALERT_DIGEST_WINDOW_MINUTES', 60))
+# Products named in a multi-event notification before it is truncated
+DIGEST_SUMMARY_ITEMS = 3
+
+def classify_price_change(old_price, new_price, target_price=None, notify_on_any_change=False):
+    """Event type for a price change, or None if it should not alert"""
+    if old_price is None or new_price is None or new_price == old_price:
+        return None
+    if target_price and new_price <= target_price:
+        return 'target_reached'
+    if new_price < old_price:
+        return 'price_drop'
+    if notify_on_any_change:
+        return 'price_increase'
+    return None
+
+def record_price_change(user_id, product_id, product_name, product_url, old_price, new_price,
+                        target_price=None, notify_on_any_change=False):
+    """Queue an alert for the user's next digest if the notification policy allows it; target hits are delivered immediately"""
+    event_type = classify_price_change(old_price, new_price, target_price, notify_on_any_change)
+    if event_type is None:
+        return None
+    # Flapping prices, repeats and bursts are dropped before they reach a digest
+    if not allow_alert(user_id, product_id, product_url, old_price, new_price, event_type):
+        return None
+
+    event = AlertEvent(
+        user_id=user_id,
+        product_id=product_id,
+        product_name=product_name,
+        product_url=product_url,
+        old_price=old_price,
+        new_price=new_price,
+        target_price=target_price,
+        event_type=event_type
+    )
+    db.session.add(event)
+    db.session.commit()
+    metrics.increment('alert_events_recorded')
+
+    if event_type == 'target_reached':
+        deliver_digest(user_id)
+    return event
+
+def claim_pending_events(user_id):
+    """Atomically take all of a user's pending events; concurrent sweeps never get the same rows"""
+    digest_id = secrets.token_hex(16)
+    claimed = AlertEvent.query.filter(
+        AlertEvent.user_id == user_id,
+        AlertEvent.digest_id.is_(None)
+    ).update({'digest_id': digest_id, 'digested_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return []
+    return AlertEvent.query.filter_by(digest_id=digest_id).order_by(AlertEvent.created_at, AlertEvent.id).all()
+
+def notification_message(events, lang):
+    """One notification text covering every event in the digest"""
+    if len(events) == 1:
+        event = events[0]
+        direction = 'price_dropped' if event.new_price < event.old_price else 'price_increased'
+        message = f"{event.product_name}: {translate_email(direction, lang)} {event.new_price}."
+        if event.event_type == 'target_reached':
+            message += f" {translate_email('target_reached', lang)}!"
+        return message
+
+    summary = ', '.join(f"{event.product_name} ({event.new_price})" for event in events[:DIGEST_SUMMARY_ITEMS])
+    if len(events) > DIGEST_SUMMARY_ITEMS:
+        summary += ' …'
+    return translate_email('price_digest_notification', lang, count=len(events), summary=summary)
+
+def build_digest_email(user, events, lang):
+    """Subject, plain text and HTML for a digest"""
+    if len(events) == 1:
+        event = events[0]
+        subject, html = build_price_alert_email(
+            user.username, event.product_name, event.product_url,
+            event.old_price, event.new_price, target_price=event.target_price, lang=lang
+        )
+        return subject, notification_message(events, lang), html
+
+    subject = translate_email('price_digest_subject', lang, count=len(events))
+    lines = [translate_email('price_digest_greeting', lang, username=user.username), '',
+             translate_email('price_digest_intro', lang), '']
+    for event in events:
+        lines.append(f"- {event.product_name}: {event.old_price:.2f} -> {event.new_price:.2f}"
+                     + (f" {event.product_url}" if event.product_url else ''))
+    lines += ['', translate_email('price_digest_footer', lang)]
+    html = render_email('price_digest.html', lang, username=user.username, events=events)
+    return subject, '\n'.join(lines), html
+
+def deliver_digest(user_id, pushes=None):
+    """
+    Send everything pending for one user as a single digest.
+
+    Push messages are appended to pushes when given, so a sweep can fan
+    them out in one batch; otherwise the push is sent right away.
+    Returns the number of events delivered.
+    """
+    events = claim_pending_events(user_id)
+    if not events:
+        return 0
+    digest_id = events[0].digest_id
+
+    try:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return 0
+        lang = user.language or 'ar'
+
+        message = notification_message(events, lang)
+        db.session.add(Notification(
+            user_id=user.id,
+            message=message,
+            product_id=events[0].product_id if len(events) == 1 else None,
+            notification_type=events[0].event_type if len(events) == 1 else 'price_digest'
+        ))
+        if user.email_verified:
+            subject, text_body, html_body = build_digest_email(user, events, lang)
+            enqueue_email(user.email, subject, text_body, html_body)
+        # The notification and the outbox row commit together
+        db.session.commit()
+    except Exception:
+        # Hand the events back so the next sweep retries them
+        db.session.rollback()
+        AlertEvent.query.filter_by(digest_id=digest_id).update(
+            {'digest_id': None, 'digested_at': None}, synchronize_session=False
+        )
+        db.session.commit()
+        raise
+
+    # Push is best effort and never holds back the digest
+    messages = build_messages([user], {
+        'title': 'ZONAR',
+        'body': message,
+        'tag': 'price-digest',
+        'url': '/'
+    })
+    if pushes is not None:
+        pushes.extend(messages)
+    else:
+        dispatch(messages)
+
+    metrics.increment('alert_digests_sent')
+    metrics.increment('alert_digest_events', len(events))
+    print(f"Delivered digest of {len(events)} alerts to user {user.id}")
+    return len(events)
+
+def flush_due_digests(window_minutes=ALERT_DIGEST_WINDOW_MINUTES, now=None):
+    """
+    Deliver digests for every user whose oldest pending event is older than the window.
+
+    Returns:
+        Dict with the number of users, events and pushes delivered
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(minutes=window_minutes)
+    due_users = [row.user_id for row in (
+        db.session.query(AlertEvent.user_id)
+        .filter(AlertEvent.digest_id.is_(None))
+        .group_by(AlertEvent.user_id)
+        .having(func.min(AlertEvent.created_at) <= cutoff)
+        .all()
+    )]
+
+    report = {'users': 0, 'events': 0, 'errors': 0}
+    pushes = []
+    for user_id in due_users:
+        try:
+            delivered = deliver_digest(user_id, pushes)
+            if delivered:
+                report['users'] += 1
+                report['events'] += delivered
+        except Exception as e:
+            db.session.rollback()
+            report['errors'] += 1
+            print(f"Error delivering digest for user {user_id}: {str(e)}")
+            traceback.print_exc()
+
+    push_report = dispatch(pushes)
+    report['pushes'] = push_report['sent']
+    return report
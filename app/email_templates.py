@@ -0,0 +1,116 @@
+"""
+Precompiled email templates.
+
+Email bodies live in templates/emails/. Each (template, language) pair is
+compiled once and cached together with its language-bound context
+(direction, alignment, translated strings), so sending a message only
+renders the per-event variables. Rendering does not need a request
+context, which lets background jobs send the same emails.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup, escape
+
+from translations import translations
+
+EMAIL_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'emails')
+SUPPORTED_LANGUAGES = ('ar', 'en')
+DEFAULT_LANGUAGE = 'ar'
+
+_lock = threading.Lock()
+_compiled = {}   # (template name, language) -> (template, language context)
+_languages = {}  # language -> language context shared by all templates
+
+def nl2br(value):
+    """Escape text and turn its line breaks into <br> tags"""
+    text = str(escape(value))
+    return Markup(text.replace('\\n', '<br>').replace('\r\n', '<br>').replace('\n', '<br>'))
+
+_env = Environment(
+    loader=FileSystemLoader(EMAIL_TEMPLATE_DIR),
+    autoescape=select_autoescape(['html']),
+    # Templates are immutable at runtime; never stat the files again
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+_env.filters['nl2br'] = nl2br
+
+def normalize_language(lang):
+    return lang if lang in SUPPORTED_LANGUAGES else DEFAULT_LANGUAGE
+
+def language_strings(lang):
+    """Translations for lang with English fallbacks, as one flat dict"""
+    strings = dict(translations.get('en', {}))
+    strings.update(translations.get(lang, {}))
+    return strings
+
+def language_context(lang):
+    """Direction, alignment and translated strings for lang, built once per language"""
+    lang = normalize_language(lang)
+    context = _languages.get(lang)
+    if context is None:
+        context = {
+            'lang': lang,
+            'dir': 'rtl' if lang == 'ar' else 'ltr',
+            'align': 'right' if lang == 'ar' else 'left',
+            't': language_strings(lang)
+        }
+        _languages[lang] = context
+    return context
+
+def get_email_template(name, lang):
+    """Return the compiled template and language context for (name, lang), compiling on first use"""
+    lang = normalize_language(lang)
+    key = (name, lang)
+    cached = _compiled.get(key)
+    if cached is not None:
+        return cached
+    with _lock:
+        cached = _compiled.get(key)
+        if cached is None:
+            cached = (_env.get_template(name), language_context(lang))
+            _compiled[key] = cached
+    return cached
+
+def render_email(name, lang, **context):
+    """Render an email template for lang with the per-event variables in context"""
+    template, lang_context = get_email_template(name, lang)
+    context.setdefault('year', datetime.utcnow().year)
+    return template.render(lang_context, **context)
+
+def translate_email(key, lang, **format_args):
+    """Translated string for lang, formatted with format_args"""
+    text = language_context(lang)['t'].get(key, key)
+    return text.format(**format_args) if format_args else text
+
+def clear_email_template_cache():
+    """Drop compiled templates (e.g. after editing translations in a shell)"""
+    with _lock:
+        _compiled.clear()
+        _languages.clear()
+        _env.cache.clear()
+
+def build_price_alert_email(username, product_name, product_url, old_price, new_price, target_price=None, lang=DEFAULT_LANGUAGE):
+    """Subject and HTML body for a price change alert"""
+    price_diff = abs(new_price - old_price)
+    if new_price < old_price:
+        subject = f"🎉 تخفيض السعر! وفر {price_diff:.2f} ريال على {product_name}"
+    else:
+        subject = f"⚡ تنبيه تغير السعر - {product_name}"
+    html = render_email(
+        'price_alert.html', lang,
+        username=username,
+        product_name=product_name,
+        product_url=product_url,
+        old_price=old_price,
+        new_price=new_price,
+        price_diff=price_diff,
+        price_change_percent=(price_diff / old_price) * 100 if old_price else 0.0,
+        target_reached=bool(target_price and new_price <= target_price)
+    )
+    return subject, html
@@ -0,0 +1,146 @@
+"""
+Background health prober.
+
+A daemon thread refreshes the status of the database and Supabase on an
+interval and keeps the latest results in memory. Health endpoints serve
+that snapshot, so polling them never touches a dependency directly. SMTP
+is an external mail provider, so it is probed on its own, much longer
+interval (HEALTH_SMTP_PROBE_INTERVAL, 0 to never probe it).
+"""
+
+import os
+import time
+import socket
+import smtplib
+import threading
+import traceback
+from datetime import datetime
+
+from sqlalchemy import text
+
+HEALTH_PROBE_INTERVAL = int(os.environ.get('HEALTH_PROBE_INTERVAL', 30))
+HEALTH_PROBE_TIMEOUT = int(os.environ.get('HEALTH_PROBE_TIMEOUT', 5))
+HEALTH_SMTP_PROBE_INTERVAL = int(os.environ.get('HEALTH_SMTP_PROBE_INTERVAL', 3600))
+
+class HealthProber:
+    """Periodically probes dependencies and caches the results"""
+
+    def __init__(self, app, db, interval=HEALTH_PROBE_INTERVAL, timeout=HEALTH_PROBE_TIMEOUT,
+                 smtp_interval=HEALTH_SMTP_PROBE_INTERVAL):
+        self.app = app
+        self.db = db
+        self.interval = interval
+        self.timeout = timeout
+        self.smtp_interval = smtp_interval
+        self._smtp_result = None
+        self._smtp_checked_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._snapshot = {
+            'status': 'starting',
+            'checked_at': None,
+            'checks': {}
+        }
+
+    def ensure_started(self):
+        """Start the probe thread once per process"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+            self._thread.start()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'status': self._snapshot['status'],
+                'checked_at': self._snapshot['checked_at'],
+                'checks': {name: dict(result) for name, result in self._snapshot['checks'].items()}
+            }
+
+    def is_ready(self):
+        """Ready once a probe has run and the database answered"""
+        database = self.snapshot()['checks'].get('database')
+        return bool(database and database['status'] == 'healthy')
+
+    def _run(self):
+        while True:
+            try:
+                self.probe_once()
+            except Exception as e:
+                print(f"Health prober error: {e}")
+                traceback.print_exc()
+            time.sleep(self.interval)
+
+    def probe_once(self):
+        checks = {
+            'database': self._timed(self.check_database),
+            'supabase': self._timed(self.check_supabase),
+            'smtp': self._smtp_check(),
+        }
+        # Optional dependencies that are not configured do not degrade the service
+        degraded = any(result['status'] == 'error' for result in checks.values())
+        with self._lock:
+            self._snapshot = {
+                'status': 'degraded' if degraded else 'healthy',
+                'checked_at': datetime.utcnow().isoformat(),
+                'checks': checks
+            }
+
+    def _smtp_check(self):
+        """Last SMTP result, re-probed only every smtp_interval seconds"""
+        if self.smtp_interval <= 0:
+            return {'status': 'skipped', 'message': 'SMTP probing disabled', 'latency_ms': 0.0}
+        now = time.monotonic()
+        if self._smtp_checked_at is None or now - self._smtp_checked_at >= self.smtp_interval:
+            self._smtp_result = self._timed(self.check_smtp)
+            self._smtp_result['checked_at'] = datetime.utcnow().isoformat()
+            self._smtp_checked_at = now
+        return dict(self._smtp_result)
+
+    def _timed(self, check):
+        started = time.monotonic()
+        try:
+            status, message, extra = check()
+        except Exception as e:
+            status, message, extra = 'error', str(e), {}
+        result = {
+            'status': status,
+            'message': message,
+            'latency_ms': round((time.monotonic() - started) * 1000, 1)
+        }
+        result.update(extra)
+        return result
+
+    def check_database(self):
+        with self.app.app_context():
+            try:
+                self.db.session.execute(text("SELECT 1"))
+                return 'healthy', 'SQLAlchemy connection successful', {}
+            finally:
+                self.db.session.remove()
+
+    def check_supabase(self):
+        if not os.environ.get('SUPABASE_URL'):
+            return 'skipped', 'Supabase not configured', {}
+        from .supabase_client import check_supabase_connection
+        message, ok = check_supabase_connection()
+        return ('healthy' if ok else 'error'), message, {}
+
+    def check_smtp(self):
+        server = self.app.config.get('MAIL_SERVER')
+        if not server or not self.app.config.get('MAIL_USERNAME'):
+            return 'skipped', 'Mail not configured', {}
+        port = self.app.config.get('MAIL_PORT')
+        # Connect and say hello only; no login, no message
+        smtp_class = smtplib.SMTP_SSL if self.app.config.get('MAIL_USE_SSL') else smtplib.SMTP
+        try:
+            with smtp_class(server, port, timeout=self.timeout) as smtp:
+                code, _ = smtp.noop()
+            if code == 250:
+                return 'healthy', f'SMTP {server}:{port} reachable', {}
+            return 'warning', f'SMTP NOOP returned {code}', {}
+        except (OSError, socket.timeout, smtplib.SMTPException) as e:
+            return 'error', f'SMTP error: {str(e)}', {}
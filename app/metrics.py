@@ -0,0 +1,65 @@
+"""
+Minimal in-process metrics: named counters, gauges and timing summaries.
+
+Values are per process (each gunicorn worker keeps its own) and are exposed
+as JSON by the /metrics endpoint.
+"""
+
+import threading
+import time
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_timings = {}
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+def observe(name, seconds):
+    """Record one duration sample for name"""
+    with _lock:
+        summary = _timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        summary['count'] += 1
+        summary['total'] += seconds
+        summary['max'] = max(summary['max'], seconds)
+
+class timer:
+    """Context manager that records the elapsed time of its block under name"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.monotonic() - self.started)
+        return False
+
+def ratio(numerator, denominator):
+    """Current value of counter numerator divided by counter denominator (0 if empty)"""
+    with _lock:
+        total = _counters.get(denominator, 0)
+        return round(_counters.get(numerator, 0) / total, 4) if total else 0.0
+
+def snapshot():
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'timings': {
+                name: {
+                    'count': summary['count'],
+                    'avg': round(summary['total'] / summary['count'], 4) if summary['count'] else 0.0,
+                    'max': round(summary['max'], 4)
+                }
+                for name, summary in _timings.items()
+            }
+        }
@@ -1,18 +1,30 @@
 import json
+import hmac
 import traceback
 from datetime import datetime, timedelta
 import secrets
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSON
 
 # Import db from app
 from app import db
+from app.user_cache import user_cache, request_memo, USER_CACHE_EXCLUDED_FIELDS
+from app.pagination import keyset_page, DEFAULT_PAGE_SIZE
+from app.tokens import hash_token, verification_token_hashes, VERIFICATION_TOKEN_PREFIX_LENGTH
 
 class User(UserMixin, db.Model):
     """User model for SQLAlchemy"""
     __tablename__ = 'users'
+    __table_args__ = (
+        # verify_email / reset_password look users up by token (verification by its hash)
+        db.Index('uq_users_verification_token_hash', 'verification_token_hash', unique=True),
+        db.Index('ix_users_verification_token_prefix_hash', 'verification_token_prefix_hash'),
+        db.Index('uq_users_reset_token', 'reset_token', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -25,11 +37,16 @@ class User(UserMixin, db.Model):
     reset_token_expiry = db.Column(db.DateTime, nullable=True)
     verification_token = db.Column(db.String(255), nullable=True)
     verification_token_expiry = db.Column(db.DateTime, nullable=True)
+    # Only digests of verification tokens are stored; see hash_token()
+    verification_token_hash = db.Column(db.String(64), nullable=True)
+    verification_token_prefix_hash = db.Column(db.String(64), nullable=True)
     email_verified = db.Column(db.Boolean, default=False)
     is_admin = db.Column(db.Boolean, default=False)
     notifications_enabled = db.Column(db.Boolean, default=False)
     push_subscription = db.Column(db.Text, nullable=True)
     device_info = db.Column(db.Text, nullable=True)
+    # Denormalized count of unread notifications, maintained by the Notification listeners below
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     products = db.relationship('Product', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -50,8 +67,36 @@ class User(UserMixin, db.Model):
     def get_id(self):
         return str(self.id)
     
+    @classmethod
+    def get_cached(cls, user_id):
+        """Load a user for the current request, avoiding a query when the row is cached"""
+        key = str(user_id)
+        memo = request_memo()
+        if key in memo:
+            return memo[key]
+        
+        fields = user_cache.get(key)
+        if fields is not None:
+            # Rebuild a clean, session-attached instance without a SELECT;
+            # excluded columns are marked expired and load on first access
+            user = cls(**fields)
+            make_transient_to_detached(user)
+            user = db.session.merge(user, load=False)
+        else:
+            user = db.session.get(cls, int(user_id))
+            if user is not None:
+                user_cache.set(key, {
+                    column.key: getattr(user, column.key)
+                    for column in cls.__table__.columns
+                    if column.key not in USER_CACHE_EXCLUDED_FIELDS
+                })
+        
+        memo[key] = user
+        return user
+    
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
+        user_cache.invalidate(self.id)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -65,7 +110,8 @@ class User(UserMixin, db.Model):
     
     def generate_verification_token(self):
         verification_token = secrets.token_urlsafe(64)
-        self.verification_token = verification_token
+        self.verification_token = None
+        self.verification_token_hash, self.verification_token_prefix_hash = verification_token_hashes(verification_token)
         self.verification_token_expiry = datetime.utcnow() + timedelta(days=7)
         db.session.commit()
         return verification_token
@@ -82,8 +128,28 @@ class User(UserMixin, db.Model):
             
         return True
     
+    @classmethod
+    def find_by_verification_token(cls, token):
+        """
+        Find the user owning a verification token with at most two index probes:
+        the full-token digest, then the digest of its leading characters.
+        """
+        if not token:
+            return None
+        user = cls.query.filter_by(verification_token_hash=hash_token(token)).first()
+        if user is None and len(token) >= VERIFICATION_TOKEN_PREFIX_LENGTH:
+            user = cls.query.filter_by(
+                verification_token_prefix_hash=hash_token(token[:VERIFICATION_TOKEN_PREFIX_LENGTH])
+            ).first()
+        return user
+    
     def verify_verification_token(self, token):
-        if not self.verification_token or self.verification_token != token:
+        if not self.verification_token_hash or not token:
+            return False
+        
+        if not (hmac.compare_digest(self.verification_token_hash, hash_token(token)) or
+                hmac.compare_digest(self.verification_token_prefix_hash or '',
+                                    hash_token(token[:VERIFICATION_TOKEN_PREFIX_LENGTH]))):
             return False
             
         if not self.verification_token_expiry:
@@ -102,6 +168,8 @@ class User(UserMixin, db.Model):
     
     def clear_verification_token(self):
         self.verification_token = None
+        self.verification_token_hash = None
+        self.verification_token_prefix_hash = None
         self.verification_token_expiry = None
         self.email_verified = True
         db.session.commit()
@@ -110,9 +178,24 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    """Any flushed change to a user drops its cached fields"""
+    user_cache.invalidate(target.id)
+
 class Product(db.Model):
     """Product model for SQLAlchemy"""
     __tablename__ = 'products'
+    __table_args__ = (
+        # add_product duplicate check, and per-user listings by creation time
+        db.Index('ix_products_user_url', 'user_id', 'url'),
+        db.Index('ix_products_user_created_at', 'user_id', 'created_at'),
+        # Discount analytics read the stored discount instead of parsing price_history
+        db.Index('ix_products_user_discount_pct', 'user_id', 'discount_pct'),
+        # Dashboard pages filtered by tracking state, keyset on (created_at, id)
+        db.Index('ix_products_user_track_created_at', 'user_id', 'track_price', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -122,9 +205,14 @@ class Product(db.Model):
     price = db.Column(db.Float, nullable=True)
     currency = db.Column(db.String(10), default='SAR')
     price_history = db.Column(db.Text, default='[]')  # JSON string
+    # Kept in step with price and price_history on every write (see refresh_price_columns)
+    initial_price = db.Column(db.Float, nullable=True)
+    lowest_price = db.Column(db.Float, nullable=True)
+    discount_pct = db.Column(db.Float, nullable=True)
     target_price = db.Column(db.Float, nullable=True)
     custom_name = db.Column(db.String(255), nullable=True)
-    created_at = db.Column(db.DateTime, default=func.now())
+    # Set in Python so stored values carry microseconds and keyset cursors compare exactly
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     last_checked = db.Column(db.DateTime, default=func.now())
     track_price = db.Column(db.Boolean, default=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -133,6 +221,20 @@ class Product(db.Model):
     def display_name(self):
         return self.custom_name if self.custom_name else self.name
     
+    @classmethod
+    def get_page(cls, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, tracking=None, search=None, oldest_first=False):
+        """
+        One dashboard page of a user's products; returns (products, next_cursor)
+        tracking filters on track_price when True/False; search matches the name or custom name
+        """
+        query = cls.query.filter_by(user_id=user_id)
+        if tracking is not None:
+            query = query.filter_by(track_price=tracking)
+        if search:
+            search_term = f"%{search}%"
+            query = query.filter(db.or_(cls.name.ilike(search_term), cls.custom_name.ilike(search_term)))
+        return keyset_page(query, cls.created_at, cls.id, cursor=cursor, limit=limit, ascending=oldest_first)
+    
     def get_price_history(self):
         try:
             return json.loads(self.price_history)
@@ -156,18 +258,60 @@ class Product(db.Model):
         self.price_history = json.dumps(history)
         db.session.commit()
     
+    def refresh_price_columns(self):
+        """
+        Update initial_price (first recorded price), lowest_price and
+        discount_pct (current price below initial_price) from the price history
+        """
+        prices = []
+        for point in self.get_price_history():
+            try:
+                prices.append(float(point['price']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        prices = [price for price in prices if price > 0]
+        current = self.price if self.price is not None else (prices[-1] if prices else None)
+        if current is not None:
+            prices.append(current)
+        if not prices:
+            return
+        # History is trimmed to the last 100 points, so earlier values are kept once set
+        if self.initial_price is None:
+            self.initial_price = prices[0]
+        self.lowest_price = min(prices) if self.lowest_price is None else min(self.lowest_price, *prices)
+        if current is not None and self.initial_price > current:
+            self.discount_pct = round((self.initial_price - current) * 100 / self.initial_price, 1)
+        else:
+            self.discount_pct = 0.0
+    
     def __repr__(self):
         return f'<Product {self.name}>'
 
+@event.listens_for(Product, 'before_insert')
+def set_product_price_columns(mapper, connection, target):
+    target.refresh_price_columns()
+
+@event.listens_for(Product, 'before_update')
+def update_product_price_columns(mapper, connection, target):
+    state = db.inspect(target)
+    if state.attrs.price.history.has_changes() or state.attrs.price_history.history.has_changes():
+        target.refresh_price_columns()
+
 class Notification(db.Model):
     """Notification model for SQLAlchemy"""
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Unread lists, and the (created_at, id) keyset feed
+        db.Index('ix_notifications_user_read_created_at', 'user_id', 'read', 'created_at'),
+        db.Index('ix_notifications_user_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
     read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=func.now())
+    # Set in Python so stored values carry microseconds and keyset cursors compare exactly
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=True)
     notification_type = db.Column(db.String(50), default='price_drop')
     
@@ -175,15 +319,127 @@ class Notification(db.Model):
     
     @classmethod
     def mark_all_as_read(cls, user_id):
-        notifications = cls.query.filter_by(user_id=user_id, read=False).all()
-        for notification in notifications:
-            notification.read = True
+        # One set-based UPDATE; bulk updates skip the row listeners, so subtract the rows it
+        # changed (not reset to 0: a notification inserted meanwhile must stay counted)
+        changed = cls.query.filter(cls.user_id == user_id, cls.read.isnot(True)).update(
+            {'read': True}, synchronize_session=False
+        )
+        if changed:
+            _adjust_unread_count(db.session.connection(), user_id, -changed)
+        db.session.commit()
+        return True
+    
+    @classmethod
+    def get_feed(cls, user_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Newest-first page of a user's notifications; returns (notifications, next_cursor)"""
+        query = cls.query.filter_by(user_id=user_id)
+        return keyset_page(query, cls.created_at, cls.id, cursor=cursor, limit=limit)
+    
+    def mark_as_read(self):
+        self.read = True
         db.session.commit()
         return True
     
     def __repr__(self):
         return f'<Notification {self.id}>'
 
+def _adjust_unread_count(connection, user_id, delta):
+    """Apply delta to a user's unread counter inside the current flush's transaction"""
+    users = User.__table__
+    connection.execute(
+        users.update()
+        .where(users.c.id == user_id)
+        .values(unread_notifications=func.greatest(users.c.unread_notifications + delta, 0)
+                if connection.dialect.name == 'postgresql'
+                else func.max(users.c.unread_notifications + delta, 0))
+    )
+
+@event.listens_for(Notification, 'after_insert')
+def count_new_notification(mapper, connection, target):
+    if not target.read:
+        _adjust_unread_count(connection, target.user_id, 1)
+
+@event.listens_for(Notification, 'after_update')
+def count_read_state_change(mapper, connection, target):
+    history = db.inspect(target).attrs.read.history
+    if not history.has_changes():
+        return
+    was_read = bool(history.deleted[0]) if history.deleted else False
+    if was_read != bool(target.read):
+        _adjust_unread_count(connection, target.user_id, -1 if target.read else 1)
+
+@event.listens_for(Notification, 'after_delete')
+def count_deleted_notification(mapper, connection, target):
+    if not target.read:
+        _adjust_unread_count(connection, target.user_id, -1)
+
+class OutboxEmail(db.Model):
+    """Outgoing email waiting to be delivered by the outbox sender"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # The sender polls for due pending messages
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=True)
+    html = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.status}>'
+
+class NotificationArchive(db.Model):
+    """A read notification moved out of notifications by the retention job"""
+    __tablename__ = 'notification_archive'
+    
+    # Keeps the notification's own id, so a row can never be archived twice
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=True)
+    notification_type = db.Column(db.String(50), nullable=True)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<NotificationArchive {self.id}>'
+
+class AlertEvent(db.Model):
+    """A price change waiting to be delivered in the user's next alert digest"""
+    __tablename__ = 'alert_events'
+    __table_args__ = (
+        # The digest sweep looks for users with undelivered events older than the window
+        db.Index('ix_alert_events_pending', 'digest_id', 'user_id', 'created_at'),
+        # Notification policy: recent alerts per user/product, and per user
+        db.Index('ix_alert_events_user_product_created_at', 'user_id', 'product_id', 'created_at'),
+        db.Index('ix_alert_events_user_created_at', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='SET NULL'), nullable=True)
+    product_name = db.Column(db.String(255), nullable=False)
+    product_url = db.Column(db.String(1024), nullable=True)
+    old_price = db.Column(db.Float, nullable=False)
+    new_price = db.Column(db.Float, nullable=False)
+    target_price = db.Column(db.Float, nullable=True)
+    event_type = db.Column(db.String(20), nullable=False, default='price_drop')  # price_drop, price_increase, target_reached
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set when a digest claims the event; NULL while pending
+    digest_id = db.Column(db.String(32), nullable=True)
+    digested_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<AlertEvent {self.id} {self.event_type}>'
+
 def init_db():
     """Initialize the database - can be called from scripts"""
     db.create_all()
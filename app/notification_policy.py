@@ -0,0 +1,92 @@
+"""
+Notification policy for price alerts.
+
+Decides whether a price change is worth an alert before it reaches the
+digest. Changes smaller than ALERT_MIN_CHANGE_PERCENT of the last alerted
+price are ignored (target-price hits excepted), the same product at the
+same price is not alerted twice within ALERT_DEDUP_HOURS, and alerts are
+capped per user and per user/product each hour. Target-price hits are
+never capped: the user asked for them explicitly. All checks read recent
+alert_events rows through their indexes.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy.sql import func
+
+from app import db, metrics
+from app.models import AlertEvent
+
+ALERT_MIN_CHANGE_PERCENT = float(os.environ.get('ALERT_MIN_CHANGE_PERCENT', 1.0))
+ALERT_DEDUP_HOURS = int(os.environ.get('ALERT_DEDUP_HOURS', 24))
+ALERT_USER_HOURLY_CAP = int(os.environ.get('ALERT_USER_HOURLY_CAP', 10))
+ALERT_PRODUCT_HOURLY_CAP = int(os.environ.get('ALERT_PRODUCT_HOURLY_CAP', 2))
+
+def _product_filter(product_id, product_url):
+    if product_id is not None:
+        return AlertEvent.product_id == product_id
+    return AlertEvent.product_url == product_url
+
+def last_alerted_price(user_id, product_id, product_url):
+    """Price in the user's most recent alert for this product, or None"""
+    row = (db.session.query(AlertEvent.new_price)
+           .filter(AlertEvent.user_id == user_id, _product_filter(product_id, product_url))
+           .order_by(AlertEvent.created_at.desc())
+           .first())
+    return row.new_price if row else None
+
+def check_alert(user_id, product_id, product_url, old_price, new_price, event_type, now=None):
+    """
+    Apply the policy to one candidate alert.
+
+    Returns:
+        (allowed, reason) where reason names the rule that suppressed it
+    """
+    now = now or datetime.utcnow()
+
+    # Hysteresis: measure against the last price we alerted on, so a slow drift
+    # still alerts once it adds up while flapping around one value does not
+    if event_type != 'target_reached':
+        reference = last_alerted_price(user_id, product_id, product_url)
+        if reference is None:
+            reference = old_price
+        if reference and abs(new_price - reference) / reference * 100 < ALERT_MIN_CHANGE_PERCENT:
+            return False, 'below_threshold'
+
+    duplicate = (db.session.query(AlertEvent.id)
+                 .filter(AlertEvent.user_id == user_id,
+                         _product_filter(product_id, product_url),
+                         AlertEvent.new_price == new_price,
+                         AlertEvent.created_at >= now - timedelta(hours=ALERT_DEDUP_HOURS))
+                 .first())
+    if duplicate:
+        return False, 'duplicate'
+
+    if event_type == 'target_reached':
+        return True, None
+
+    hour_ago = now - timedelta(hours=1)
+    product_count = (db.session.query(func.count(AlertEvent.id))
+                     .filter(AlertEvent.user_id == user_id,
+                             _product_filter(product_id, product_url),
+                             AlertEvent.created_at >= hour_ago)
+                     .scalar())
+    if product_count >= ALERT_PRODUCT_HOURLY_CAP:
+        return False, 'product_rate_limited'
+
+    user_count = (db.session.query(func.count(AlertEvent.id))
+                  .filter(AlertEvent.user_id == user_id, AlertEvent.created_at >= hour_ago)
+                  .scalar())
+    if user_count >= ALERT_USER_HOURLY_CAP:
+        return False, 'user_rate_limited'
+
+    return True, None
+
+def allow_alert(user_id, product_id, product_url, old_price, new_price, event_type):
+    """check_alert() that also counts suppressions by reason"""
+    allowed, reason = check_alert(user_id, product_id, product_url, old_price, new_price, event_type)
+    if not allowed:
+        metrics.increment(f'alerts_suppressed_{reason}')
+        print(f"Suppressed {event_type} alert for user {user_id} product {product_id or product_url}: {reason}")
+    return allowed
@@ -0,0 +1,235 @@
+"""
+Durable outbound email queue.
+
+Request handlers only add rows to email_outbox, in their own transaction,
+so an email is queued exactly when the change it belongs to commits. A
+sender loop claims due messages in batches and delivers them over one
+long-lived SMTP connection, retrying failures with exponential backoff.
+The loop runs as a daemon thread in each web worker, started with the
+worker's first request (EMAIL_WORKER_IN_PROCESS, on by default), or
+standalone via email_worker.py. Claiming is a conditional UPDATE, so
+several senders can share one outbox without sending a message twice.
+"""
+
+import os
+import time
+import smtplib
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+
+from app import app, db, mail, metrics
+from app.models import OutboxEmail
+
+OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL', 5))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+OUTBOX_BACKOFF_BASE = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_BASE', 30))       # seconds
+OUTBOX_BACKOFF_MAX = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_MAX', 3600))       # seconds
+OUTBOX_IDLE_DISCONNECT = float(os.environ.get('EMAIL_OUTBOX_IDLE_DISCONNECT', 60))  # seconds
+# The email_outbox_depth gauge is a COUNT(*); refresh it after each sent batch, and only this often when idle
+OUTBOX_DEPTH_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_DEPTH_INTERVAL', 60))   # seconds
+# Messages stuck in 'sending' longer than this (a sender died mid-batch) are retried;
+# each reclaim counts as a failed attempt
+OUTBOX_CLAIM_TIMEOUT = int(os.environ.get('EMAIL_OUTBOX_CLAIM_TIMEOUT', 600))    # seconds
+
+_worker = None
+_worker_lock = threading.Lock()
+
+STALE_CLAIM_ERROR = 'Sender stopped before confirming delivery'
+
+def enqueue_email(to, subject, body, html=None):
+    """
+    Add an email to the outbox in the current transaction and return its row id.
+    The caller commits; the message is sent only once that commit succeeds.
+    """
+    message = OutboxEmail(recipient=to, subject=subject, body=body, html=html)
+    db.session.add(message)
+    db.session.flush()
+    metrics.increment('email_enqueued')
+    return message.id
+
+def backoff_delay(attempts):
+    """Seconds to wait before the next attempt after `attempts` failures"""
+    return min(OUTBOX_BACKOFF_BASE * (2 ** max(attempts - 1, 0)), OUTBOX_BACKOFF_MAX)
+
+def queue_depth():
+    return OutboxEmail.query.filter(OutboxEmail.status.in_(('pending', 'sending'))).count()
+
+def claim_batch(limit=OUTBOX_BATCH_SIZE):
+    """Atomically move up to `limit` due messages from pending to sending and return them"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+    stale_claim = db.and_(OutboxEmail.status == 'sending', OutboxEmail.next_attempt_at <= stale)
+
+    # A stale claim was an attempt that never finished (possibly a message that
+    # crashes the sender); give up on it once it has used its last attempt
+    given_up = OutboxEmail.query.filter(
+        stale_claim, OutboxEmail.attempts >= OUTBOX_MAX_ATTEMPTS - 1
+    ).update({
+        'status': 'failed',
+        'attempts': OutboxEmail.attempts + 1,
+        'last_error': STALE_CLAIM_ERROR
+    }, synchronize_session=False)
+    if given_up:
+        db.session.commit()
+        metrics.increment('email_failed', given_up)
+        print(f"Gave up on {given_up} outbox emails whose sender stopped on the last attempt")
+
+    candidate_ids = [row.id for row in (
+        OutboxEmail.query
+        .with_entities(OutboxEmail.id)
+        .filter(db.or_(
+            db.and_(OutboxEmail.status == 'pending', OutboxEmail.next_attempt_at <= now),
+            stale_claim
+        ))
+        .order_by(OutboxEmail.next_attempt_at, OutboxEmail.id)
+        .limit(limit)
+        .all()
+    )]
+
+    claimed = []
+    for message_id in candidate_ids:
+        # Conditional update: only one sender can win each row
+        won = OutboxEmail.query.filter(
+            OutboxEmail.id == message_id, OutboxEmail.status == 'pending'
+        ).update({'status': 'sending', 'next_attempt_at': now}, synchronize_session=False)
+        if not won:
+            won = OutboxEmail.query.filter(OutboxEmail.id == message_id, stale_claim).update({
+                'status': 'sending',
+                'next_attempt_at': now,
+                'attempts': OutboxEmail.attempts + 1,
+                'last_error': STALE_CLAIM_ERROR
+            }, synchronize_session=False)
+            if won:
+                metrics.increment('email_retried')
+        if won:
+            claimed.append(message_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return OutboxEmail.query.filter(OutboxEmail.id.in_(claimed)).order_by(OutboxEmail.id).all()
+
+def _to_message(outbox_email):
+    return Message(
+        subject=outbox_email.subject,
+        recipients=[outbox_email.recipient],
+        body=outbox_email.body,
+        html=outbox_email.html,
+        sender=app.config.get('MAIL_DEFAULT_SENDER') or app.config.get('MAIL_USERNAME')
+    )
+
+def _record_failure(outbox_email, error):
+    outbox_email.attempts += 1
+    outbox_email.last_error = str(error)[:2000]
+    if outbox_email.attempts >= OUTBOX_MAX_ATTEMPTS:
+        outbox_email.status = 'failed'
+        metrics.increment('email_failed')
+        print(f"Giving up on email {outbox_email.id} to {outbox_email.recipient} after {outbox_email.attempts} attempts: {error}")
+    else:
+        outbox_email.status = 'pending'
+        outbox_email.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_delay(outbox_email.attempts))
+        metrics.increment('email_retried')
+        print(f"Email {outbox_email.id} to {outbox_email.recipient} failed (attempt {outbox_email.attempts}), retrying later: {error}")
+
+class OutboxSender:
+    """Delivers outbox batches, keeping one SMTP connection open while there is work"""
+
+    def __init__(self):
+        self._connection = None
+        self._last_used = 0.0
+        self._depth_checked_at = None
+
+    def _get_connection(self):
+        if self._connection is None:
+            with metrics.timer('email_smtp_connect_seconds'):
+                self._connection = mail.connect()
+                self._connection.__enter__()
+        self._last_used = time.monotonic()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.__exit__(None, None, None)
+            except Exception as e:
+                print(f"Error closing SMTP connection: {e}")
+            self._connection = None
+
+    def close_if_idle(self):
+        if self._connection is not None and time.monotonic() - self._last_used > OUTBOX_IDLE_DISCONNECT:
+            self.close()
+
+    def send_one(self, outbox_email):
+        message = _to_message(outbox_email)
+        for attempt in (1, 2):
+            try:
+                with metrics.timer('email_send_seconds'):
+                    self._get_connection().send(message)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, OSError):
+                # The long-lived connection went stale; reconnect once before failing the message
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def process_batch(self, limit=OUTBOX_BATCH_SIZE):
+        """Send one claimed batch; returns (delivered, claimed) message counts"""
+        batch = claim_batch(limit)
+        sent = 0
+        for outbox_email in batch:
+            try:
+                self.send_one(outbox_email)
+                outbox_email.status = 'sent'
+                outbox_email.sent_at = datetime.utcnow()
+                outbox_email.last_error = None
+                sent += 1
+                metrics.increment('email_sent')
+            except Exception as e:
+                _record_failure(outbox_email, e)
+            db.session.commit()
+        now = time.monotonic()
+        if batch or self._depth_checked_at is None or now - self._depth_checked_at >= OUTBOX_DEPTH_INTERVAL:
+            metrics.set_gauge('email_outbox_depth', queue_depth())
+            self._depth_checked_at = now
+        return sent, len(batch)
+
+    def run_forever(self, poll_interval=OUTBOX_POLL_INTERVAL, batch_size=OUTBOX_BATCH_SIZE):
+        while True:
+            try:
+                with app.app_context():
+                    try:
+                        sent, claimed = self.process_batch(batch_size)
+                    finally:
+                        db.session.remove()
+                if claimed:
+                    # Keep draining while there is work, reusing the open connection
+                    continue
+                self.close_if_idle()
+            except Exception as e:
+                print(f"Email outbox sender error: {e}")
+                traceback.print_exc()
+                self.close()
+            time.sleep(poll_interval)
+
+def ensure_worker_started():
+    """Start the in-process sender thread once per process, unless disabled"""
+    global _worker
+    if os.environ.get('EMAIL_WORKER_IN_PROCESS', 'True').lower() not in ['true', '1', 't', 'yes', 'y']:
+        return
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=OutboxSender().run_forever, name='email-outbox', daemon=True)
+        _worker.start()
+
+@app.before_request
+def start_outbox_worker():
+    # Started from the first request rather than at import, so the thread is
+    # created in each forked web worker and not in scripts that import the app
+    ensure_worker_started()
@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor identifies the last row of the previous page by its sort key
+(created_at, id), so the next page is a single index range scan instead of
+an OFFSET that re-reads every earlier row.
+"""
+
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) pair as an opaque URL-safe token"""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = f"{created_at}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor back to (created_at_iso, id); returns None if malformed,
+    so a tampered cursor falls back to the first page
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').rsplit('|', 1)
+        # Also keeps anything but a timestamp out of the PostgREST filter built from it
+        datetime.fromisoformat(created_at)
+        return created_at, int(row_id)
+    except Exception:
+        return None
+
+def clamp_page_size(limit):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def keyset_page(query, created_at_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE, ascending=False):
+    """
+    Return (rows, next_cursor) for a newest-first (or, with ascending, oldest-first) page of query.
+
+    Fetches limit + 1 rows to learn whether another page exists without a COUNT.
+    """
+    limit = clamp_page_size(limit)
+    position = decode_cursor(cursor)
+    if position:
+        created_at, row_id = position
+        created_at = datetime.fromisoformat(created_at)
+        if ascending:
+            query = query.filter(or_(
+                created_at_column > created_at,
+                and_(created_at_column == created_at, id_column > row_id)
+            ))
+        else:
+            query = query.filter(or_(
+                created_at_column < created_at,
+                and_(created_at_column == created_at, id_column < row_id)
+            ))
+
+    if ascending:
+        order = (created_at_column.asc(), id_column.asc())
+    else:
+        order = (created_at_column.desc(), id_column.desc())
+    rows = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_at_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
@@ -0,0 +1,184 @@
+"""
+Web push fan-out.
+
+PushDispatcher sends a batch of (user_id, subscription, payload) messages
+concurrently over a bounded thread pool that shares one keep-alive HTTP
+session. VAPID headers are signed once per push service and reused until
+shortly before they expire. Subscriptions the push service reports as gone
+(404/410) are cleared afterwards in one bulk UPDATE.
+"""
+
+import os
+import json
+import time
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import app, db, metrics
+from app.user_cache import user_cache
+
+PUSH_POOL_SIZE = int(os.environ.get('PUSH_POOL_SIZE', 8))
+PUSH_TIMEOUT = float(os.environ.get('PUSH_TIMEOUT', 10))         # seconds
+PUSH_TTL = int(os.environ.get('PUSH_TTL', 24 * 60 * 60))           # seconds the push service keeps an undelivered message
+VAPID_CLAIM_SUBJECT = os.environ.get('VAPID_CLAIM_SUBJECT', 'mailto:info@zonar.com')
+VAPID_TOKEN_LIFETIME = 12 * 60 * 60                                # seconds; push services reject tokens over 24h
+VAPID_REFRESH_MARGIN = 10 * 60                                     # re-sign this long before expiry
+
+EXPIRED_STATUS_CODES = (404, 410)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+class VapidHeaderCache:
+    """Signs VAPID claims once per push service audience and reuses them until near expiry"""
+
+    def __init__(self, private_key, subject=VAPID_CLAIM_SUBJECT, lifetime=VAPID_TOKEN_LIFETIME,
+                 refresh_margin=VAPID_REFRESH_MARGIN):
+        from py_vapid import Vapid, Vapid01
+
+        if isinstance(private_key, Vapid01):
+            self._vapid = private_key
+        elif private_key and os.path.isfile(private_key):
+            self._vapid = Vapid.from_file(private_key_file=private_key)
+        else:
+            self._vapid = Vapid.from_string(private_key=private_key)
+        self.subject = subject
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._headers = {}  # audience -> (headers, expires_at)
+
+    @staticmethod
+    def audience(endpoint):
+        url = urlparse(endpoint)
+        return f"{url.scheme}://{url.netloc}"
+
+    def headers_for(self, endpoint):
+        aud = self.audience(endpoint)
+        now = time.time()
+        with self._lock:
+            cached = self._headers.get(aud)
+            if cached and cached[1] - self.refresh_margin > now:
+                metrics.increment('push_vapid_cache_hits')
+                return dict(cached[0])
+            expires_at = int(now) + self.lifetime
+            headers = self._vapid.sign({'sub': self.subject, 'aud': aud, 'exp': expires_at})
+            self._headers[aud] = (headers, expires_at)
+            metrics.increment('push_vapid_signatures')
+            return dict(headers)
+
+class PushDispatcher:
+    """Concurrent web push sender with a shared keep-alive session"""
+
+    def __init__(self, private_key, subject=VAPID_CLAIM_SUBJECT, pool_size=PUSH_POOL_SIZE,
+                 timeout=PUSH_TIMEOUT, ttl=PUSH_TTL):
+        self.vapid = VapidHeaderCache(private_key, subject)
+        self.timeout = timeout
+        self.ttl = ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='push')
+
+    def _send_one(self, message):
+        from pywebpush import WebPusher
+
+        user_id, subscription, payload = message
+        try:
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            with metrics.timer('push_send_seconds'):
+                response = WebPusher(subscription, requests_session=self.session).send(
+                    data,
+                    headers=self.vapid.headers_for(subscription['endpoint']),
+                    ttl=self.ttl,
+                    timeout=self.timeout
+                )
+            if response.status_code in EXPIRED_STATUS_CODES:
+                return user_id, 'expired', response.status_code
+            if response.status_code > 202:
+                print(f"Push to user {user_id} failed: {response.status_code} {response.reason}")
+                return user_id, 'failed', response.status_code
+            return user_id, 'sent', response.status_code
+        except Exception as e:
+            print(f"Push to user {user_id} failed: {str(e)}")
+            return user_id, 'failed', None
+
+    def send_batch(self, messages):
+        """
+        Send (user_id, subscription_info, payload) messages concurrently.
+
+        Returns:
+            Dict with sent/failed counts and the user ids whose subscriptions expired
+        """
+        report = {'sent': 0, 'failed': 0, 'expired': []}
+        for user_id, outcome, _ in self._executor.map(self._send_one, messages):
+            if outcome == 'expired':
+                report['expired'].append(user_id)
+            else:
+                report[outcome] += 1
+        metrics.increment('push_sent', report['sent'])
+        metrics.increment('push_failed', report['failed'])
+        metrics.increment('push_expired', len(report['expired']))
+        return report
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+def get_dispatcher():
+    """Process-wide dispatcher built from VAPID_PRIVATE_KEY, or None if push is not configured"""
+    global _dispatcher
+    if _dispatcher is None:
+        private_key = app.config.get('VAPID_PRIVATE_KEY') or os.environ.get('VAPID_PRIVATE_KEY')
+        if not private_key:
+            return None
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = PushDispatcher(private_key)
+    return _dispatcher
+
+def prune_expired_subscriptions(user_ids):
+    """Clear dead push subscriptions in one UPDATE"""
+    from app.models import User
+
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return 0
+    cleared = User.query.filter(User.id.in_(user_ids)).update(
+        {'push_subscription': None}, synchronize_session=False
+    )
+    db.session.commit()
+    # Bulk updates skip the model listeners, so drop the cached users here
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+    return cleared
+
+def build_messages(users, payload):
+    """Messages for every user that has an active push subscription"""
+    messages = []
+    for user in users:
+        if not user.push_subscription or not user.notifications_enabled:
+            continue
+        try:
+            messages.append((user.id, json.loads(user.push_subscription), payload))
+        except ValueError:
+            print(f"Ignoring malformed push subscription for user {user.id}")
+    return messages
+
+def dispatch(messages, dispatcher=None):
+    """Send a batch of push messages and prune the subscriptions that expired"""
+    if not messages:
+        return {'sent': 0, 'failed': 0, 'expired': []}
+    dispatcher = dispatcher or get_dispatcher()
+    if dispatcher is None:
+        print("Push not configured (VAPID_PRIVATE_KEY missing); skipping notifications")
+        return {'sent': 0, 'failed': len(messages), 'expired': []}
+    report = dispatcher.send_batch(messages)
+    if report['expired']:
+        prune_expired_subscriptions(report['expired'])
+    return report
@@ -1,6 +1,7 @@
 # Routes will be imported from the original app.py file 
 
 import os
+import hmac
 import json
 import traceback
 from datetime import datetime, timedelta
@@ -9,8 +10,16 @@ from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from app import app, db, translate
+from app import metrics
+from app.outbox import enqueue_email, queue_depth
+from app.email_templates import render_email, translate_email
+from app.digests import record_price_change
+from app.push import dispatch
 from app.models import User, Product, Notification
 
+# Products rendered per dashboard page (the first server-side, the rest from /products)
+DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', 12))
+
 # Routes
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -146,6 +155,8 @@ def signup():
                 
                 if not welcome_email_sent:
                     print(f"WARNING: Could not send welcome email to {email}")
+                # Commit the queued emails
+                db.session.commit()
                 
                 print("Logging in new user")
                 login_user(user)
@@ -173,6 +184,102 @@ def signup():
         flash('An error occurred during signup. Please try again.', 'danger')
         return render_template('signup.html', unread_count=0)
 
+def product_card(product):
+    """The fields a dashboard card shows; price history itself is loaded on demand"""
+    previous_price = None
+    history = product.get_price_history()
+    if len(history) > 1:
+        try:
+            previous_price = float(history[-2]['price'])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return {
+        'id': product.id,
+        'name': product.name,
+        'custom_name': product.custom_name,
+        'image_url': product.image_url,
+        'current_price': product.price,
+        'previous_price': previous_price,
+        'target_price': product.target_price,
+        'lowest_price': product.lowest_price,
+        'discount_pct': product.discount_pct,
+        'tracking_enabled': bool(product.track_price),
+        'notify_on_any_change': bool(getattr(product, 'notify_on_any_change', False)),
+        'created_at': product.created_at.isoformat() if product.created_at else None,
+    }
+
+def dashboard_filters():
+    """Page filters from the query string: cursor, limit, tracking (all/on/off), sort (newest/oldest), search"""
+    tracking = {'on': True, 'off': False}.get(request.args.get('tracking', 'all'))
+    return {
+        'cursor': request.args.get('cursor'),
+        'limit': request.args.get('limit', DASHBOARD_PAGE_SIZE),
+        'tracking': tracking,
+        'search': request.args.get('search', '').strip() or None,
+        'oldest_first': request.args.get('sort') == 'oldest',
+    }
+
+@app.route('/dashboard')
+@login_required
+def home():
+    """Product dashboard: the first page is rendered here, later pages load from /products"""
+    try:
+        filters = dashboard_filters()
+        products, next_cursor = Product.get_page(current_user.id, **filters)
+        # With a filter an empty page means "no matches", not "no products yet"
+        filtered = filters['tracking'] is not None or filters['search']
+        return render_template(
+            'index.html',
+            products=[product_card(product) for product in products],
+            next_cursor=next_cursor,
+            has_products=bool(products) or bool(filtered),
+            search_query=filters['search'] or '',
+            tracking=request.args.get('tracking', 'all'),
+            sort='oldest' if filters['oldest_first'] else 'newest',
+            email_verified=current_user.email_verified
+        )
+    except Exception as e:
+        print(f"Error in dashboard route: {str(e)}")
+        traceback.print_exc()
+        flash(translate('error_occurred'), 'danger')
+        return redirect(url_for('index'))
+
+@app.route('/products')
+@login_required
+def products_page():
+    """One page of the user's products (keyset paginated), as data and as rendered cards"""
+    try:
+        products, next_cursor = Product.get_page(current_user.id, **dashboard_filters())
+        cards = [product_card(product) for product in products]
+        return jsonify({
+            'success': True,
+            'products': cards,
+            'html': render_template('product_cards.html', products=cards),
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        print(f"Error loading products: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': translate('error_occurred')}), 500
+
+@app.route('/products/<int:product_id>/history')
+@login_required
+def product_price_history(product_id):
+    """A product's price history, newest first, for the dashboard's history modal"""
+    product = Product.query.filter_by(id=product_id, user_id=current_user.id).first_or_404()
+    history = []
+    for point in reversed(product.get_price_history()):
+        if isinstance(point, dict):
+            history.append({'price': point.get('price'), 'date': point.get('date') or point.get('timestamp')})
+    return jsonify({
+        'success': True,
+        'id': product.id,
+        'name': product.display_name,
+        'history': history,
+        'lowest_price': product.lowest_price,
+        'initial_price': product.initial_price
+    })
+
 @app.route('/add_product', methods=['POST'])
 @login_required
 def add_product():
@@ -305,7 +412,7 @@ def add_product():
             if current_user.email_verified:
                 product_name = custom_name or product_data['name']
                 print(f"Sending tracking started email for product {product_name} to {current_user.email}")
-                send_localized_email(
+                if send_localized_email(
                     current_user,
                     subject_key="tracking_email_subject",
                     greeting_key="tracking_email_greeting",
@@ -313,7 +420,8 @@ def add_product():
                     footer_key="tracking_email_footer",
                     product_name=product_name,
                     current_price=product_data['price']
-                )
+                ):
+                    db.session.commit()
             else:
                 print(f"Email not verified for user {current_user.id}. Skipping email notification.")
                 # Add notification in the app to remind user to verify email
@@ -543,160 +651,21 @@ def check_price(product_id):
         product.current_price = new_price
         product.last_checked = datetime.utcnow()
         
-        # Create notification if price changed and notifications are enabled
-        if new_price != old_price:
-            should_notify = False
-            notification_message = ""
-            
-            # Determine message based on price change
-            if new_price < old_price:
-                notification_message = f"{product.custom_name or product.name}: {translate('price_dropped')} {new_price}."
-                should_notify = True # Notify on any drop or target reach
-            elif new_price > old_price and product.notify_on_any_change:
-                 notification_message = f"{product.custom_name or product.name}: {translate('price_increased')} {new_price}."
-                 should_notify = True # Notify on increase only if user opted in
-            
-            # Check target price
-            if product.target_price and new_price <= product.target_price:
-                notification_message += f" {translate('target_reached')}!"
-                should_notify = True # Always notify if target reached
-            
-            # Send email and create DB notification if needed and email is verified
-            if should_notify and current_user.email_verified:
-                 print(f"Sending price change notification email to {current_user.email} for product {product.id}")
-                 
-                 # Calculate price difference and percentage
-                 price_diff = abs(new_price - old_price)
-                 price_change_percent = (price_diff / old_price) * 100
-                 
-                 # Create engaging subject lines in both languages
-                 if new_price < old_price:
-                     email_subject = f"🎉 تخفيض السعر! وفر {price_diff:.2f} ريال على {product.custom_name or product.name}"
-                 else:
-                     email_subject = f"⚡ تنبيه تغير السعر - {product.custom_name or product.name}"
-                 
-                 # Pre-process footer to avoid f-string backslash issues
-                 footer_text = translate('price_change_footer') if 'price_change_footer' in translations[g.lang] else "We'll continue monitoring the price for you."
-                 footer_html = footer_text.replace('\\\\n', '<br>')
-                 
-                 # Create an engaging HTML email body with bilingual support
-                 email_body = f"""
-                 <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                     <div dir="rtl" style="text-align: right;">
-                         <h2 style="color: #FF6B00; margin-bottom: 20px;">مرحباً {current_user.username}،</h2>
-                         
-                         <div style="background-color: #FFF5E6; border-radius: 10px; padding: 20px; margin-bottom: 20px;">
-                             <h3 style="margin-top: 0;">{product.custom_name or product.name}</h3>
-                             
-                             <div style="display: flex; justify-content: space-between; margin: 15px 0;">
-                                 <div style="text-align: right;">
-                                     <p style="color: #666; margin: 0;">السعر الحالي:</p>
-                                     <p style="font-size: 24px; color: {'#2E7D32' if new_price < old_price else '#D32F2F'}; font-weight: bold; margin: 5px 0;">
-                                         {new_price:.2f} ريال
-                                     </p>
-                                 </div>
-                                 <div style="text-align: left;">
-                                     <p style="color: #666; margin: 0;">السعر السابق:</p>
-                                     <p style="font-size: 18px; margin: 5px 0;"><strike>{old_price:.2f} ريال</strike></p>
-                                 </div>
-                             </div>
-                             
-                             {f'<p style="color: #2E7D32; font-weight: bold; font-size: 18px; margin: 10px 0;">التوفير: {price_diff:.2f} ريال ({price_change_percent:.1f}%)</p>' if new_price < old_price else ''}
-                             
-                             {f'<p style="color: #D32F2F; font-size: 16px; margin: 10px 0;">ارتفع السعر بمقدار {price_diff:.2f} ريال ({price_change_percent:.1f}%)</p>' if new_price > old_price else ''}
-                         </div>
-                         
-                         {'<p style="font-size: 16px; color: #2E7D32; margin: 15px 0;"><strong>🎯 تم الوصول للسعر المستهدف!</strong> الآن هو الوقت المناسب للشراء!</p>' if product.target_price and new_price <= product.target_price else ''}
-                         
-                         <a href="{product.url}" style="display: inline-block; background: linear-gradient(135deg, #FF9800, #FF6B00); color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; font-size: 16px; margin: 20px 0;">
-                             {'🛒 اشترِ الآن - سعر محدود!' if new_price < old_price else '🛒 عرض المنتج'}
-                         </a>
-                         
-                         <p style="color: #666; font-size: 14px; margin-top: 20px;">
-                             سنواصل مراقبة السعر وإخطارك بأي تغييرات.
-                         </p>
-                         
-                         <hr style="border: none; border-top: 1px solid #EEE; margin: 20px 0;">
-                         
-                         <div style="color: #999; font-size: 12px;">
-                             {footer_html}
-                         </div>
-                         
-                         <div style="text-align: center; margin-top: 20px; padding-top: 20px; 
-                                   border-top: 1px solid #eee; color: #999; font-size: 12px;">
-                             <p>© {datetime.now().year} ZONAR - زونار</p>
-                         </div>
-                     </div>
-
-                     <!-- English Version -->
-                     <div dir="ltr" style="text-align: left; margin-top: 40px; border-top: 2px solid #EEE; padding-top: 20px;">
-                         <h2 style="color: #FF6B00; margin-bottom: 20px;">Hello {current_user.username},</h2>
-                         
-                         <div style="background-color: #FFF5E6; border-radius: 10px; padding: 20px; margin-bottom: 20px;">
-                             <h3 style="margin-top: 0;">{product.custom_name or product.name}</h3>
-                             
-                             <div style="display: flex; justify-content: space-between; margin: 15px 0;">
-                                 <div>
-                                     <p style="color: #666; margin: 0;">Previous Price:</p>
-                                     <p style="font-size: 18px; margin: 5px 0;"><strike>{old_price:.2f} SAR</strike></p>
-                                 </div>
-                                 <div style="text-align: right;">
-                                     <p style="color: #666; margin: 0;">Current Price:</p>
-                                     <p style="font-size: 24px; color: {'#2E7D32' if new_price < old_price else '#D32F2F'}; font-weight: bold; margin: 5px 0;">
-                                         {new_price:.2f} SAR
-                                     </p>
-                                 </div>
-                             </div>
-                             
-                             {f'<p style="color: #2E7D32; font-weight: bold; font-size: 18px; margin: 10px 0;">You save: {price_diff:.2f} SAR ({price_change_percent:.1f}%)</p>' if new_price < old_price else ''}
-                             
-                             {f'<p style="color: #D32F2F; font-size: 16px; margin: 10px 0;">Price increased by {price_diff:.2f} SAR ({price_change_percent:.1f}%)</p>' if new_price > old_price else ''}
-                         </div>
-                         
-                         {'<p style="font-size: 16px; color: #2E7D32; margin: 15px 0;"><strong>🎯 Target price reached!</strong> Now is a great time to buy!</p>' if product.target_price and new_price <= product.target_price else ''}
-                         
-                         <a href="{product.url}" style="display: inline-block; background: linear-gradient(135deg, #FF9800, #FF6B00); color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; font-size: 16px; margin: 20px 0;">
-                             {'🛒 Buy Now - Limited Time Price!' if new_price < old_price else '🛒 View Product'}
-                         </a>
-                         
-                         <p style="color: #666; font-size: 14px; margin-top: 20px;">
-                             We'll continue monitoring the price and notify you of any changes.
-                         </p>
-                         
-                         <hr style="border: none; border-top: 1px solid #EEE; margin: 20px 0;">
-                         
-                         <div style="color: #999; font-size: 12px;">
-                             {footer_html}
-                         </div>
-                         
-                         <div style="text-align: center; margin-top: 20px; padding-top: 20px; 
-                                   border-top: 1px solid #eee; color: #999; font-size: 12px;">
-                             <p>© {datetime.now().year} ZONAR - زونار</p>
-                         </div>
-                     </div>
-                 </div>
-                 """
-                 
-                 msg = Message(
-                     subject=email_subject,
-                     recipients=[current_user.email],
-                     html=email_body
-                 )
-                 mail.send(msg)
-                 print(f"Email notification sent to {current_user.email}")
-
-            # Create and save notification in DB regardless of email status (if should_notify)
-            if should_notify:
-                notification = SupabaseNotification(
-                    message=notification_message,
-                    user_id=current_user.id,
-                    read=False
-                )
-                db.session.add(notification)
-
-        # Save changes (including potential notification)
+        # Save the new price before alerting
         db.session.commit()
         
+        # Price changes go into the user's alert digest; target-price hits are delivered immediately
+        record_price_change(
+            current_user.id,
+            product.id,
+            product.custom_name or product.name,
+            product.url,
+            old_price,
+            new_price,
+            target_price=product.target_price,
+            notify_on_any_change=getattr(product, 'notify_on_any_change', False)
+        )
+        
         return jsonify({
             'success': True,
             'message': f"{translate('current_price')}: {new_price}",
@@ -734,7 +703,7 @@ def toggle_tracking(product_id):
             if current_user.email_verified:
                 print(f"Sending tracking started email for product {product.id} to {current_user.email}")
                 product_name = product.custom_name or product.name
-                send_localized_email(
+                if send_localized_email(
                     current_user,
                     subject_key="tracking_email_subject",
                     greeting_key="tracking_email_greeting",
@@ -742,7 +711,8 @@ def toggle_tracking(product_id):
                     footer_key="tracking_email_footer",
                     product_name=product_name,
                     current_price=product.current_price
-                )
+                ):
+                    db.session.commit()
             else:
                 print(f"Email not verified for user {current_user.id}. Skipping email notification.")
                 # Add notification in the app to remind user to verify email
@@ -785,113 +755,18 @@ def forgot_password():
             if user:
                 # Generate a reset token
                 token = user.generate_reset_token()
-                db.session.commit()
                 
                 # Send password reset email using the refactored function
                 reset_url = url_for('reset_password', token=token, _external=True)
                 print(f"Sending password reset email to {user.email}")
                 
-                # Pre-process the footer for HTML to avoid f-string backslash issues
-                footer_text = translate('password_reset_footer') if 'password_reset_footer' in translations[g.lang] else "If you didn't request this, please ignore this email."
-                footer_html = footer_text.replace('\\\\n', '<br>')
-                
-                # Create HTML email with reset link and mobile-friendly design
-                email_body = f"""
-                <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <!-- Arabic Version -->
-                    <div dir="rtl" style="text-align: right; background-color: #fff; border-radius: 10px; padding: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">
-                        <h2 style="color: #FF6B00; margin-bottom: 20px;">مرحباً {user.username}،</h2>
-                        
-                        <p style="margin-bottom: 20px; color: #333; font-size: 16px;">
-                            لقد تلقينا طلباً لإعادة تعيين كلمة المرور لحسابك في زونار.
-                        </p>
-                        
-                        <p style="margin-bottom: 20px; color: #333; font-size: 16px;">
-                            لإعادة تعيين كلمة المرور، يرجى النقر على الزر أدناه:
-                        </p>
-                        
-                        <div style="text-align: center; margin: 30px 0;">
-                            <a href="{reset_url}" style="display: inline-block; background: linear-gradient(135deg, #FF9800, #FF6B00); color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; font-size: 16px; margin: 20px 0;">
-                                إعادة تعيين كلمة المرور
-                            </a>
-                        </div>
-                        
-                        <p style="color: #666; font-size: 14px; margin-top: 20px;">
-                            إذا لم تتمكن من النقر على الزر، يمكنك نسخ ولصق الرابط التالي في متصفحك:
-                        </p>
-                        
-                        <p style="background-color: #f5f5f5; padding: 10px; border-radius: 5px; word-break: break-all; font-size: 14px;">
-                            {reset_url}
-                        </p>
-                        
-                        <p style="color: #666; font-size: 14px;">
-                            هذا الرابط صالح لمدة ساعة واحدة فقط. إذا لم تطلب إعادة تعيين كلمة المرور، يرجى تجاهل هذا البريد الإلكتروني.
-                        </p>
-                        
-                        <hr style="border: none; border-top: 1px solid #EEE; margin: 20px 0;">
-                        
-                        <div style="color: #999; font-size: 12px;">
-                            {footer_html}
-                        </div>
-                        
-                        <div style="text-align: center; margin-top: 20px; padding-top: 20px; 
-                                  border-top: 1px solid #eee; color: #999; font-size: 12px;">
-                            <p>© {datetime.now().year} ZONAR - زونار</p>
-                        </div>
-                    </div>
-
-                    <!-- English Version -->
-                    <div dir="ltr" style="text-align: left; margin-top: 40px; background-color: #fff; border-radius: 10px; padding: 20px; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">
-                        <h2 style="color: #FF6B00; margin-bottom: 20px;">Hello {user.username},</h2>
-                        
-                        <p style="margin-bottom: 20px; color: #333; font-size: 16px;">
-                            We received a request to reset your password for your ZONAR account.
-                        </p>
-                        
-                        <p style="margin-bottom: 20px; color: #333; font-size: 16px;">
-                            To reset your password, please click the button below:
-                        </p>
-                        
-                        <div style="text-align: center; margin: 30px 0;">
-                            <a href="{reset_url}" style="display: inline-block; background: linear-gradient(135deg, #FF9800, #FF6B00); color: white; padding: 15px 30px; text-decoration: none; border-radius: 5px; font-weight: bold; font-size: 16px; margin: 20px 0;">
-                                Reset Password
-                            </a>
-                        </div>
-                        
-                        <p style="color: #666; font-size: 14px; margin-top: 20px;">
-                            If you can't click the button, copy and paste this link into your browser:
-                        </p>
-                        
-                        <p style="background-color: #f5f5f5; padding: 10px; border-radius: 5px; word-break: break-all; font-size: 14px;">
-                            {reset_url}
-                        </p>
-                        
-                        <p style="color: #666; font-size: 14px;">
-                            This link is valid for one hour only. If you did not request a password reset, please ignore this email.
-                        </p>
-                        
-                        <hr style="border: none; border-top: 1px solid #EEE; margin: 20px 0;">
-                        
-                        <div style="color: #999; font-size: 12px;">
-                            {footer_html}
-                        </div>
-                        
-                        <div style="text-align: center; margin-top: 20px; padding-top: 20px; 
-                                  border-top: 1px solid #eee; color: #999; font-size: 12px;">
-                            <p>© {datetime.now().year} ZONAR - زونار</p>
-                        </div>
-                    </div>
-                </div>
-                """
+                # Render the precompiled bilingual reset template
+                email_body = render_email('password_reset.html', g.lang, username=user.username, reset_url=reset_url)
                 
-                # Send the email with HTML content
-                msg = Message(
-                    subject="إعادة تعيين كلمة المرور - ZONAR Password Reset",
-                    recipients=[user.email],
-                    html=email_body
-                )
-                mail.send(msg)
-                print(f"Password reset email sent to {user.email}")
+                # Queue the email with HTML content
+                send_email(user.email, "إعادة تعيين كلمة المرور - ZONAR Password Reset", None, html=email_body)
+                # The reset token and its email commit together
+                db.session.commit()
 
                 message = translate('reset_email_sent')
                 category = 'success'
@@ -1021,7 +896,7 @@ def settings():
                 flash(translate('password_updated'), 'success')
                 return redirect(url_for('settings'))
         
-        return render_template('settings.html', unread_count=0)
+        return render_template('settings.html')
     except Exception as e:
         print(f"Error in settings route: {e}")
         traceback.print_exc()
@@ -1035,6 +910,7 @@ def test_email():
         subject = "Zonar Test Email"
         body = f"This is a test email sent from the Zonar app to {current_user.email}."
         if send_email(current_user.email, subject, body):
+            db.session.commit()
             flash("Test email sent successfully!", "success")
         else:
             flash("Failed to send test email. Check logs and configuration.", "danger")
@@ -1045,44 +921,18 @@ def test_email():
         return redirect(url_for('settings'))
 
 def send_email(to, subject, body, html=None):
-    """Sends an email using Flask-Mail configuration, with optional HTML content."""
+    """Queues an email in the outbox in the current transaction (the caller commits); delivery and retries happen off the request path."""
     try:
-        # Ensure MAIL_USERNAME and MAIL_PASSWORD are set
-        sender = app.config.get('MAIL_USERNAME')
-        password = app.config.get('MAIL_PASSWORD')
-        
-        if not sender or not password:
+        if not app.config.get('MAIL_USERNAME') or not app.config.get('MAIL_PASSWORD'):
             print("ERROR: MAIL_USERNAME or MAIL_PASSWORD not configured in Flask app config.")
-            # Optionally, you could raise an exception here in production
             return False # Indicate failure
 
-        print(f"Attempting to send email from {sender} to {to} with subject: {subject}")
-        
-        # Create a more reliable message object with proper encoding
-        msg = Message(
-            subject=subject,
-            recipients=[to],
-            body=body,  # Plain text version
-            html=html,  # HTML version (if provided)
-            sender=sender # Use configured sender
-        )
-        
-        # Attempt to send the email with retry mechanism
-        max_retries = 3
-        for attempt in range(1, max_retries + 1):
-            try:
-                mail.send(msg)
-                print(f"Email sent successfully to {to} (attempt {attempt})")
-                return True
-            except Exception as retry_error:
-                if attempt < max_retries:
-                    print(f"Attempt {attempt} failed: {str(retry_error)}. Retrying...")
-                    time.sleep(2)  # انتظر قبل المحاولة مرة أخرى
-                else:
-                    raise  # رمي الاستثناء في المحاولة الأخيرة
-                    
+        outbox_id = enqueue_email(to, subject, body, html)
+        print(f"Queued email {outbox_id} to {to} with subject: {subject}")
+        return True
     except Exception as e:
-        print(f"ERROR sending email to {to}: {str(e)}")
+        db.session.rollback()
+        print(f"ERROR queueing email to {to}: {str(e)}")
         traceback.print_exc()
         return False
 
@@ -1091,72 +941,20 @@ def send_localized_email(user, subject_key, greeting_key, body_key, footer_key,
     try:
         lang = user.language if hasattr(user, 'language') and user.language else g.lang
         
-        # Translate components
-        subject = translate(subject_key).format(username=user.username, **format_args)
-        greeting = translate(greeting_key).format(username=user.username, **format_args)
-        body_content = translate(body_key).format(**format_args)
-        footer = translate(footer_key).format(**format_args)
-        
-        # Pre-process the content to handle newlines before using in f-strings
-        body_content_html = body_content.replace('\\\\n', '<br>')
-        footer_html = footer.replace('\\\\n', '<br>')
-        
-        # Define verification link HTML if present
-        verification_link_html = ""
-        if 'verification_link' in format_args:
-            verification_link_html = f"""
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="{format_args['verification_link']}" 
-                   style="display: inline-block; background: linear-gradient(135deg, #FF9800, #FF6B00); 
-                          color: white; padding: 15px 30px; text-decoration: none; 
-                          border-radius: 5px; font-weight: bold; font-size: 16px; margin: 20px 0;">
-                    {translate('verify_email_button')}
-                </a>
-            </div>
-            <p style="color: #666; font-size: 14px; margin-top: 20px;">
-                {translate('if_button_doesnt_work')}
-            </p>
-            <p style="background-color: #f5f5f5; padding: 10px; border-radius: 5px; 
-                      word-break: break-all; font-size: 14px; direction: ltr; text-align: left;">
-                {format_args['verification_link']}
-            </p>
-            """
-            
-        # Create beautiful HTML email with orange branding
-        html_body = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div dir="{('rtl' if lang == 'ar' else 'ltr')}" style="text-align: {('right' if lang == 'ar' else 'left')}; 
-                     background-color: #fff; border-radius: 10px; padding: 20px; 
-                     box-shadow: 0 2px 5px rgba(0,0,0,0.1);">
-                
-                <div style="text-align: center; margin-bottom: 20px;">
-                    <img src="https://zonar.sa/static/img/logo.png" alt="ZONAR" 
-                         style="max-width: 150px; height: auto;"/>
-                </div>
-                
-                <h2 style="color: #FF6B00; margin-bottom: 20px;">{greeting}</h2>
-                
-                <div style="color: #333; font-size: 16px; line-height: 1.5;">
-                    <div style="padding: 20px;">
-                        {body_content_html}
-                    </div>
-                </div>
-                
-                {verification_link_html}
-                
-                <hr style="border: none; border-top: 1px solid #EEE; margin: 20px 0;">
-                
-                <div style="color: #999; font-size: 12px;">
-                    {footer_html}
-                </div>
-                
-                <div style="text-align: center; margin-top: 20px; padding-top: 20px; 
-                          border-top: 1px solid #eee; color: #999; font-size: 12px;">
-                    <p>© {datetime.now().year} ZONAR - زونار</p>
-                </div>
-            </div>
-        </div>
-        """
+        # Translate components (translations are cached per language)
+        subject = translate_email(subject_key, lang, username=user.username, **format_args)
+        greeting = translate_email(greeting_key, lang, username=user.username, **format_args)
+        body_content = translate_email(body_key, lang, **format_args)
+        footer = translate_email(footer_key, lang, **format_args)
+        
+        # Render the precompiled template with only this message's values
+        html_body = render_email(
+            'localized.html', lang,
+            greeting=greeting,
+            body=body_content,
+            footer=footer,
+            verification_link=format_args.get('verification_link')
+        )
         
         print(f"Preparing localized HTML email for {user.email} (Lang: {lang}) - Subject: {subject}")
         
@@ -1169,7 +967,7 @@ def send_localized_email(user, subject_key, greeting_key, body_key, footer_key,
         plain_text = plain_text + f"{footer}"
         
         if 'verification_link' in format_args:
-            verification_text = f"{translate('verify_email_link')}: {format_args['verification_link']}"
+            verification_text = f"{translate_email('verify_email_link', lang)}: {format_args['verification_link']}"
             plain_text = plain_text + "\n\n" + verification_text
         
         # Use the central send_email function
@@ -1194,25 +992,14 @@ def verify_email(token):
         # إضافة المزيد من التتبع
         print(f"Looking for user with verification token starting with: {token[:10]}...")
         
-        # البحث عن المستخدم بواسطة الرمز
-        user = SupabaseUser.query.filter_by(verification_token=token).first()
+        # البحث عن المستخدم بواسطة الرمز (بصمة الرمز الكامل ثم بصمة أوله، كلاهما عبر فهرس)
+        user = User.find_by_verification_token(token)
+        metrics.increment('verification_lookups')
         
         # إذا كان الرمز غير صالح
         if not user:
+            metrics.increment('verification_lookup_failures')
             print(f"No user found with verification token: {token[:10]}...")
-            # محاولة البحث بطريقة أخرى
-            print("Trying partial token match...")
-            # البحث بالأحرف الأولى من الرمز (قد تكون مشكلة في الرابط)
-            users_with_tokens = SupabaseUser.query.filter(SupabaseUser.verification_token.isnot(None)).all()
-            for u in users_with_tokens:
-                if u.verification_token and u.verification_token.startswith(token[:20]):
-                    print(f"Found possible matching user: {u.username} with token starting with {u.verification_token[:10]}")
-                    user = u
-                    break
-
-            # إذا لم يتم العثور على مستخدم
-            if not user:
-                print("No matching users found with similar tokens")
             flash(translate('verification_failed'), 'danger')
             return redirect(url_for('home'))
         
@@ -1228,6 +1015,8 @@ def verify_email(token):
         print(f"Email verification successful for user: {user.username}")
         user.email_verified = True
         user.verification_token = None
+        user.verification_token_hash = None
+        user.verification_token_prefix_hash = None
         user.verification_token_expiry = None
         
         # تطبيق التغييرات في قاعدة البيانات
@@ -1294,6 +1083,7 @@ def resend_verification():
             )
         
             if email_sent:
+                db.session.commit()
                 print(f"Verification email sent successfully to: {current_user.email}")
                 flash(translate('verification_resent'), 'success')
             else:
@@ -1351,14 +1141,14 @@ def email_testing():
                 
             flash(result['message'], result['status'])
             
-        return render_template('email_testing.html', unread_count=0)
+        return render_template('email_testing.html')
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
         print(f"Error in email testing page: {str(e)}")
         print(error_trace)
         flash(f"Error: {str(e)}", "danger")
-        return render_template('email_testing.html', unread_count=0, error=error_trace)
+        return render_template('email_testing.html', error=error_trace)
 
 def send_test_basic_email(receiver_email):
     """Send a basic test email using current settings"""
@@ -1525,6 +1315,7 @@ def send_test_verification_email(receiver_email, language):
         )
         
         if success:
+            db.session.commit()
             return {'status': 'success', 'message': f"Verification test email sent to {receiver_email} in {language}"}
         else:
             return {'status': 'danger', 'message': "Failed to send verification test email"}
@@ -1750,38 +1541,95 @@ def send_notification():
             'url': '/'
         }
         
-        # إرسال الإشعار عبر webpush
-        from pywebpush import webpush, WebPushException
+        # إرسال الإشعار عبر موزع الإشعارات (توقيع VAPID مخزن واتصال دائم)
+        report = dispatch([(current_user.id, subscription_info, notification_data)])
         
-        try:
-            webpush(
-                subscription_info=subscription_info,
-                data=json.dumps(notification_data),
-                vapid_private_key=app.config.get('VAPID_PRIVATE_KEY'),
-                vapid_claims={
-                    "sub": "mailto:info@zonar.com"
-                }
-            )
-            
+        if report['sent']:
             return jsonify({'success': True, 'message': 'تم إرسال الإشعار بنجاح'})
-        except WebPushException as e:
-            print(f"خطأ في إرسال الإشعار: {str(e)}")
-            # التحقق من حالة الانتهاء
-            if e.response and e.response.status_code == 410:
-                # الاشتراك لم يعد صالحًا، قم بإزالته
-                current_user.push_subscription = None
-                db.session.commit()
-                return jsonify({'success': False, 'error': 'انتهت صلاحية الاشتراك'}), 410
-            return jsonify({'success': False, 'error': f"فشل إرسال الإشعار: {str(e)}"}), 500
+        if report['expired']:
+            # الاشتراك لم يعد صالحًا وتمت إزالته
+            return jsonify({'success': False, 'error': 'انتهت صلاحية الاشتراك'}), 410
+        return jsonify({'success': False, 'error': 'فشل إرسال الإشعار'}), 500
     except Exception as e:
         print(f"خطأ في مسار إرسال الإشعار: {str(e)}")
         traceback.print_exc()
         return jsonify({'success': False, 'error': 'حدث خطأ أثناء إرسال الإشعار'}), 500
 
+@app.route('/notifications')
+@login_required
+def notifications_feed():
+    """Return one page of the user's notifications, newest first (keyset paginated)"""
+    try:
+        notifications, next_cursor = Notification.get_feed(
+            current_user.id,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 20)
+        )
+        return jsonify({
+            'success': True,
+            'notifications': [{
+                'id': n.id,
+                'message': n.message,
+                'read': n.read,
+                'created_at': n.created_at.isoformat() if n.created_at else None,
+                'product_id': n.product_id,
+                'notification_type': n.notification_type
+            } for n in notifications],
+            'next_cursor': next_cursor,
+            'unread_count': current_user.unread_notifications
+        })
+    except Exception as e:
+        print(f"Error loading notifications: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': translate('error_occurred')}), 500
+
+@app.route('/notifications/<int:notification_id>/read', methods=['POST'])
+@login_required
+def mark_notification_read(notification_id):
+    """Mark a single notification as read"""
+    notification = Notification.query.filter_by(id=notification_id, user_id=current_user.id).first_or_404()
+    try:
+        notification.mark_as_read()
+        return jsonify({'success': True, 'unread_count': current_user.unread_notifications})
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error marking notification {notification_id} as read: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': translate('error_occurred')}), 500
+
+@app.route('/notifications/mark_all_read', methods=['POST'])
+@login_required
+def mark_all_notifications_read():
+    """Mark every unread notification of the user as read in one statement"""
+    try:
+        Notification.mark_all_as_read(current_user.id)
+        return jsonify({'success': True, 'unread_count': 0})
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error marking all notifications as read: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': translate('error_occurred')}), 500
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose this worker's in-process metrics (admins, or callers presenting METRICS_TOKEN)"""
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    authorized = (current_user.is_authenticated and current_user.is_admin) or \
+        (metrics_token and hmac.compare_digest(request.args.get('token', '').encode(), metrics_token.encode()))
+    if not authorized:
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    
+    data = metrics.snapshot()
+    data['gauges']['email_outbox_depth'] = queue_depth()
+    data['rates'] = {
+        'verification_lookup_failure_rate': metrics.ratio('verification_lookup_failures', 'verification_lookups')
+    }
+    return jsonify(data)
+
 @app.route('/offline')
 def offline():
     """صفحة وضع عدم الاتصال"""
-    return render_template('offline.html', unread_count=0)
+    return render_template('offline.html')
 
 @app.route('/change_theme', methods=['POST'])
 @login_required
@@ -1,69 +1,100 @@
 import os
-import traceback
+import logging
+import threading
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def get_supabase_client():
+logger = logging.getLogger(__name__)
+
+# Process-wide client, created on first use. The underlying PostgREST session
+# keeps its HTTP connection pool, so reusing one client reuses connections.
+# A failed creation is remembered too, so callers don't retry it on every query.
+_client = None
+_client_error = None
+_client_lock = threading.Lock()
+
+def create_supabase_client():
     """
-    Returns the initialized Supabase client.
-    
+    Creates a new Supabase client without touching the network.
+
     Returns:
-        The Supabase client instance
+        A new Supabase client instance
     Raises:
         ValueError: If required environment variables are not set
     """
     # Get Supabase credentials from environment variables
     supabase_url = os.environ.get("SUPABASE_URL")
     supabase_key = os.environ.get("SUPABASE_SERVICE_KEY") or os.environ.get("SUPABASE_KEY")
-    
-    # Print diagnostic information
-    print("\nSupabase Configuration:")
-    print(f"SUPABASE_URL: {supabase_url}")
-    print(f"SUPABASE_KEY present: {bool(os.environ.get('SUPABASE_KEY'))}")
-    print(f"SUPABASE_SERVICE_KEY present: {bool(os.environ.get('SUPABASE_SERVICE_KEY'))}")
-    print(f"Using key type: {'service_key' if os.environ.get('SUPABASE_SERVICE_KEY') else 'anon_key'}")
-    
+
     if not supabase_url:
         raise ValueError("SUPABASE_URL environment variable is not set")
     if not supabase_key:
         raise ValueError("Neither SUPABASE_KEY nor SUPABASE_SERVICE_KEY environment variables are set")
-    
-    # Initialize and return Supabase client - older version doesn't support options like timeout
+
+    # Initialize Supabase client - older version doesn't support options like timeout
     try:
         client = create_client(supabase_url, supabase_key)
-        print("Successfully created Supabase client")
-        
-        # Test connection - simplified for older version
-        try:
-            result = client.table('users').select('*').limit(1).execute()
-            print("Successfully tested Supabase connection")
-        except Exception as test_error:
-            print(f"Warning: Could not test connection: {str(test_error)}")
-            print("This is expected if tables don't exist yet")
-            
+        logger.info("Created Supabase client (%s)", 'service_key' if os.environ.get('SUPABASE_SERVICE_KEY') else 'anon_key')
         return client
-    except Exception as e:
-        print(f"Error creating Supabase client: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
-        print("Trying fallback initialization...")
-        
+    except Exception:
+        logger.exception("Error creating Supabase client, trying fallback initialization")
+
         # Fallback to basic client initialization without options
         try:
             client = Client(supabase_url, supabase_key)
-            print("Fallback client initialization successful")
+            logger.info("Fallback client initialization successful")
             return client
         except Exception as fallback_error:
-            print(f"Fallback initialization failed: {str(fallback_error)}")
+            logger.error("Fallback initialization failed: %s", fallback_error)
             raise
 
-# Create a global client instance
-try:
-    supabase = get_supabase_client()
-    print("Successfully initialized global Supabase client")
-except Exception as e:
-    print(f"Warning: Failed to initialize Supabase client: {e}")
-    print("Application will continue with limited functionality")
-    supabase = None 
\ No newline at end of file
+def get_supabase_client():
+    """
+    Returns the shared Supabase client, creating it on first use.
+
+    Creation is attempted once; later calls re-raise the first error until
+    reset_supabase_client() is called.
+
+    Returns:
+        The Supabase client instance
+    Raises:
+        ValueError: If required environment variables are not set
+    """
+    global _client, _client_error
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if _client_error is not None:
+                    raise _client_error
+                try:
+                    _client = create_supabase_client()
+                except Exception as e:
+                    _client_error = e
+                    raise
+    return _client
+
+def reset_supabase_client():
+    """Drop the shared client (or cached failure) so the next call creates a fresh one (e.g. after fork)"""
+    global _client, _client_error
+    with _client_lock:
+        _client = None
+        _client_error = None
+
+def check_supabase_connection():
+    """Opt-in health probe - runs a one-row query against the users table"""
+    try:
+        get_supabase_client().table('users').select('id').limit(1).execute()
+        return "Supabase connection successful", True
+    except Exception as e:
+        return f"Supabase connection error: {str(e)}", False
+
+# Only probe at import when explicitly requested
+if os.environ.get('SUPABASE_PROBE_ON_START', 'False').lower() in ['true', '1', 't', 'yes', 'y']:
+    message, ok = check_supabase_connection()
+    if ok:
+        logger.info(message)
+    else:
+        logger.warning(message)
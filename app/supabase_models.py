@@ -1,18 +1,30 @@
 import json
+import logging
 import secrets
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
 from .supabase_client import get_supabase_client
+from .user_cache import user_cache, USER_CACHE_EXCLUDED_FIELDS
+from .tokens import verification_token_hashes
+from .pagination import encode_cursor, decode_cursor, clamp_page_size, DEFAULT_PAGE_SIZE
 
-# Initialize supabase with error handling
-try:
-    supabase = get_supabase_client()
-except Exception as e:
-    print(f"WARNING: Failed to initialize supabase in models: {str(e)}")
-    supabase = None
+logger = logging.getLogger(__name__)
+
+_client_warned = False
+
+def _client():
+    """Return the shared Supabase client, or None if it cannot be created (logged once)"""
+    global _client_warned
+    try:
+        return get_supabase_client()
+    except Exception as e:
+        if not _client_warned:
+            _client_warned = True
+            logger.warning("Supabase client unavailable in models: %s", e)
+        return None
 
 class SupabaseUser(UserMixin):
     """
@@ -22,35 +34,62 @@ class SupabaseUser(UserMixin):
         self.id = user_data.get('id')
         self.username = user_data.get('username')
         self.email = user_data.get('email')
-        self.password_hash = user_data.get('password_hash')
         self.language = user_data.get('language', 'ar')
         self.theme = user_data.get('theme', 'light')
         self.created_at = user_data.get('created_at')
-        self.reset_token = user_data.get('reset_token')
         self.reset_token_expiry = user_data.get('reset_token_expiry')
-        self.verification_token = user_data.get('verification_token')
         self.email_verified = user_data.get('email_verified', False)
         self.is_admin = user_data.get('is_admin', False)
         self.verification_token_expiry = user_data.get('verification_token_expiry')
         self.push_subscription = user_data.get('push_subscription')
         self.notifications_enabled = user_data.get('notifications_enabled', False)
         self.device_info = user_data.get('device_info')
+        # A row from the user cache has no secrets; __getattr__ loads them on first access
+        for field in USER_CACHE_EXCLUDED_FIELDS:
+            if field in user_data:
+                setattr(self, field, user_data[field])
+    
+    def __getattr__(self, name):
+        if name not in USER_CACHE_EXCLUDED_FIELDS:
+            raise AttributeError(name)
+        self._load_excluded_fields()
+        return self.__dict__[name]
+    
+    def _load_excluded_fields(self):
+        """Read the fields the user cache leaves out with a primary-key query"""
+        row = {}
+        client = _client()
+        if client:
+            try:
+                response = client.table('users').select(','.join(USER_CACHE_EXCLUDED_FIELDS)).eq('id', self.id).execute()
+                if response.data:
+                    row = response.data[0]
+            except Exception as e:
+                logger.warning("Error loading user %s fields: %s", self.id, e)
+        for field in USER_CACHE_EXCLUDED_FIELDS:
+            if field not in self.__dict__:
+                setattr(self, field, row.get(field, 0 if field == 'unread_notifications' else None))
         
     @staticmethod
     def get_by_id(user_id: int) -> Optional['SupabaseUser']:
         """Get user by ID"""
-        if not supabase:
-            print("Supabase client not available in get_by_id")
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return SupabaseUser(cached)
+        
+        client = _client()
+        if not client:
             return None
             
         try:
             # Old version API compatibility
-            response = supabase.table('users').select('*').eq('id', user_id).execute()
+            response = client.table('users').select('*').eq('id', user_id).execute()
             
             # In older versions, data might be directly in response
             data = getattr(response, 'data', response)
             
             if data and len(data) > 0:
+                user_cache.set(user_id, data[0])
                 return SupabaseUser(data[0])
             return None
         except Exception as e:
@@ -60,11 +99,12 @@ class SupabaseUser(UserMixin):
     @staticmethod
     def get_by_email(email: str) -> Optional['SupabaseUser']:
         """Get user by email"""
-        if not supabase:
+        client = _client()
+        if not client:
             return None
             
         try:
-            response = supabase.table('users').select('*').eq('email', email).execute()
+            response = client.table('users').select('*').eq('email', email).execute()
             
             # In older versions, data might be directly in response
             data = getattr(response, 'data', response)
@@ -76,10 +116,25 @@ class SupabaseUser(UserMixin):
             print(f"Error in get_by_email: {str(e)}")
             return None
     
+    @staticmethod
+    def get_by_verification_token(token: str) -> Optional['SupabaseUser']:
+        """Get user by verification token via the indexed full-token hash, then prefix hash"""
+        client = _client() if token else None
+        if not client:
+            return None
+        
+        token_hash, prefix_hash = verification_token_hashes(token)
+        for column, value in (('verification_token_hash', token_hash),
+                              ('verification_token_prefix_hash', prefix_hash)):
+            response = client.table('users').select('*').eq(column, value).limit(1).execute()
+            if response.data and len(response.data) > 0:
+                return SupabaseUser(response.data[0])
+        return None
+    
     @staticmethod
     def get_by_username(username: str) -> Optional['SupabaseUser']:
         """Get user by username"""
-        response = supabase.table('users').select('*').eq('username', username).execute()
+        response = _client().table('users').select('*').eq('username', username).execute()
         
         if response.data and len(response.data) > 0:
             return SupabaseUser(response.data[0])
@@ -102,7 +157,7 @@ class SupabaseUser(UserMixin):
             'notifications_enabled': False
         }
         
-        response = supabase.table('users').insert(user_data).execute()
+        response = _client().table('users').insert(user_data).execute()
         
         if response.data and len(response.data) > 0:
             return SupabaseUser(response.data[0])
@@ -110,7 +165,8 @@ class SupabaseUser(UserMixin):
     
     def update(self, data: Dict[str, Any]) -> bool:
         """Update user data"""
-        response = supabase.table('users').update(data).eq('id', self.id).execute()
+        response = _client().table('users').update(data).eq('id', self.id).execute()
+        user_cache.invalidate(self.id)
         
         if response.data and len(response.data) > 0:
             # Update local attributes
@@ -144,9 +200,13 @@ class SupabaseUser(UserMixin):
         """Generate an email verification token valid for 7 days"""
         verification_token = secrets.token_urlsafe(64)
         verification_token_expiry = (datetime.utcnow() + timedelta(days=7)).isoformat()
+        token_hash, prefix_hash = verification_token_hashes(verification_token)
         
+        # Only digests are stored; the plaintext token exists only in the emailed link
         self.update({
-            'verification_token': verification_token,
+            'verification_token': None,
+            'verification_token_hash': token_hash,
+            'verification_token_prefix_hash': prefix_hash,
             'verification_token_expiry': verification_token_expiry
         })
         
@@ -168,7 +228,11 @@ class SupabaseUser(UserMixin):
     
     def verify_verification_token(self, token: str) -> bool:
         """Verify if the email verification token is valid"""
-        if not self.verification_token or self.verification_token != token:
+        if not self.verification_token_hash or not token:
+            return False
+        
+        token_hash, prefix_hash = verification_token_hashes(token)
+        if token_hash != self.verification_token_hash and prefix_hash != self.verification_token_prefix_hash:
             return False
             
         if not self.verification_token_expiry:
@@ -191,18 +255,27 @@ class SupabaseUser(UserMixin):
         """Clear the email verification token after use"""
         return self.update({
             'verification_token': None,
+            'verification_token_hash': None,
+            'verification_token_prefix_hash': None,
             'verification_token_expiry': None,
             'email_verified': True
         })
     
     def get_products(self) -> List[Dict[str, Any]]:
         """Get all products associated with this user"""
-        response = supabase.table('products').select('*').eq('user_id', self.id).execute()
+        response = _client().table('products').select('*').eq('user_id', self.id).execute()
         return response.data if response.data else []
     
+    def get_unread_count(self) -> int:
+        """Read the maintained unread counter (kept up to date by a database trigger)"""
+        response = _client().table('users').select('unread_notifications').eq('id', self.id).execute()
+        if response.data and len(response.data) > 0:
+            self.unread_notifications = response.data[0].get('unread_notifications') or 0
+        return self.unread_notifications
+    
     def get_notifications(self) -> List[Dict[str, Any]]:
         """Get all notifications associated with this user"""
-        response = supabase.table('notifications').select('*').eq('user_id', self.id).execute()
+        response = _client().table('notifications').select('*').eq('user_id', self.id).execute()
         return response.data if response.data else []
         
     def __repr__(self) -> str:
@@ -216,13 +289,13 @@ class SupabaseProduct:
     @staticmethod
     def get_by_id(product_id: int) -> Dict[str, Any]:
         """Get product by ID"""
-        response = supabase.table('products').select('*').eq('id', product_id).execute()
+        response = _client().table('products').select('*').eq('id', product_id).execute()
         return response.data[0] if response.data and len(response.data) > 0 else None
     
     @staticmethod
     def get_by_user_id(user_id: int) -> List[Dict[str, Any]]:
         """Get all products for a user"""
-        response = supabase.table('products').select('*').eq('user_id', user_id).execute()
+        response = _client().table('products').select('*').eq('user_id', user_id).execute()
         return response.data if response.data else []
     
     @staticmethod
@@ -234,19 +307,19 @@ class SupabaseProduct:
         if 'last_checked' not in product_data:
             product_data['last_checked'] = datetime.utcnow().isoformat()
             
-        response = supabase.table('products').insert(product_data).execute()
+        response = _client().table('products').insert(product_data).execute()
         return response.data[0] if response.data and len(response.data) > 0 else None
     
     @staticmethod
     def update(product_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
         """Update a product"""
-        response = supabase.table('products').update(data).eq('id', product_id).execute()
+        response = _client().table('products').update(data).eq('id', product_id).execute()
         return response.data[0] if response.data and len(response.data) > 0 else None
     
     @staticmethod
     def delete(product_id: int) -> bool:
         """Delete a product"""
-        response = supabase.table('products').delete().eq('id', product_id).execute()
+        response = _client().table('products').delete().eq('id', product_id).execute()
         return len(response.data) > 0 if response.data else False
     
     @staticmethod
@@ -273,15 +346,38 @@ class SupabaseNotification:
     @staticmethod
     def get_by_id(notification_id: int) -> Dict[str, Any]:
         """Get notification by ID"""
-        response = supabase.table('notifications').select('*').eq('id', notification_id).execute()
+        response = _client().table('notifications').select('*').eq('id', notification_id).execute()
         return response.data[0] if response.data and len(response.data) > 0 else None
     
     @staticmethod
-    def get_by_user_id(user_id: int) -> List[Dict[str, Any]]:
-        """Get all notifications for a user"""
-        response = supabase.table('notifications').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+    def get_by_user_id(user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get notifications for a user, newest first (all of them unless limit is given)"""
+        query = _client().table('notifications').select('*').eq('user_id', user_id).order('created_at', desc=True)
+        if limit:
+            query = query.limit(limit)
+        response = query.execute()
         return response.data if response.data else []
     
+    @staticmethod
+    def get_feed(user_id: int, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Keyset-paginated notifications by (created_at, id); returns (notifications, next_cursor)"""
+        limit = clamp_page_size(limit)
+        query = _client().table('notifications').select('*').eq('user_id', user_id)
+        
+        position = decode_cursor(cursor)
+        if position:
+            created_at, row_id = position
+            query = query.or_(f'created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id})')
+        
+        response = query.order('created_at', desc=True).order('id', desc=True).limit(limit + 1).execute()
+        rows = response.data if response.data else []
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        return rows, next_cursor
+    
     @staticmethod
     def create(notification_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new notification"""
@@ -291,23 +387,24 @@ class SupabaseNotification:
         if 'read' not in notification_data:
             notification_data['read'] = False
             
-        response = supabase.table('notifications').insert(notification_data).execute()
+        response = _client().table('notifications').insert(notification_data).execute()
         return response.data[0] if response.data and len(response.data) > 0 else None
     
     @staticmethod
     def mark_as_read(notification_id: int) -> Dict[str, Any]:
         """Mark a notification as read"""
-        response = supabase.table('notifications').update({'read': True}).eq('id', notification_id).execute()
+        response = _client().table('notifications').update({'read': True}).eq('id', notification_id).execute()
         return response.data[0] if response.data and len(response.data) > 0 else None
     
     @staticmethod
     def mark_all_as_read(user_id: int) -> bool:
         """Mark all notifications as read for a user"""
-        response = supabase.table('notifications').update({'read': True}).eq('user_id', user_id).execute()
+        # Only touch unread rows; the unread-counter trigger handles users.unread_notifications
+        response = _client().table('notifications').update({'read': True}).eq('user_id', user_id).eq('read', False).execute()
         return len(response.data) > 0 if response.data else False
     
     @staticmethod
     def delete(notification_id: int) -> bool:
         """Delete a notification"""
-        response = supabase.table('notifications').delete().eq('id', notification_id).execute()
+        response = _client().table('notifications').delete().eq('id', notification_id).execute()
         return len(response.data) > 0 if response.data else False 
\ No newline at end of file
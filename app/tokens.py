@@ -0,0 +1,14 @@
+"""Helpers for storing and looking up one-time tokens by digest rather than in clear"""
+
+import hashlib
+
+# Links mangled by mail clients are still accepted if this many leading characters survive
+VERIFICATION_TOKEN_PREFIX_LENGTH = 20
+
+def hash_token(token):
+    """SHA-256 hex digest used to store and look up a token"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def verification_token_hashes(token):
+    """Return (full_hash, prefix_hash) for a verification token"""
+    return hash_token(token), hash_token(token[:VERIFICATION_TOKEN_PREFIX_LENGTH])
@@ -0,0 +1,85 @@
+"""
+Small in-process cache of user rows used to rebuild current_user without a
+database round-trip on every request.
+
+Entries are plain dicts of column values, kept for a short TTL and evicted
+in LRU order. Every write to a user invalidates its entry; because the cache
+is per process, the TTL bounds how stale another worker's copy can get.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from flask import g, has_app_context
+
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+
+# Secrets and the live unread counter are never cached; they are lazy-loaded
+# from the database (a primary-key read) when accessed
+USER_CACHE_EXCLUDED_FIELDS = ('password_hash', 'reset_token', 'verification_token', 'verification_token_hash',
+                              'verification_token_prefix_hash', 'unread_notifications')
+
+class UserCache:
+    """Thread-safe TTL + LRU cache of user field dicts keyed by user id"""
+
+    def __init__(self, ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Return a copy of the cached fields for user_id, or None"""
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, fields = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(fields)
+
+    def set(self, user_id, fields):
+        """Cache fields for user_id, leaving out USER_CACHE_EXCLUDED_FIELDS"""
+        key = str(user_id)
+        fields = {name: value for name, value in fields.items() if name not in USER_CACHE_EXCLUDED_FIELDS}
+        with self._lock:
+            self._entries[key] = (time.monotonic(), fields)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        if user_id is None:
+            return
+        key = str(user_id)
+        with self._lock:
+            self._entries.pop(key, None)
+        # Drop the request-local copy too so the rest of this request sees the write
+        if has_app_context():
+            memo = g.get('_user_memo')
+            if memo:
+                memo.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
+
+def request_memo():
+    """Per-request dict of already-loaded users, keyed by user id string"""
+    if '_user_memo' not in g:
+        g._user_memo = {}
+    return g._user_memo
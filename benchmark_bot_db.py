@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Bot database concurrency benchmark
+
+Runs bot-style writers (batches of product inserts, each checked against
+the user's existing URLs) next to admin-page readers (today's count,
+total count, recent products) on a scratch copy of the schema, twice:
+
+- baseline: a new connection per call and the default rollback journal,
+  as the bot and admin helpers used to do
+- tuned: one reused connection per thread from bot_db (WAL,
+  synchronous=NORMAL, mmap, larger cache, prepared statement cache)
+
+and reports throughput, read latency and "database is locked" errors.
+
+Usage:
+    python benchmark_bot_db.py [--seconds 5] [--writers 2] [--readers 4] [--seed-products 20000]
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bot_db  # noqa: E402
+
+BOT_USER_ID = 1
+BATCH_SIZE = 5
+
+SCHEMA = [
+    '''CREATE TABLE product (
+        id INTEGER PRIMARY KEY, url TEXT, name TEXT, custom_name TEXT,
+        current_price REAL, image_url TEXT, price_history TEXT,
+        tracking_enabled BOOLEAN, notify_on_any_change BOOLEAN,
+        last_checked TEXT, user_id INTEGER, created_at TEXT, category TEXT
+    )''',
+    'CREATE INDEX idx_product_user_url ON product(user_id, url)',
+    'CREATE INDEX idx_product_user_created_at ON product(user_id, created_at)',
+]
+
+def create_database(path, seed_products):
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    base = datetime.utcnow() - timedelta(days=30)
+    conn.executemany(
+        'INSERT INTO product (url, name, custom_name, current_price, user_id, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(f'https://www.amazon.sa/dp/S{i:09d}', f'Product {i}', f'Deal {i}: 20%', 100.0 + i % 500,
+          BOT_USER_ID if i % 4 == 0 else 2 + i % 100, (base + timedelta(seconds=i * 60)).isoformat())
+         for i in range(seed_products)]
+    )
+    conn.commit()
+    conn.close()
+
+def baseline_connection(path):
+    """A fresh default connection for every call"""
+    conn = sqlite3.connect(path, timeout=bot_db.BOT_DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def write_batch(conn, writer, batch):
+    now = datetime.utcnow().isoformat()
+    for n in range(BATCH_SIZE):
+        url = f'https://www.amazon.sa/dp/W{writer}{batch:05d}{n}'
+        if conn.execute('SELECT id FROM product WHERE user_id = ? AND url = ?', (BOT_USER_ID, url)).fetchone():
+            continue
+        conn.execute('''
+            INSERT INTO product (url, name, custom_name, current_price, price_history,
+                                 tracking_enabled, notify_on_any_change, last_checked, user_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (url, f'Product {url[-10:]}', f'Deal: {url[-10:]}', 99.0, '[]', True, True, now, BOT_USER_ID, now))
+    conn.commit()
+
+def admin_reads(conn):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    conn.execute('SELECT COUNT(*) FROM product WHERE user_id = ? AND created_at >= ?', (BOT_USER_ID, today)).fetchone()
+    conn.execute('SELECT COUNT(*) FROM product WHERE user_id = ?', (BOT_USER_ID,)).fetchone()
+    conn.execute('''
+        SELECT id, name, custom_name, url, current_price, image_url, created_at
+        FROM product WHERE user_id = ? ORDER BY created_at DESC LIMIT 10
+    ''', (BOT_USER_ID,)).fetchall()
+
+def run_mode(path, tuned, seconds, writers, readers):
+    manager = bot_db.ConnectionManager(path) if tuned else None
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'writes': 0, 'reads': 0, 'locked': 0, 'read_latencies': []}
+
+    def call(work):
+        if tuned:
+            conn = manager.get()
+            try:
+                work(conn)
+            except Exception:
+                manager.release()
+                raise
+            return
+        conn = baseline_connection(path)
+        try:
+            work(conn)
+        finally:
+            conn.close()
+
+    def writer(number):
+        batch = 0
+        while not stop.is_set():
+            batch += 1
+            try:
+                call(lambda conn: write_batch(conn, number, batch))
+                with lock:
+                    results['writes'] += BATCH_SIZE
+            except sqlite3.OperationalError:
+                with lock:
+                    results['locked'] += 1
+        if tuned:
+            manager.close()
+
+    def reader():
+        latencies = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                call(admin_reads)
+                latencies.append(time.perf_counter() - started)
+            except sqlite3.OperationalError:
+                with lock:
+                    results['locked'] += 1
+        with lock:
+            results['reads'] += len(latencies)
+            results['read_latencies'].extend(latencies)
+        if tuned:
+            manager.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+def report(name, results, seconds):
+    latencies = sorted(results['read_latencies']) or [0]
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"{name:<10} writes {results['writes'] / seconds:8.0f}/s   admin page reads {results['reads'] / seconds:7.0f}/s   "
+          f"read p50 {p50:6.2f} ms  p95 {p95:6.2f} ms   locked errors {results['locked']}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent bot writes and admin reads on SQLite')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each mode')
+    parser.add_argument('--writers', type=int, default=2, help='Concurrent bot writer threads')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent admin reader threads')
+    parser.add_argument('--seed-products', type=int, default=20000, help='Products in the scratch database')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, tuned in (('baseline', False), ('tuned', True)):
+            path = os.path.join(scratch, f'{name}.db')
+            create_database(path, args.seed_products)
+            results = run_mode(path, tuned, args.seconds, args.writers, args.readers)
+            report(name, results, args.seconds)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Email template rendering benchmark
+
+Renders the price alert email for a sweep of simulated price drops and
+reports the cost per message: with the cached compiled templates, and
+with a template compiled from source for every message (the cost the
+cache removes).
+
+Usage:
+    python benchmark_email_templates.py [--messages 5000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import email_templates  # noqa: E402
+
+def sample_alerts(count):
+    """Synthetic price changes, alternating user languages"""
+    rng = random.Random(42)
+    alerts = []
+    for i in range(count):
+        old_price = round(rng.uniform(50, 5000), 2)
+        new_price = round(old_price * rng.uniform(0.6, 1.2), 2)
+        alerts.append({
+            'username': f'user{i % 1000}',
+            'product_name': f'Product {i} <Edition {i % 7}>',
+            'product_url': f'https://www.amazon.sa/dp/B{i:09d}',
+            'old_price': old_price,
+            'new_price': new_price,
+            'target_price': old_price * 0.8 if i % 3 == 0 else None,
+            'lang': 'ar' if i % 2 else 'en',
+        })
+    return alerts
+
+def run_cached(alerts):
+    started = time.perf_counter()
+    for alert in alerts:
+        email_templates.build_price_alert_email(**alert)
+    return time.perf_counter() - started
+
+def run_uncached(alerts):
+    """Compile the template source for every message, as a per-send builder would"""
+    source = email_templates._env.loader.get_source(email_templates._env, 'price_alert.html')[0]
+    started = time.perf_counter()
+    for alert in alerts:
+        template = email_templates._env.from_string(source)
+        price_diff = abs(alert['new_price'] - alert['old_price'])
+        template.render(
+            email_templates.language_context(alert['lang']),
+            username=alert['username'],
+            product_name=alert['product_name'],
+            product_url=alert['product_url'],
+            old_price=alert['old_price'],
+            new_price=alert['new_price'],
+            price_diff=price_diff,
+            price_change_percent=price_diff / alert['old_price'] * 100,
+            target_reached=bool(alert['target_price'] and alert['new_price'] <= alert['target_price']),
+            year=2025
+        )
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark price alert email rendering')
+    parser.add_argument('--messages', type=int, default=5000, help='Alerts rendered per run')
+    args = parser.parse_args()
+
+    alerts = sample_alerts(args.messages)
+
+    email_templates.clear_email_template_cache()
+    started = time.perf_counter()
+    email_templates.get_email_template('price_alert.html', 'ar')
+    email_templates.get_email_template('price_alert.html', 'en')
+    warmup = time.perf_counter() - started
+
+    cached = run_cached(alerts)
+    uncached = run_uncached(alerts[:max(1, args.messages // 10)])
+    uncached_per_message = uncached / max(1, args.messages // 10)
+
+    print(f"Compile (2 languages, once):   {warmup * 1000:.2f} ms")
+    print(f"Cached render:                 {cached / len(alerts) * 1e6:.1f} us/message "
+          f"({len(alerts)} messages in {cached:.2f}s)")
+    print(f"Compile + render per message:  {uncached_per_message * 1e6:.1f} us/message")
+    print(f"Speedup:                       {uncached_per_message / (cached / len(alerts)):.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Deal-card parsing for the Amazon bots
+
+Deal and search result cards already show the product's title, deal
+price, list price, discount and thumbnail. The bots read them into a
+candidate dict and only fetch the product page when the card is missing
+something they need.
+"""
+
+# Selectors are tried in order; the first non-empty match wins
+CARD_TITLE_SELECTORS = [
+    '.a-truncate-full', '[class*="truncate-full"]', 'h2 span', 'h2 a span',
+    '.a-size-base-plus', '.a-size-medium', '.dealTitle', '.a-text-normal'
+]
+CARD_PRICE_SELECTORS = [
+    '.a-price:not(.a-text-price) .a-offscreen', '.dealPriceText', '.a-price-whole'
+]
+CARD_LIST_PRICE_SELECTORS = [
+    '.a-text-price .a-offscreen', '.a-text-strike', '.a-price.a-text-price span'
+]
+CARD_DISCOUNT_SELECTORS = (
+    'span.a-color-secondary span.a-text-bold, .dealPriceText .savingsPercentage, '
+    'span.a-text-strike, .a-text-price, .a-price-savings, .savingsPercentage'
+)
+
+def parse_price(text):
+    """Number in a price string such as 'SAR 1,299.00' or '٩٩', or None"""
+    if not text:
+        return None
+    # Arabic-Indic digits appear on the Arabic pages
+    text = text.translate(str.maketrans('٠١٢٣٤٥٦٧٨٩٫', '0123456789.'))
+    price_str = ''.join(filter(lambda x: x.isdigit() or x == '.', text.strip()))
+    try:
+        price = float(price_str)
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+def parse_discount(text):
+    """Percentage in a badge such as '-25%' or '(25%)', or None"""
+    if not text or '%' not in text:
+        return None
+    try:
+        return float(text.split('%')[0].replace('-', '').replace('(', '').replace(')', '').strip())
+    except ValueError:
+        return None
+
+def _first_text(card, selectors):
+    for selector in selectors:
+        element = card.select_one(selector)
+        if element and element.text.strip():
+            return element.text.strip()
+    return None
+
+def extract_card_details(card):
+    """
+    Title, deal price, list price, discount and thumbnail from one card.
+    Missing fields are None.
+    """
+    price = parse_price(_first_text(card, CARD_PRICE_SELECTORS))
+    list_price = parse_price(_first_text(card, CARD_LIST_PRICE_SELECTORS))
+
+    discount_percent = None
+    for element in card.select(CARD_DISCOUNT_SELECTORS):
+        discount_percent = parse_discount(element.text.strip())
+        if discount_percent is not None:
+            break
+    if discount_percent is None and price and list_price and list_price > price:
+        discount_percent = round((list_price - price) / list_price * 100, 1)
+
+    name = _first_text(card, CARD_TITLE_SELECTORS)
+    image = card.select_one('img')
+    image_url = None
+    if image is not None:
+        name = name or image.get('alt') or None
+        image_url = image.get('data-old-hires') or image.get('src') or image.get('data-src')
+        if image_url and image_url.startswith('data:'):
+            image_url = None
+
+    return {
+        'name': name,
+        'price': price,
+        'list_price': list_price,
+        'discount_percent': discount_percent,
+        'image_url': image_url,
+    }
+
+def card_is_complete(candidate):
+    """True if the card alone has everything needed to add the product"""
+    return all(candidate.get(key) for key in ('name', 'price', 'image_url')) \
+        and candidate.get('discount_percent') is not None
@@ -0,0 +1,210 @@
+"""
+Cached, validated bot settings
+
+bot_config.json is parsed once and kept in memory. get() re-reads it only
+when the file's mtime changes (checked at most every
+BOT_CONFIG_CHECK_SECONDS), so settings saved from the admin page, or
+edited by hand, reach a running bot or scheduler without a restart.
+Values are validated against SETTINGS_SCHEMA; invalid ones fall back to
+the defaults and are reported. Code that keeps derived state (module
+constants, schedules) registers a listener with subscribe().
+"""
+
+import os
+import re
+import json
+import time
+import threading
+
+BOT_CONFIG_FILE = os.environ.get('BOT_CONFIG_FILE', 'bot_config.json')
+BOT_CONFIG_CHECK_SECONDS = float(os.environ.get('BOT_CONFIG_CHECK_SECONDS', 1))
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'run_time': '09:00',
+    'max_products': 10,
+    'min_discount': 10,
+    'bot_username': 'amazon_bot',
+    'bot_email': 'bot@amazontracker.sa',
+    'cleanup_old_products': False,
+    'categories': ['electronics', 'home', 'kitchen', 'fashion', 'beauty', 'toys', 'sports']
+}
+
+_RUN_TIME_RE = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+
+def _int_between(low, high):
+    def check(value):
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError('expected a whole number')
+        if not low <= value <= high:
+            raise ValueError(f'must be between {low} and {high}')
+        return value
+    return check
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ('true', 'false', '1', '0', 'on', 'off'):
+        return value.lower() in ('true', '1', 'on')
+    raise ValueError('expected true or false')
+
+def _run_time(value):
+    if not isinstance(value, str) or not _RUN_TIME_RE.match(value):
+        raise ValueError('expected HH:MM')
+    return value
+
+def _text(max_length, pattern=None):
+    def check(value):
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError('must not be empty')
+        value = value.strip()
+        if len(value) > max_length:
+            raise ValueError(f'longer than {max_length} characters')
+        if pattern and not re.match(pattern, value):
+            raise ValueError('invalid format')
+        return value
+    return check
+
+def _categories(value):
+    if not isinstance(value, list) or not all(isinstance(item, str) and item.strip() for item in value):
+        raise ValueError('expected a list of category names')
+    return [item.strip() for item in value]
+
+# setting -> function returning the cleaned value or raising ValueError
+SETTINGS_SCHEMA = {
+    'enabled': _boolean,
+    'run_time': _run_time,
+    'max_products': _int_between(1, 50),
+    'min_discount': _int_between(1, 99),
+    'bot_username': _text(80),
+    'bot_email': _text(120, r'^[^@\s]+@[^@\s]+$'),
+    'cleanup_old_products': _boolean,
+    'categories': _categories,
+}
+
+def validate_settings(raw, base=None):
+    """
+    Clean raw settings against SETTINGS_SCHEMA.
+
+    Returns:
+        (settings, errors): settings always has every key (values from base,
+        or the defaults, where raw is missing or invalid); errors maps each
+        rejected key to a reason
+    """
+    base = base or DEFAULT_SETTINGS
+    settings = {key: (list(value) if isinstance(value, list) else value) for key, value in base.items()}
+    errors = {}
+    if not isinstance(raw, dict):
+        return settings, {'': 'settings must be a JSON object'}
+    for key, value in raw.items():
+        check = SETTINGS_SCHEMA.get(key)
+        if check is None:
+            # Unknown keys are kept so newer settings survive an older reader
+            settings[key] = value
+            continue
+        try:
+            settings[key] = check(value)
+        except (TypeError, ValueError) as e:
+            errors[key] = str(e)
+    return settings, errors
+
+class BotConfig:
+    """Settings cached in memory and refreshed when the config file changes"""
+
+    def __init__(self, path=BOT_CONFIG_FILE, check_seconds=BOT_CONFIG_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._lock = threading.RLock()
+        self._settings = None
+        self._mtime = None
+        self._checked_at = 0
+        self._listeners = []
+        self.errors = {}
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        """(settings, parsed); parsed is False when the file exists but could not be read"""
+        raw = {}
+        parsed = True
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    raw = json.load(f)
+            except Exception as e:
+                print(f"Error loading bot settings: {str(e)}")
+                parsed = False
+                # Keep the last good settings while the file is unreadable (e.g. mid-edit)
+                if self._settings is not None:
+                    return self._settings, parsed
+        settings, errors = validate_settings(raw)
+        if errors:
+            print(f"Invalid bot settings in {self.path}, using defaults for: {errors}")
+        self.errors = errors
+        return settings, parsed
+
+    def get(self):
+        """Current settings (a copy); reloads the file if it changed"""
+        with self._lock:
+            now = time.monotonic()
+            if self._settings is None or now - self._checked_at >= self.check_seconds:
+                self._checked_at = now
+                mtime = self._file_mtime()
+                if self._settings is None or mtime != self._mtime:
+                    previous = self._settings
+                    self._settings, parsed = self._load()
+                    # Only a successful parse counts as seen; a half-written file is read again next check
+                    if parsed:
+                        self._mtime = mtime
+                    if previous is not None and previous != self._settings:
+                        self._notify()
+            return dict(self._settings)
+
+    def save(self, settings):
+        """
+        Validate and write settings, then push them to listeners.
+
+        Returns:
+            The errors dict from validate_settings (empty when all values were valid)
+        """
+        with self._lock:
+            # Rejected values keep what is currently in effect
+            cleaned, errors = validate_settings(settings, base=self.get())
+            # Write to a temp file and rename so readers never see a half-written file
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(cleaned, f, indent=4)
+            os.replace(tmp_path, self.path)
+            self._settings = cleaned
+            self._mtime = self._file_mtime()
+            self._checked_at = time.monotonic()
+            self.errors = errors
+            self._notify()
+        return errors
+
+    def subscribe(self, listener):
+        """Call listener(settings) now and after every change"""
+        with self._lock:
+            self._listeners.append(listener)
+            listener(self.get())
+
+    def _notify(self):
+        for listener in list(self._listeners):
+            try:
+                listener(dict(self._settings))
+            except Exception as e:
+                print(f"Error applying bot settings: {str(e)}")
+
+config = BotConfig()
+
+def get_bot_settings():
+    """Current bot settings"""
+    return config.get()
@@ -0,0 +1,82 @@
+"""
+SQLite connections for the bot and its admin pages
+
+The bot writes to the tracker database while the web app reads it. Each
+thread keeps one tuned connection per database file and reuses it
+instead of opening a new one for every helper call:
+
+- WAL journaling, so admin reads don't wait on the bot's writes (and the
+  other way around); the mode is stored in the database file
+- synchronous=NORMAL, which is safe with WAL and skips an fsync per commit
+- memory-mapped reads and a larger page cache
+- a busy timeout instead of failing straight away with "database is locked"
+
+Because the connection lives on, sqlite3's per-connection statement cache
+keeps the bot's hot queries prepared across calls.
+"""
+
+import os
+import sqlite3
+import threading
+
+BOT_DB_BUSY_TIMEOUT = float(os.environ.get('BOT_DB_BUSY_TIMEOUT', 10))
+BOT_DB_CACHE_KB = int(os.environ.get('BOT_DB_CACHE_KB', 8 * 1024))
+BOT_DB_MMAP_BYTES = int(os.environ.get('BOT_DB_MMAP_BYTES', 64 * 1024 * 1024))
+BOT_DB_STATEMENT_CACHE = int(os.environ.get('BOT_DB_STATEMENT_CACHE', 256))
+
+def connect(path, check_same_thread=True):
+    """Open a new connection to path with the WAL and cache pragmas applied"""
+    conn = sqlite3.connect(path, timeout=BOT_DB_BUSY_TIMEOUT, check_same_thread=check_same_thread,
+                           cached_statements=BOT_DB_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+    except sqlite3.OperationalError as e:
+        # e.g. a read-only filesystem; the default journal still works
+        print(f"Could not enable WAL for {path}: {str(e)}")
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{BOT_DB_CACHE_KB}')
+    conn.execute(f'PRAGMA mmap_size={BOT_DB_MMAP_BYTES}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+class ConnectionManager:
+    """One reusable connection per thread for a database file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def get(self):
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def release(self):
+        """
+        End of a request or job: roll back anything left uncommitted so the
+        connection never holds a write lock between uses
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def connection_manager(path):
+    """The shared ConnectionManager for a database file"""
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = ConnectionManager(path)
+        return manager
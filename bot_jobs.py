@@ -0,0 +1,321 @@
+"""
+In-process job runner for manual bot runs
+
+The admin "run bot" button starts amazon_bot_direct.run_amazon_bot on a
+background thread of the web process instead of spawning a new Python
+interpreter. Only one run at a time is allowed: a lock inside the process
+plus a file lock shared by all web workers. Progress (pages scanned,
+candidates, products added, errors) is published as numbered events that
+the admin page long-polls, and the run's log output is kept in a bounded
+buffer. A run can be cancelled; it stops after its in-flight fetches.
+
+The worker running the job mirrors its state into the bot_jobs table of
+the bot database about once a second (BOT_JOB_SYNC_INTERVAL). Other web
+workers answer status polls from that row and cancel by setting its
+cancel_requested flag, which the running worker picks up on its next sync.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+from bot_db import connection_manager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+BOT_JOB_OUTPUT_LINES = int(os.environ.get('BOT_JOB_OUTPUT_LINES', 500))
+BOT_JOB_EVENTS = int(os.environ.get('BOT_JOB_EVENTS', 200))
+BOT_JOB_LOCK_FILE = os.environ.get('BOT_JOB_LOCK_FILE', 'instance/bot_job.lock')
+# Same database file as amazon_bot_direct.DATABASE_PATH
+BOT_JOB_DB = os.environ.get('BOT_JOB_DB', '/tmp/amazon_tracker.db' if os.environ.get('RENDER') else 'instance/amazon_tracker.db')
+BOT_JOB_SYNC_INTERVAL = float(os.environ.get('BOT_JOB_SYNC_INTERVAL', 1))
+# A running job whose row hasn't been synced for this long died with its worker
+BOT_JOB_STALE_SECONDS = float(os.environ.get('BOT_JOB_STALE_SECONDS', 30))
+
+JOBS_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS bot_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        finished_at TEXT,
+        counts TEXT NOT NULL DEFAULT '{}',
+        events TEXT NOT NULL DEFAULT '[]',
+        output TEXT NOT NULL DEFAULT '[]',
+        seq INTEGER NOT NULL DEFAULT 0,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL
+    )''',
+]
+
+class BotJob:
+    """State of one manual run"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'running'
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        self.counts = {}
+        self.cancel_event = threading.Event()
+        self.output = deque(maxlen=BOT_JOB_OUTPUT_LINES)
+        self.events = deque(maxlen=BOT_JOB_EVENTS)
+        self.seq = 0
+
+    @property
+    def running(self):
+        return self.status in ('running', 'cancelling')
+
+class _OutputBuffer(logging.Handler):
+    """Copies the bot's log lines into the job's bounded output buffer"""
+
+    def __init__(self, job):
+        super().__init__(level=logging.INFO)
+        self.job = job
+        self.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+
+    def emit(self, record):
+        try:
+            self.job.output.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+class BotJobRunner:
+    """Runs at most one bot job per deployment and publishes its progress"""
+
+    def __init__(self, lock_file=BOT_JOB_LOCK_FILE, db_path=BOT_JOB_DB):
+        self.lock_file = lock_file
+        self.db = connection_manager(db_path)
+        self.job = None
+        self._next_id = 1
+        self._cond = threading.Condition()
+        self._lock_handle = None
+        self._table_ready = False
+
+    def _conn(self):
+        conn = self.db.get()
+        if not self._table_ready:
+            for statement in JOBS_SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    def _acquire_process_lock(self):
+        if fcntl is None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.lock_file) or '.', exist_ok=True)
+            handle = open(self.lock_file, 'w')
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # Another worker process is running the bot
+            return False
+        self._lock_handle = handle
+        return True
+
+    def _release_process_lock(self):
+        if self._lock_handle is not None:
+            fcntl.flock(self._lock_handle, fcntl.LOCK_UN)
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def start(self, target=None):
+        """
+        Start a run on a background thread.
+
+        Returns:
+            The new BotJob, or None if a run is already in progress
+        """
+        with self._cond:
+            if self.job is not None and self.job.running:
+                return None
+            if not self._acquire_process_lock():
+                print("Bot job not started: a run is in progress in another worker")
+                return None
+            job = BotJob(self._insert_shared())
+            self.job = job
+        self._publish(job, 'started', {})
+        threading.Thread(target=self._run, args=(job, target), name=f'bot-job-{job.id}', daemon=True).start()
+        threading.Thread(target=self._sync_loop, args=(job,), name=f'bot-job-{job.id}-sync', daemon=True).start()
+        return job
+
+    def _insert_shared(self):
+        """Add the new job's row and return its id (a local id if the database is unavailable)"""
+        now = datetime.utcnow().isoformat()
+        try:
+            conn = self._conn()
+            # We hold the file lock, so any job still marked running lost its worker
+            conn.execute("UPDATE bot_jobs SET status = 'interrupted', finished_at = ? "
+                         "WHERE status IN ('running', 'cancelling')", (now,))
+            cursor = conn.execute("INSERT INTO bot_jobs (status, started_at, updated_at) VALUES ('running', ?, ?)",
+                                  (now, now))
+            conn.commit()
+            return cursor.lastrowid
+        except Exception as e:
+            print(f"Could not record bot job: {str(e)}")
+            self.db.release()
+            job_id = self._next_id
+            self._next_id += 1
+            return job_id
+
+    def _write_shared(self, job):
+        """Copy the job's state to its row; returns True if another worker asked to cancel it"""
+        with self._cond:
+            state = (job.status, job.finished_at.isoformat() if job.finished_at else None,
+                     json.dumps(job.counts), json.dumps(list(job.events)), json.dumps(list(job.output)), job.seq)
+        try:
+            conn = self._conn()
+            conn.execute('''
+                UPDATE bot_jobs
+                SET status = ?, finished_at = ?, counts = ?, events = ?, output = ?, seq = ?, updated_at = ?
+                WHERE id = ?
+            ''', state + (datetime.utcnow().isoformat(), job.id))
+            conn.commit()
+            row = conn.execute('SELECT cancel_requested FROM bot_jobs WHERE id = ?', (job.id,)).fetchone()
+            return bool(row and row['cancel_requested'])
+        except Exception as e:
+            print(f"Could not sync bot job {job.id}: {str(e)}")
+            self.db.release()
+            return False
+
+    def _sync_loop(self, job):
+        """Mirror a running job to the database and pick up cancel requests from other workers"""
+        while job.running:
+            if self._write_shared(job) and not job.cancel_event.is_set():
+                self.cancel()
+            with self._cond:
+                self._cond.wait_for(lambda: not job.running, timeout=BOT_JOB_SYNC_INTERVAL)
+        self.db.close()
+
+    def _run(self, job, target):
+        output = _OutputBuffer(job)
+        bot_logger = logging.getLogger('amazon_bot')
+        bot_logger.addHandler(output)
+        status = 'failed'
+        try:
+            if target is None:
+                # Imported on first use, then reused by every later run in this process
+                import amazon_bot_direct
+                target = amazon_bot_direct.run_amazon_bot
+            stats = target(cancel=job.cancel_event,
+                           on_progress=lambda key, counts: self._publish(job, 'progress', counts))
+            if job.cancel_event.is_set():
+                status = 'cancelled'
+            elif stats is not None:
+                status = 'success'
+        except Exception as e:
+            job.output.append(f"Bot job failed: {str(e)}")
+            traceback.print_exc()
+        finally:
+            bot_logger.removeHandler(output)
+            with self._cond:
+                job.status = status
+                job.finished_at = datetime.utcnow()
+                self._release_process_lock()
+            self._publish(job, 'finished', {'status': status})
+            self._write_shared(job)
+
+    def cancel(self):
+        """Ask the current run to stop, here or in another worker; returns False if nothing is running"""
+        with self._cond:
+            job = self.job
+            local = job is not None and job.running
+            if local:
+                job.status = 'cancelling'
+                job.cancel_event.set()
+        if local:
+            self._publish(job, 'cancelling', {})
+            return True
+        try:
+            conn = self._conn()
+            cursor = conn.execute("UPDATE bot_jobs SET cancel_requested = 1 "
+                                  "WHERE status = 'running' AND updated_at >= ?", (self._stale_before(),))
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Could not cancel bot job: {str(e)}")
+            self.db.release()
+            return False
+
+    def _stale_before(self):
+        return (datetime.utcnow() - timedelta(seconds=BOT_JOB_STALE_SECONDS)).isoformat()
+
+    def _publish(self, job, event, data):
+        with self._cond:
+            if event == 'progress':
+                job.counts = dict(data)
+            job.seq += 1
+            job.events.append({'seq': job.seq, 'event': event, 'data': data, 'at': time.time()})
+            self._cond.notify_all()
+
+    def snapshot(self, since=0, wait=0, output_lines=50):
+        """
+        Current job state with the events after `since`.
+
+        If there is nothing new and the job is running, waits up to `wait`
+        seconds for the next event (long polling). A job running in another
+        worker is read from its bot_jobs row.
+        """
+        with self._cond:
+            job = self.job
+            if job is not None and job.running:
+                if wait and job.seq <= since:
+                    self._cond.wait_for(lambda: job.seq > since or not job.running, timeout=wait)
+                return self._job_state(job.id, job.status, job.started_at.isoformat(),
+                                       job.finished_at.isoformat() if job.finished_at else None,
+                                       job.counts, list(job.events), list(job.output), job.seq, since, output_lines)
+
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                row = self._conn().execute('SELECT * FROM bot_jobs ORDER BY id DESC LIMIT 1').fetchone()
+                self.db.release()
+            except Exception as e:
+                print(f"Could not read bot job state: {str(e)}")
+                self.db.release()
+                row = None
+            if row is None:
+                return self._local_snapshot(since, output_lines)
+            status = row['status']
+            if status in ('running', 'cancelling') and row['updated_at'] < self._stale_before():
+                status = 'interrupted'
+            running = status in ('running', 'cancelling')
+            if not running or row['seq'] > since or time.monotonic() >= deadline:
+                return self._job_state(row['id'], status, row['started_at'], row['finished_at'],
+                                       json.loads(row['counts']), json.loads(row['events']),
+                                       json.loads(row['output']), row['seq'], since, output_lines)
+            time.sleep(min(BOT_JOB_SYNC_INTERVAL / 2, max(deadline - time.monotonic(), 0)))
+
+    def _local_snapshot(self, since, output_lines):
+        with self._cond:
+            job = self.job
+            if job is None:
+                return {'job': None}
+            return self._job_state(job.id, job.status, job.started_at.isoformat(),
+                                   job.finished_at.isoformat() if job.finished_at else None,
+                                   job.counts, list(job.events), list(job.output), job.seq, since, output_lines)
+
+    @staticmethod
+    def _job_state(job_id, status, started_at, finished_at, counts, events, output, seq, since, output_lines):
+        return {
+            'job': {
+                'id': job_id,
+                'status': status,
+                'started_at': started_at,
+                'finished_at': finished_at,
+                'counts': counts,
+            },
+            'seq': seq,
+            'events': [event for event in events if event['seq'] > since],
+            'output': output[-output_lines:],
+        }
+
+runner = BotJobRunner()
@@ -0,0 +1,102 @@
+"""
+Structured logging for the Amazon bot and its scheduler
+
+Log records are written as JSON lines with optional structured fields
+(run_id, stage, asin, latency_ms, outcome) so the log viewer can index
+and filter them. Records go through a QueueHandler; a QueueListener
+thread does the file and console I/O, so worker threads never block on
+disk. Files rotate by size (BOT_LOG_MAX_BYTES, BOT_LOG_BACKUPS).
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+BOT_LOG_MAX_BYTES = int(os.environ.get('BOT_LOG_MAX_BYTES', 5 * 1024 * 1024))
+BOT_LOG_BACKUPS = int(os.environ.get('BOT_LOG_BACKUPS', 5))
+
+STRUCTURED_FIELDS = ('run_id', 'stage', 'asin', 'latency_ms', 'outcome')
+TEXT_FORMAT = '%(asctime)s %(levelname)s: %(message)s'
+
+# One bot run per process at a time; every record logged during it carries its id
+_current_run = {'id': None}
+_listeners = []
+
+def set_run_id(run_id):
+    _current_run['id'] = run_id
+
+class RunIdFilter(logging.Filter):
+    """Stamps the current run id on records that don't carry one"""
+
+    def filter(self, record):
+        if getattr(record, 'run_id', None) is None:
+            record.run_id = _current_run['id']
+        return True
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message and any structured fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_bot_logger(name, log_file):
+    """
+    Configure a bot logger: JSON lines to a rotating log_file plus plain text
+    to stdout, both written by a background listener thread.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    if any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        return logger
+
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+
+    file_handler = RotatingFileHandler(log_file, maxBytes=BOT_LOG_MAX_BYTES,
+                                       backupCount=BOT_LOG_BACKUPS, encoding='utf-8')
+    file_handler.setFormatter(JsonLinesFormatter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(logging.INFO)
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records = queue.Queue(-1)
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(RunIdFilter())
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    listener = QueueListener(records, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return logger
+
+def log_fields(stage, asin=None, outcome=None, started=None):
+    """extra= dict for a structured record; started is a time.monotonic() value"""
+    fields = {'stage': stage, 'asin': asin, 'outcome': outcome}
+    if started is not None:
+        fields['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return fields
+
+@atexit.register
+def _stop_listeners():
+    # Flush queued records before the process exits
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
@@ -0,0 +1,210 @@
+"""
+Streaming pipeline for the Amazon bots
+
+Discovery, product validation and database writes run as concurrent
+stages joined by bounded queues:
+
+    discovery (1 thread) -> candidate queue -> fetch workers (N threads)
+        -> result queue -> writer (calling thread, batched commits)
+
+The writer stops the whole pipeline as soon as enough products have been
+written, so a run does no more fetching than it needs. Per-stage counts
+and throughput are returned and logged at the end.
+"""
+
+import os
+import time
+import queue
+import threading
+import traceback
+
+BOT_FETCH_WORKERS = int(os.environ.get('BOT_FETCH_WORKERS', 3))
+BOT_WRITE_BATCH_SIZE = int(os.environ.get('BOT_WRITE_BATCH_SIZE', 5))
+BOT_CANDIDATE_QUEUE_SIZE = int(os.environ.get('BOT_CANDIDATE_QUEUE_SIZE', 20))
+
+_DONE = object()
+
+class StageStats:
+    """Item counts and wall time for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, key, amount=1):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + amount
+
+    def start(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+
+    def finish(self):
+        with self._lock:
+            self.finished = time.monotonic()
+
+    def as_dict(self, main_count):
+        if self.started is None:
+            return dict(self.counts, seconds=0.0, per_second=0.0)
+        seconds = (self.finished or time.monotonic()) - self.started
+        items = self.counts.get(main_count, 0)
+        return dict(self.counts, seconds=round(seconds, 2),
+                    per_second=round(items / seconds, 3) if seconds > 0 else 0.0)
+
+def run_pipeline(candidates, validate, write_batch, limit, workers=BOT_FETCH_WORKERS,
+                 batch_size=BOT_WRITE_BATCH_SIZE, queue_size=BOT_CANDIDATE_QUEUE_SIZE,
+                 skip=None, cancel=None, logger=None):
+    """
+    Stream candidates through validate() into write_batch() until limit items are written.
+
+    Args:
+        candidates: Iterable (usually a generator) of candidates, e.g. URLs or deal-card dicts
+        validate: candidate -> record or None; runs on the fetch workers
+        write_batch: list of records -> number written; runs on the calling thread
+        limit: Stop once this many records have been written
+        skip: Optional candidate -> bool; candidates it accepts are dropped before any fetch
+        cancel: Optional threading.Event; setting it stops the run after in-flight fetches finish
+
+    Returns:
+        Dict of per-stage stats plus the total written
+    """
+    candidate_q = queue.Queue(maxsize=queue_size)
+    result_q = queue.Queue()
+    stop = threading.Event()
+    discovery = StageStats('discovery')
+    fetch = StageStats('fetch')
+    write = StageStats('write')
+
+    def produce():
+        discovery.start()
+        iterator = iter(candidates)
+        try:
+            for candidate in iterator:
+                if stop.is_set():
+                    break
+                if skip and skip(candidate):
+                    discovery.add('skipped')
+                    continue
+                discovery.add('candidates')
+                _put_until_stopped(candidate_q, candidate, stop)
+        except Exception as e:
+            print(f"Discovery stage failed: {str(e)}")
+            traceback.print_exc()
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()
+            discovery.finish()
+            # A stopped run may have drained these; the workers also watch the stop flag
+            for _ in range(workers):
+                _put_until_stopped(candidate_q, _DONE, stop)
+
+    def consume():
+        while True:
+            try:
+                candidate = candidate_q.get(timeout=0.5)
+            except queue.Empty:
+                if stop.is_set():
+                    result_q.put(_DONE)
+                    return
+                continue
+            if candidate is _DONE or stop.is_set():
+                result_q.put(_DONE)
+                return
+            fetch.start()
+            try:
+                record = validate(candidate)
+            except Exception as e:
+                print(f"Error validating {candidate}: {str(e)}")
+                record = None
+            fetch.add('validated' if record else 'rejected')
+            result_q.put(record)
+
+    threads = [threading.Thread(target=produce, name='bot-discovery', daemon=True)]
+    threads += [threading.Thread(target=consume, name=f'bot-fetch-{i}', daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    written = 0
+    batch = []
+    workers_done = 0
+
+    def flush():
+        nonlocal written, batch
+        if not batch:
+            return
+        # Never write past the limit, even if the last batch filled up at once
+        batch = batch[:limit - written]
+        write.start()
+        try:
+            count = write_batch(batch)
+        except Exception as e:
+            print(f"Error writing batch of {len(batch)}: {str(e)}")
+            traceback.print_exc()
+            count = 0
+        write.add('batches')
+        write.add('written', count)
+        write.add('not_written', len(batch) - count)
+        written += count
+        batch = []
+
+    while workers_done < workers:
+        try:
+            item = result_q.get(timeout=0.5)
+        except queue.Empty:
+            item = None
+        if cancel is not None and cancel.is_set() and not stop.is_set():
+            stop.set()
+            _drain(candidate_q)
+        if item is _DONE:
+            workers_done += 1
+            continue
+        if item is None or written >= limit or stop.is_set():
+            continue
+        batch.append(item)
+        if len(batch) >= batch_size or written + len(batch) >= limit:
+            flush()
+            if written >= limit:
+                # Enough products: stop discovery and let the workers drain
+                stop.set()
+                fetch.finish()
+                _drain(candidate_q)
+    flush()
+    stop.set()
+    fetch.finish()
+    write.finish()
+
+    stats = {
+        'written': written,
+        'discovery': discovery.as_dict('candidates'),
+        'fetch': fetch.as_dict('validated'),
+        'write': write.as_dict('written'),
+    }
+    for stage in ('discovery', 'fetch', 'write'):
+        if logger:
+            logger.info(f"Pipeline {stage}: {stats[stage]}", extra={'stage': stage, 'outcome': 'summary'})
+        else:
+            print(f"Pipeline {stage}: {stats[stage]}")
+    return stats
+
+def _put_until_stopped(q, item, stop):
+    """Put into a bounded queue, giving up once the stop flag is set"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _drain(q):
+    """Empty a queue without blocking (lets a producer blocked on put() see the stop flag)"""
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
@@ -0,0 +1,113 @@
+"""
+Materialized price columns for the bot's product table
+
+Each product row stores three prices when it is written:
+
+- initial_price: the reference price; the deal's list price for products
+  the bot adds, otherwise the first price in price_history
+- lowest_price: the lowest price seen
+- discount_pct: how far the current price is below initial_price
+
+An index on (user_id, discount_pct) lets the admin page read discount
+analytics as plain indexed aggregates. Before, it parsed price_history
+JSON for every bot product on each view. ensure_price_columns() adds
+the columns to an older database and backfills them once from the
+stored histories.
+"""
+
+import sqlite3
+import threading
+
+PRICE_COLUMNS = [
+    ('initial_price', 'REAL'),
+    ('lowest_price', 'REAL'),
+    ('discount_pct', 'REAL'),
+]
+
+PRICE_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_product_user_discount ON product(user_id, discount_pct)',
+]
+
+# One-off backfill for rows written before the columns existed (or by code that doesn't set them)
+BACKFILL_STATEMENTS = [
+    '''
+    UPDATE product SET
+        initial_price = COALESCE(
+            CASE WHEN json_valid(price_history)
+                 THEN CAST(json_extract(price_history, '$[0].price') AS REAL) END,
+            current_price),
+        lowest_price = (
+            SELECT MIN(price) FROM (
+                SELECT CAST(json_extract(value, '$.price') AS REAL) AS price
+                FROM json_each(CASE WHEN json_valid(product.price_history) AND json_type(product.price_history) = 'array'
+                                    THEN product.price_history ELSE '[]' END)
+                UNION ALL
+                SELECT product.current_price
+            ) WHERE price > 0)
+    WHERE initial_price IS NULL
+    ''',
+    '''
+    UPDATE product SET
+        discount_pct = CASE WHEN initial_price > current_price AND current_price IS NOT NULL
+                            THEN ROUND((initial_price - current_price) * 100.0 / initial_price, 1)
+                            ELSE 0 END
+    WHERE discount_pct IS NULL
+    ''',
+]
+
+_ready = set()   # database files whose columns are in place
+_ready_lock = threading.Lock()
+
+def price_columns(price, list_price=None, discount_percent=None):
+    """initial_price, lowest_price and discount_pct for a product added at price"""
+    initial_price = price
+    if list_price and list_price > price:
+        initial_price = list_price
+    elif discount_percent and 0 < discount_percent < 100:
+        initial_price = round(price * 100 / (100 - discount_percent), 2)
+    if discount_percent is None:
+        discount_percent = (initial_price - price) * 100 / initial_price if initial_price and initial_price > price else 0
+    return {
+        'initial_price': initial_price,
+        'lowest_price': price,
+        'discount_pct': round(discount_percent, 1),
+    }
+
+def ensure_price_columns(conn):
+    """
+    Add the price columns and index to the product table if missing and
+    backfill rows that lack them. Runs once per database file per process.
+
+    Returns:
+        Number of rows backfilled (0 when there was nothing to do)
+    """
+    database = conn.execute('PRAGMA database_list').fetchone()[2]
+    if database in _ready:
+        return 0
+    with _ready_lock:
+        if database in _ready:
+            return 0
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(product)')}
+        if not existing:
+            # No product table yet; check again next time
+            return 0
+        for name, column_type in PRICE_COLUMNS:
+            if name not in existing:
+                try:
+                    conn.execute(f'ALTER TABLE product ADD COLUMN {name} {column_type}')
+                except sqlite3.OperationalError as e:
+                    # Another process added it first
+                    if 'duplicate column' not in str(e):
+                        raise
+        for statement in PRICE_INDEXES:
+            conn.execute(statement)
+        backfilled = 0
+        try:
+            for statement in BACKFILL_STATEMENTS:
+                backfilled = max(backfilled, conn.execute(statement).rowcount)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        _ready.add(database)
+        return backfilled
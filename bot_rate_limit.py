@@ -0,0 +1,100 @@
+"""
+Host-level rate limiting for the Amazon bots
+
+Every request the bots make to a host takes a token from that host's
+bucket, so politeness is a global rate shared by all worker threads
+instead of a sleep after each page. Pages can then be fetched
+concurrently while amazon.sa still sees a steady, bounded request rate.
+"""
+
+import os
+import time
+import random
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+# Sustained requests per second to one host, and how many may go out back to back
+AMAZON_RATE_PER_SECOND = float(os.environ.get('AMAZON_RATE_PER_SECOND', 0.5))
+AMAZON_RATE_BURST = int(os.environ.get('AMAZON_RATE_BURST', 3))
+# Extra random delay per request so the pattern is not perfectly periodic
+AMAZON_RATE_JITTER = float(os.environ.get('AMAZON_RATE_JITTER', 0.5))
+DISCOVERY_WORKERS = int(os.environ.get('BOT_DISCOVERY_WORKERS', 4))
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available"""
+
+    def __init__(self, rate, capacity, jitter=0.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.jitter = jitter
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Take one token, sleeping as long as needed; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+        if self.jitter:
+            extra = random.uniform(0, self.jitter)
+            time.sleep(extra)
+            waited += extra
+        return waited
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_host_limiter(url):
+    """The shared bucket for url's host (www.amazon.sa and amazon.sa share one)"""
+    host = urlparse(url).netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(AMAZON_RATE_PER_SECOND, AMAZON_RATE_BURST, AMAZON_RATE_JITTER)
+            _buckets[host] = bucket
+        return bucket
+
+def polite_get(url, headers=None, timeout=15, session=None):
+    """requests.get that first waits for the host's rate limiter"""
+    get_host_limiter(url).acquire()
+    return (session or requests).get(url, headers=headers, timeout=timeout)
+
+def fetch_concurrently(urls, fetch, max_workers=DISCOVERY_WORKERS):
+    """
+    Run fetch(url) for every url on a small thread pool.
+
+    Yields (url, result, error) as each fetch finishes, so callers can use
+    results while slower pages are still loading. Stop iterating to cancel
+    the fetches that have not started yet.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='discovery')
+    futures = {executor.submit(fetch, url): url for url in urls}
+    try:
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                yield url, future.result(), None
+            except Exception as e:
+                yield url, None, e
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
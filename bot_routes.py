@@ -1,54 +1,41 @@
 import os
-import re
-import json
-import subprocess
 import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-import sqlite3
+
+from bot_runs import get_run_summary
+from log_index import page_logs, recent_run_ids, log_files
+from bot_jobs import runner as bot_job_runner
+from bot_config import config as bot_config, DEFAULT_SETTINGS, get_bot_settings
+from bot_db import connection_manager
+from bot_prices import ensure_price_columns
 
 bot_bp = Blueprint('bot', __name__)
 
-# Configuration file path
-BOT_CONFIG_FILE = 'bot_config.json'
+# Longest /bot/job long-poll; keeps a sync gunicorn worker free for other pages
+BOT_JOB_MAX_WAIT = float(os.environ.get('BOT_JOB_MAX_WAIT', 2))
+
 LOG_FILES = {
     'bot': 'logs/amazon_bot.log',
     'scheduler': 'logs/bot_scheduler.log'
 }
 
-# Default bot settings
-DEFAULT_SETTINGS = {
-    'enabled': True,
-    'run_time': '09:00',
-    'max_products': 10,
-    'min_discount': 10,
-    'bot_username': 'amazon_bot',
-    'bot_email': 'bot@amazontracker.sa',
-    'cleanup_old_products': False,
-    'categories': ['electronics', 'home', 'kitchen', 'fashion', 'beauty', 'toys', 'sports']
-}
-
-def get_bot_settings():
-    """Get bot settings from config file or return defaults"""
-    if os.path.exists(BOT_CONFIG_FILE):
-        try:
-            with open(BOT_CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            pass
-    return DEFAULT_SETTINGS.copy()
-
 def save_bot_settings(settings):
-    """Save bot settings to config file"""
-    with open(BOT_CONFIG_FILE, 'w') as f:
-        json.dump(settings, f, indent=4)
+    """Validate and save bot settings; running bots pick them up without a restart"""
+    return bot_config.save(settings)
+
+# One WAL-mode connection per worker thread, shared by every helper in a request (see bot_db.py)
+db = connection_manager('instance/amazon_tracker.db')
 
 def get_db_connection():
-    """Get a connection to the SQLite database"""
-    conn = sqlite3.connect('instance/amazon_tracker.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get this thread's connection to the SQLite database"""
+    return db.get()
+
+@bot_bp.teardown_request
+def release_db_connection(exc=None):
+    """Leave the thread's connection without an open transaction after each request"""
+    db.release()
 
 def get_bot_user_id():
     """Get the bot user ID from the database"""
@@ -65,8 +52,6 @@ def get_bot_user_id():
             return user['id']
     except Exception as e:
         print(f"Error getting bot user: {str(e)}")
-    finally:
-        conn.close()
     
     return None
 
@@ -94,6 +79,8 @@ def get_bot_statistics():
     cursor = conn.cursor()
     
     try:
+        ensure_price_columns(conn)
+        
         # Get today's products count
         cursor.execute('''
             SELECT COUNT(*) as count FROM product 
@@ -105,46 +92,22 @@ def get_bot_statistics():
         cursor.execute('SELECT COUNT(*) as count FROM product WHERE user_id = ?', (bot_user_id,))
         total_count = cursor.fetchone()['count']
         
-        # Get average discount (assuming we can calculate this from price history)
+        # Average discount of the bot's products, from the stored discount_pct (indexed)
         cursor.execute('''
-            SELECT AVG((json_extract(json_extract(price_history, '$[0].price'), '$') - 
-                       current_price) / json_extract(json_extract(price_history, '$[0].price'), '$') * 100) 
-            as avg_discount 
-            FROM product 
-            WHERE user_id = ? AND 
-                  json_extract(json_extract(price_history, '$[0].price'), '$') > current_price
+            SELECT AVG(discount_pct) as avg_discount FROM product
+            WHERE user_id = ? AND discount_pct > 0
         ''', (bot_user_id,))
-        avg_result = cursor.fetchone()
-        average_discount = avg_result['avg_discount'] if avg_result and avg_result['avg_discount'] else 0
+        average_discount = cursor.fetchone()['avg_discount'] or 0
         
-        # Get last run time from logs
-        last_run = 'Never'
+        # Last run and totals come from the bot's per-run metrics
+        summary = get_run_summary(conn)
+        last_run = summary['last_run'][:19].replace('T', ' ') if summary['last_run'] else 'Never'
         next_run = 'Not scheduled'
-        pages_checked = 0
-        products_found = 0
-        last_error = None
+        pages_checked = summary['pages_checked']
+        products_found = summary['candidates']
+        last_error = summary['last_error']
         success_rate = 0
         
-        if os.path.exists(LOG_FILES['bot']):
-            with open(LOG_FILES['bot'], 'r') as f:
-                log_content = f.read()
-                
-                # Find last run time
-                last_run_match = re.findall(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) INFO: Starting Amazon.sa bot', log_content)
-                if last_run_match:
-                    last_run = last_run_match[-1]
-                
-                # Get pages checked count
-                pages_checked = len(re.findall(r'INFO: Checking deal page:', log_content))
-                
-                # Get products found count
-                products_found = len(re.findall(r'INFO: Found product with', log_content)) + len(re.findall(r'INFO: Found potential product in', log_content))
-                
-                # Get last error
-                error_matches = re.findall(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} ERROR: (.+?)(?=\n\d{4}-\d{2}-\d{2}|\Z)', log_content, re.DOTALL)
-                if error_matches:
-                    last_error = error_matches[-1].strip().split('\n')[0]
-        
         # Get next scheduled run from scheduler settings
         settings = get_bot_settings()
         if settings['enabled']:
@@ -162,7 +125,7 @@ def get_bot_statistics():
         
         # Calculate success rate
         if products_found > 0:
-            success_rate = min(100, round((total_count / products_found) * 100))
+            success_rate = min(100, round((summary['added'] / products_found) * 100))
         
         return {
             'bot_active': settings['enabled'],
@@ -191,8 +154,6 @@ def get_bot_statistics():
             'average_discount': 0,
             'last_error': str(e)
         }
-    finally:
-        conn.close()
 
 def get_recent_products(limit=10):
     """Get recently added products by the bot"""
@@ -204,8 +165,9 @@ def get_recent_products(limit=10):
     cursor = conn.cursor()
     
     try:
+        ensure_price_columns(conn)
         cursor.execute('''
-            SELECT id, name, custom_name, url, current_price, image_url, created_at
+            SELECT id, name, custom_name, url, current_price, image_url, created_at, discount_pct
             FROM product
             WHERE user_id = ?
             ORDER BY created_at DESC
@@ -216,14 +178,6 @@ def get_recent_products(limit=10):
         for row in cursor.fetchall():
             product = dict(row)
             
-            # Try to extract discount from custom name or calculate if possible
-            discount = 0
-            if product['custom_name'] and ':' in product['custom_name']:
-                # Try to parse discount from name if it contains percentage
-                match = re.search(r'(\d+)%', product['custom_name'])
-                if match:
-                    discount = int(match.group(1))
-            
             # Format date
             if 'created_at' in product and product['created_at']:
                 try:
@@ -232,7 +186,7 @@ def get_recent_products(limit=10):
                 except:
                     pass
             
-            product['discount'] = discount
+            product['discount'] = round(product['discount_pct'] or 0)
             products.append(product)
         
         return products
@@ -240,57 +194,13 @@ def get_recent_products(limit=10):
     except Exception as e:
         print(f"Error getting recent products: {str(e)}")
         return []
-    finally:
-        conn.close()
 
-def parse_log_file(log_file, page=1, level='all', lines_per_page=100):
-    """Parse log file and return entries with pagination"""
-    if not os.path.exists(log_file):
-        return [], 0, 0, 0, 0, 1
-    
-    with open(log_file, 'r') as f:
-        log_lines = f.readlines()
-    
-    entries = []
-    info_count = 0
-    warning_count = 0
-    error_count = 0
-    
-    for line in log_lines:
-        # Parse log entry using regex to extract timestamp, level, and message
-        match = re.match(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) (\w+): (.+)', line)
-        if match:
-            timestamp, log_level, message = match.groups()
-            
-            # Count by level
-            if log_level == 'INFO':
-                info_count += 1
-            elif log_level == 'WARNING':
-                warning_count += 1
-            elif log_level == 'ERROR':
-                error_count += 1
-            
-            # Filter by level if specified
-            if level != 'all' and level.upper() != log_level.upper():
-                continue
-            
-            entries.append({
-                'timestamp': timestamp,
-                'level': log_level,
-                'message': message
-            })
-    
-    # Calculate pagination
-    total_entries = len(entries)
-    total_pages = max(1, (total_entries + lines_per_page - 1) // lines_per_page)
-    page = max(1, min(page, total_pages))
-    
-    # Get entries for the current page
-    start_idx = (page - 1) * lines_per_page
-    end_idx = start_idx + lines_per_page
-    page_entries = entries[start_idx:end_idx]
-    
-    return page_entries, info_count, warning_count, error_count, total_entries, total_pages
+def parse_log_file(log_file, page=1, level='all', lines_per_page=100, run_id=None, asin=None):
+    """
+    Return one page of log entries from the log and its rotated backups, newest page first
+    Pages are read by seeking through cached offset indexes (see log_index.py)
+    """
+    return page_logs(log_file, page, level, run_id, asin, lines_per_page)
 
 @bot_bp.route('/bot')
 @login_required
@@ -320,8 +230,8 @@ def bot_settings():
         # Update settings from form
         settings['enabled'] = 'enabled' in request.form
         settings['run_time'] = request.form.get('run_time', DEFAULT_SETTINGS['run_time'])
-        settings['max_products'] = int(request.form.get('max_products', DEFAULT_SETTINGS['max_products']))
-        settings['min_discount'] = int(request.form.get('min_discount', DEFAULT_SETTINGS['min_discount']))
+        settings['max_products'] = request.form.get('max_products', DEFAULT_SETTINGS['max_products'])
+        settings['min_discount'] = request.form.get('min_discount', DEFAULT_SETTINGS['min_discount'])
         settings['bot_username'] = request.form.get('bot_username', DEFAULT_SETTINGS['bot_username'])
         settings['bot_email'] = request.form.get('bot_email', DEFAULT_SETTINGS['bot_email'])
         settings['cleanup_old_products'] = 'cleanup_old_products' in request.form
@@ -341,15 +251,17 @@ def bot_settings():
                     conn.commit()
                 except Exception as e:
                     print(f"Error updating bot password: {str(e)}")
-                finally:
-                    conn.close()
         
         # Get selected categories
         settings['categories'] = request.form.getlist('categories')
         
-        # Save settings
-        save_bot_settings(settings)
-        flash('Bot settings saved successfully.', 'success')
+        # Save settings; invalid values keep their previous setting
+        errors = save_bot_settings(settings)
+        if errors:
+            flash('Some settings were invalid and were not changed: ' +
+                  ', '.join(f'{key} ({reason})' for key, reason in errors.items()), 'warning')
+        else:
+            flash('Bot settings saved successfully.', 'success')
         return redirect(url_for('bot.bot_settings'))
     
     # Display settings form
@@ -368,8 +280,6 @@ def bot_settings():
         # Use default categories if db query fails
         for cat in DEFAULT_SETTINGS['categories']:
             categories.append({'id': cat, 'name': cat.capitalize()})
-    finally:
-        conn.close()
     
     return render_template('bot_settings.html', settings=settings, categories=categories)
 
@@ -385,6 +295,8 @@ def view_bot_logs():
     log_type = request.args.get('log_type', 'bot')
     page = int(request.args.get('page', 1))
     level = request.args.get('level', 'all')
+    run_id = request.args.get('run') or None
+    asin = request.args.get('asin') or None
     
     # Make sure log_type is valid
     if log_type not in LOG_FILES:
@@ -392,7 +304,7 @@ def view_bot_logs():
     
     # Parse logs
     log_entries, info_count, warning_count, error_count, total_entries, total_pages = parse_log_file(
-        LOG_FILES[log_type], page, level
+        LOG_FILES[log_type], page, level, run_id=run_id, asin=asin
     )
     
     return render_template('bot_logs.html', 
@@ -400,6 +312,9 @@ def view_bot_logs():
                           log_type=log_type,
                           page=page,
                           level=level,
+                          run_id=run_id,
+                          asin=asin,
+                          recent_runs=recent_run_ids(LOG_FILES[log_type]),
                           info_count=info_count,
                           warning_count=warning_count,
                           error_count=error_count,
@@ -414,16 +329,36 @@ def run_bot():
         return redirect(url_for('home'))
     
     try:
-        # Run the bot in the background
-        subprocess.Popen(['python', 'amazon_bot_direct.py'], 
-                        stdout=subprocess.PIPE, 
-                        stderr=subprocess.PIPE)
-        flash('Bot has been started. Check logs for results.', 'success')
+        # Run the bot on a background thread of this process (see bot_jobs.py)
+        if bot_job_runner.start():
+            flash('Bot has been started. Progress is shown below.', 'success')
+        else:
+            flash('The bot is already running.', 'warning')
     except Exception as e:
         flash(f'Error starting bot: {str(e)}', 'danger')
     
     return redirect(url_for('bot.bot_interface'))
 
+@bot_bp.route('/bot/job')
+@login_required
+def bot_job_status():
+    """Progress of the current manual run; waits up to `wait` seconds for new events after `since`"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'forbidden'}), 403
+    
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), BOT_JOB_MAX_WAIT)
+    return jsonify(bot_job_runner.snapshot(since=since, wait=wait))
+
+@bot_bp.route('/bot/job/cancel', methods=['POST'])
+@login_required
+def cancel_bot_job():
+    """Cancel the current manual run"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'forbidden'}), 403
+    
+    return jsonify({'cancelled': bot_job_runner.cancel()})
+
 @bot_bp.route('/bot/download-logs')
 @login_required
 def download_logs():
@@ -439,8 +374,9 @@ def download_logs():
     memory_file = BytesIO()
     with zipfile.ZipFile(memory_file, 'w') as zf:
         for log_name, log_path in LOG_FILES.items():
-            if os.path.exists(log_path):
-                zf.write(log_path, os.path.basename(log_path))
+            # Include rotated backups (.1, .2, ...) along with the live file
+            for file_path in log_files(log_path):
+                zf.write(file_path, os.path.basename(file_path))
     
     memory_file.seek(0)
     return send_file(
@@ -464,6 +400,8 @@ def clear_logs():
             try:
                 with open(log_path, 'w') as f:
                     f.write('')
+                for backup_path in log_files(log_path)[:-1]:
+                    os.remove(backup_path)
             except Exception as e:
                 flash(f'Error clearing {log_name} log: {str(e)}', 'danger')
     
@@ -0,0 +1,134 @@
+"""
+Per-run metrics for the Amazon bot
+
+Each bot run writes one row to bot_runs: when it started and finished,
+how many pages it checked, candidates it found and skipped, products it
+added, errors it logged and the average discount of what it added. The
+admin page reads its numbers from this table with a few small indexed
+queries instead of scanning the log file.
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+RUNS_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS bot_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT NOT NULL,
+        finished_at TEXT,
+        status TEXT NOT NULL DEFAULT 'running',
+        pages_checked INTEGER NOT NULL DEFAULT 0,
+        candidates INTEGER NOT NULL DEFAULT 0,
+        skipped INTEGER NOT NULL DEFAULT 0,
+        added INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        avg_discount REAL,
+        last_error TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_bot_runs_started_at ON bot_runs(started_at)',
+]
+
+def ensure_runs_table(conn):
+    for statement in RUNS_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+class BotRun(logging.Handler):
+    """
+    Collects one run's metrics.
+
+    Attached to the bot's logger while the run lasts, so every ERROR record
+    is counted and the last one kept. Counters are safe to bump from the
+    pipeline's worker threads; on_change(key, counts) is called after each
+    change so a caller can follow progress.
+    """
+
+    def __init__(self, on_change=None):
+        super().__init__(level=logging.ERROR)
+        self.on_change = on_change
+        self.started_at = datetime.utcnow()
+        self.counts = {'pages_checked': 0, 'candidates': 0, 'skipped': 0, 'added': 0, 'errors': 0}
+        self.discounts = []
+        self.last_error = None
+        self._counts_lock = threading.Lock()
+
+    def add(self, key, amount=1):
+        with self._counts_lock:
+            self.counts[key] = self.counts.get(key, 0) + amount
+            counts = dict(self.counts)
+        if self.on_change:
+            try:
+                self.on_change(key, counts)
+            except Exception as e:
+                print(f"Error reporting bot progress: {str(e)}")
+
+    def add_discount(self, discount_percent):
+        if discount_percent is not None:
+            with self._counts_lock:
+                self.discounts.append(discount_percent)
+
+    def emit(self, record):
+        self.add('errors')
+        self.last_error = record.getMessage()[:500]
+
+    @property
+    def avg_discount(self):
+        return round(sum(self.discounts) / len(self.discounts), 1) if self.discounts else None
+
+def start_run(conn, run):
+    """Insert the run's row; returns its id"""
+    ensure_runs_table(conn)
+    cursor = conn.execute("INSERT INTO bot_runs (started_at, status) VALUES (?, 'running')",
+                          (run.started_at.isoformat(),))
+    conn.commit()
+    return cursor.lastrowid
+
+def finish_run(conn, run_id, run, status='success'):
+    """Store the run's final metrics"""
+    conn.execute('''
+        UPDATE bot_runs
+        SET finished_at = ?, status = ?, pages_checked = ?, candidates = ?, skipped = ?,
+            added = ?, errors = ?, avg_discount = ?, last_error = ?
+        WHERE id = ?
+    ''', (
+        datetime.utcnow().isoformat(), status, run.counts['pages_checked'], run.counts['candidates'],
+        run.counts['skipped'], run.counts['added'], run.counts['errors'], run.avg_discount,
+        run.last_error, run_id
+    ))
+    conn.commit()
+
+def get_run_summary(conn):
+    """
+    Aggregated numbers for the admin page
+
+    Returns:
+        Dict with the last run, totals across runs, the average discount of
+        added products and the most recent error (None values when there are no runs)
+    """
+    ensure_runs_table(conn)
+    last_run = conn.execute(
+        'SELECT started_at, finished_at, status FROM bot_runs ORDER BY started_at DESC LIMIT 1'
+    ).fetchone()
+    totals = conn.execute('''
+        SELECT COALESCE(SUM(pages_checked), 0) AS pages_checked,
+               COALESCE(SUM(candidates), 0) AS candidates,
+               COALESCE(SUM(added), 0) AS added,
+               SUM(avg_discount * added) / NULLIF(SUM(CASE WHEN avg_discount IS NOT NULL THEN added END), 0)
+                   AS avg_discount
+        FROM bot_runs
+    ''').fetchone()
+    last_error = conn.execute('''
+        SELECT last_error FROM bot_runs
+        WHERE last_error IS NOT NULL
+        ORDER BY started_at DESC LIMIT 1
+    ''').fetchone()
+    return {
+        'last_run': last_run['started_at'] if last_run else None,
+        'last_status': last_run['status'] if last_run else None,
+        'pages_checked': totals['pages_checked'],
+        'candidates': totals['candidates'],
+        'added': totals['added'],
+        'avg_discount': totals['avg_discount'],
+        'last_error': last_error['last_error'] if last_error else None,
+    }
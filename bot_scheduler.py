@@ -12,23 +12,11 @@ import os
 import sys
 import schedule
 from datetime import datetime, timedelta
-from logging.handlers import RotatingFileHandler
 
-# Configure logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
+from bot_logging import setup_bot_logger
 
-logger = logging.getLogger('bot_scheduler')
-logger.setLevel(logging.INFO)
-
-file_handler = RotatingFileHandler('logs/bot_scheduler.log', maxBytes=10240, backupCount=5)
-file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(file_handler)
-
-stream_handler = logging.StreamHandler(sys.stdout)
-stream_handler.setLevel(logging.INFO)
-stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(stream_handler)
+# Configure logging: JSON lines to a rotating file, written off-thread (see bot_logging.py)
+logger = setup_bot_logger('bot_scheduler', 'logs/bot_scheduler.log')
 
 def run_scheduled_task():
     """Run the Amazon bot task"""
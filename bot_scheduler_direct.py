@@ -2,8 +2,10 @@
 """
 Amazon Bot Scheduler (Direct Version)
 
-This script schedules the Amazon bot to run daily at a specific time.
-It uses a simple loop with sleep to perform the scheduling.
+This script schedules the Amazon bot to run daily at the run_time from
+the bot settings. It uses a simple loop with sleep to perform the
+scheduling; settings changes (run time, enabled) are picked up on the
+next pass of the loop without restarting the scheduler.
 """
 
 import time
@@ -13,23 +15,12 @@ import os
 import sys
 import schedule
 from datetime import datetime, timedelta
-from logging.handlers import RotatingFileHandler
 
-# Configure logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
+from bot_logging import setup_bot_logger
+from bot_config import config as bot_config
 
-logger = logging.getLogger('bot_scheduler')
-logger.setLevel(logging.INFO)
-
-file_handler = RotatingFileHandler('logs/bot_scheduler.log', maxBytes=10240, backupCount=5)
-file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(file_handler)
-
-stream_handler = logging.StreamHandler(sys.stdout)
-stream_handler.setLevel(logging.INFO)
-stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
-logger.addHandler(stream_handler)
+# Configure logging: JSON lines to a rotating file, written off-thread (see bot_logging.py)
+logger = setup_bot_logger('bot_scheduler', 'logs/bot_scheduler.log')
 
 def run_scheduled_task():
     """Run the Amazon bot task"""
@@ -42,18 +33,31 @@ def run_scheduled_task():
         logger.error(f"Error during scheduled bot run: {str(e)}")
         traceback.print_exc()
 
+def apply_schedule(settings):
+    """(Re)schedule the daily run from the bot settings"""
+    schedule.clear('amazon_bot')
+    if settings['enabled']:
+        schedule.every().day.at(settings['run_time']).do(run_scheduled_task).tag('amazon_bot')
+        logger.info(f"Amazon bot scheduled daily at {settings['run_time']}")
+    else:
+        logger.info("Amazon bot is disabled in the bot settings; nothing scheduled")
+
 def run_scheduler():
     """Run the scheduler in an infinite loop"""
     logger.info("Starting Amazon bot scheduler")
     
-    # Schedule the bot to run daily at 09:00 AM
-    schedule.every().day.at("09:00").do(run_scheduled_task)
+    # Schedule the bot at the configured time, and again whenever the settings change
+    bot_config.subscribe(apply_schedule)
     
     # Also run immediately on startup for testing
-    run_scheduled_task()
+    if bot_config.get()['enabled']:
+        run_scheduled_task()
     
     while True:
         try:
+            # Reloads bot_config.json if it changed, which reschedules via apply_schedule
+            bot_config.get()
+            
             # Check if any scheduled tasks need to run
             schedule.run_pending()
             
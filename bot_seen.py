@@ -0,0 +1,161 @@
+"""
+Seen-ASIN memory for the Amazon bots
+
+Every candidate the bot looks at is recorded by ASIN with its outcome
+(added, already tracked, no discount, fetch failed) and an expiry that
+depends on the outcome. Discovery skips ASINs that are still remembered,
+so tracked or recently rejected products are not fetched again.
+
+The set lives in a small SQLite table. Up to BOT_SEEN_BLOOM_THRESHOLD
+ASINs are held in memory as a plain set; above that a Bloom filter
+answers "definitely new" without touching the database and only possible
+hits are confirmed with a lookup.
+"""
+
+import os
+import re
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+
+from bot_db import connect
+
+# Hours an ASIN is remembered, per outcome
+SEEN_TTL_HOURS = {
+    'added': float(os.environ.get('BOT_SEEN_ADDED_TTL_HOURS', 30 * 24)),
+    'tracked': float(os.environ.get('BOT_SEEN_TRACKED_TTL_HOURS', 30 * 24)),
+    'no_discount': float(os.environ.get('BOT_SEEN_REJECTED_TTL_HOURS', 72)),
+    'fetch_failed': float(os.environ.get('BOT_SEEN_FAILED_TTL_HOURS', 6)),
+}
+BOT_SEEN_BLOOM_THRESHOLD = int(os.environ.get('BOT_SEEN_BLOOM_THRESHOLD', 50000))
+BOT_SEEN_BLOOM_ERROR_RATE = float(os.environ.get('BOT_SEEN_BLOOM_ERROR_RATE', 0.01))
+
+SEEN_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS bot_seen_asin (
+        asin TEXT PRIMARY KEY,
+        outcome TEXT NOT NULL,
+        seen_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_bot_seen_asin_expires_at ON bot_seen_asin(expires_at)',
+]
+
+_ASIN_RE = re.compile(r'/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?]|$)', re.IGNORECASE)
+
+def asin_from_url(url):
+    """The product's ASIN, or the URL itself if it has none"""
+    match = _ASIN_RE.search(url or '')
+    return match.group(1).upper() if match else url
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)"""
+
+    def __init__(self, capacity, error_rate=BOT_SEEN_BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class SeenAsins:
+    """
+    Persistent seen-set for one bot run.
+
+    is_known() is safe to call from the discovery thread and mark() from the
+    fetch workers; marks are buffered and written by flush().
+    """
+
+    def __init__(self, db_path, bloom_threshold=BOT_SEEN_BLOOM_THRESHOLD):
+        # Shared by the discovery and worker threads under self._lock
+        self.conn = connect(db_path, check_same_thread=False)
+        self.bloom_threshold = bloom_threshold
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._known = None
+        self._bloom = None
+        for statement in SEEN_SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def load(self, now=None):
+        """Forget expired ASINs and index the rest in memory; returns how many are remembered"""
+        now = now or time.time()
+        with self._lock:
+            self.conn.execute('DELETE FROM bot_seen_asin WHERE expires_at <= ?', (now,))
+            self.conn.commit()
+            count = self.conn.execute('SELECT COUNT(*) FROM bot_seen_asin').fetchone()[0]
+            rows = self.conn.execute('SELECT asin FROM bot_seen_asin')
+            if count <= self.bloom_threshold:
+                self._known = {asin for (asin,) in rows}
+                self._bloom = None
+            else:
+                # Leave headroom for this run's additions
+                self._bloom = BloomFilter(count * 2)
+                self._known = None
+                for (asin,) in rows:
+                    self._bloom.add(asin)
+        return count
+
+    def is_known(self, url_or_asin, now=None):
+        """True if the ASIN was seen and has not expired"""
+        asin = asin_from_url(url_or_asin)
+        with self._lock:
+            if asin in self._pending:
+                return True
+            if self._known is not None:
+                return asin in self._known
+            if self._bloom is not None and asin not in self._bloom:
+                return False
+            row = self.conn.execute(
+                'SELECT 1 FROM bot_seen_asin WHERE asin = ? AND expires_at > ?', (asin, now or time.time())
+            ).fetchone()
+            return row is not None
+
+    def mark(self, url_or_asin, outcome, now=None):
+        """Remember an ASIN with its outcome until that outcome's TTL runs out"""
+        asin = asin_from_url(url_or_asin)
+        now = now or time.time()
+        expires_at = now + SEEN_TTL_HOURS.get(outcome, SEEN_TTL_HOURS['fetch_failed']) * 3600
+        with self._lock:
+            self._pending[asin] = (outcome, now, expires_at)
+            if self._known is not None:
+                self._known.add(asin)
+            if self._bloom is not None:
+                self._bloom.add(asin)
+
+    def flush(self):
+        """Write buffered marks in one transaction; returns how many were written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO bot_seen_asin (asin, outcome, seen_at, expires_at) VALUES (?, ?, ?, ?)',
+                    [(asin,) + values for asin, values in pending.items()]
+                )
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error saving seen ASINs: {str(e)}")
+                self._pending = dict(pending, **self._pending)
+                return 0
+            return len(pending)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
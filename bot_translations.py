@@ -4,6 +4,10 @@ BOT_TRANSLATIONS = {
         'amazon_bot_title': 'Amazon Bot Control Panel',
         'amazon_bot_description': 'Use this panel to manage your automated Amazon product hunter bot. The bot finds the best deals on Amazon.sa and adds them to your tracking system.',
         'run_bot_now': 'Run Bot Now',
+        'bot_job_progress': 'Current run',
+        'cancel_bot_run': 'Cancel',
+        'bot_job_added': 'Products Added',
+        'bot_job_errors': 'Errors',
         'bot_settings': 'Bot Settings',
         'view_logs': 'View Logs',
         'bot_status': 'Bot Status',
@@ -67,6 +71,10 @@ BOT_TRANSLATIONS = {
         'scheduler_log': 'Scheduler Log',
         'filter_by_level': 'Filter by Level',
         'all_levels': 'All Levels',
+        'filter_by_run': 'Run',
+        'all_runs': 'All Runs',
+        'filter_by_asin': 'ASIN',
+        'apply_filters': 'Filter',
         'no_logs_found': 'No log entries found.',
         'refresh': 'Refresh',
         'confirm_clear_logs': 'Are you sure you want to clear all logs? This cannot be undone.'
@@ -76,6 +84,10 @@ BOT_TRANSLATIONS = {
         'amazon_bot_title': 'لوحة تحكم روبوت أمازون',
         'amazon_bot_description': 'استخدم هذه اللوحة لإدارة روبوت البحث التلقائي عن منتجات أمازون. يقوم الروبوت بالعثور على أفضل العروض على موقع أمازون السعودية وإضافتها إلى نظام التتبع الخاص بك.',
         'run_bot_now': 'تشغيل الروبوت الآن',
+        'bot_job_progress': 'التشغيل الحالي',
+        'cancel_bot_run': 'إلغاء',
+        'bot_job_added': 'المنتجات المضافة',
+        'bot_job_errors': 'الأخطاء',
         'bot_settings': 'إعدادات الروبوت',
         'view_logs': 'عرض السجلات',
         'bot_status': 'حالة الروبوت',
@@ -139,6 +151,10 @@ BOT_TRANSLATIONS = {
         'scheduler_log': 'سجل المجدول',
         'filter_by_level': 'تصفية حسب المستوى',
         'all_levels': 'جميع المستويات',
+        'filter_by_run': 'التشغيل',
+        'all_runs': 'جميع مرات التشغيل',
+        'filter_by_asin': 'رمز ASIN',
+        'apply_filters': 'تصفية',
         'no_logs_found': 'لم يتم العثور على أي سجلات.',
         'refresh': 'تحديث',
         'confirm_clear_logs': 'هل أنت متأكد أنك تريد مسح جميع السجلات؟ لا يمكن التراجع عن هذا الإجراء.'
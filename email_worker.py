@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Email outbox worker
+
+Drains the email_outbox table over one reused SMTP connection. Run it as a
+separate process when the in-process sender threads are disabled with
+EMAIL_WORKER_IN_PROCESS=false, or with --once from a cron job.
+
+Usage:
+    python email_worker.py [--once] [--batch-size 50]
+"""
+
+import os
+import sys
+import argparse
+import traceback
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# This process is the sender; do not also start the in-process thread
+os.environ['EMAIL_WORKER_IN_PROCESS'] = 'false'
+
+def main():
+    from app import app, db
+    from app.outbox import OutboxSender, OUTBOX_BATCH_SIZE, queue_depth
+
+    parser = argparse.ArgumentParser(description='Deliver queued outbox emails')
+    parser.add_argument('--once', action='store_true', help='Drain the due messages and exit')
+    parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help='Messages claimed per batch')
+    args = parser.parse_args()
+
+    sender = OutboxSender()
+    try:
+        if not args.once:
+            print("Email outbox worker started")
+            sender.run_forever(batch_size=args.batch_size)
+            return 0
+
+        total_sent = total_claimed = 0
+        with app.app_context():
+            while True:
+                sent, claimed = sender.process_batch(args.batch_size)
+                total_sent += sent
+                total_claimed += claimed
+                if not claimed:
+                    break
+            depth = queue_depth()
+        print(f"Sent {total_sent} of {total_claimed} claimed emails; {depth} still queued")
+        return 0
+    except Exception as e:
+        print(f"Email outbox worker failed: {str(e)}")
+        traceback.print_exc()
+        return 1
+    finally:
+        sender.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Offset index for the bot log viewer
+
+LogIndex keeps, for one log file, the byte offset of every entry plus
+compact side indexes (entry numbers by level, run id and ASIN) and
+running level counts. Appends are indexed incrementally from where the
+last scan stopped; a file that shrank (was cleared) is re-indexed from
+the start. Indexes are cached by inode, so when a log rotates the
+renamed backups keep their index and only the new file is scanned.
+
+page_logs() serves pages across the current file and its backups from
+the tail by seeking straight to the selected entries, so a page costs
+the same however large the logs grow.
+
+Both the JSON-lines format written by bot_logging and the older
+"timestamp LEVEL: message" text lines are understood.
+"""
+
+import os
+import re
+import json
+import threading
+from array import array
+
+ENTRY_RE = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) (\w+): (.+)')
+_LEVEL_RE = re.compile(rb'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} (\w+): .')
+
+def parse_entry(line):
+    """Display dict for one log line, or None if it is not an entry"""
+    line = line.rstrip('\n')
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or 'level' not in record:
+            return None
+        message = record.get('message', '')
+        if record.get('exc'):
+            message = f"{message}\n{record['exc']}"
+        return {
+            'timestamp': record.get('ts', ''),
+            'level': record['level'],
+            'message': message,
+            'run_id': record.get('run_id'),
+            'stage': record.get('stage'),
+            'asin': record.get('asin'),
+            'outcome': record.get('outcome'),
+            'latency_ms': record.get('latency_ms'),
+        }
+    match = ENTRY_RE.match(line)
+    if match:
+        timestamp, log_level, message = match.groups()
+        return {'timestamp': timestamp, 'level': log_level, 'message': message}
+    return None
+
+def _index_fields(line):
+    """(level, run_id, asin) for indexing a raw line, or None if it is not an entry"""
+    if line.startswith(b'{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or 'level' not in record:
+            return None
+        run_id = record.get('run_id')
+        return str(record['level']).upper(), None if run_id is None else str(run_id), record.get('asin')
+    match = _LEVEL_RE.match(line)
+    if match:
+        return match.group(1).decode('ascii', 'replace').upper(), None, None
+    return None
+
+class LogIndex:
+    """Line-offset index over one log file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._reset()
+
+    def _reset(self):
+        self.indexed_size = 0
+        self.mtime = None
+        self.offsets = array('q')   # byte offset of each entry
+        self.counts = {}            # level -> entries seen
+        # value -> array of entry numbers, per filterable field
+        self.side = {'level': {}, 'run_id': {}, 'asin': {}}
+
+    def refresh(self):
+        """Bring the index up to date with the file; cheap when nothing changed"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._reset()
+            return False
+        if st.st_size < self.indexed_size:
+            self._reset()
+        if st.st_size == self.indexed_size and st.st_mtime == self.mtime:
+            return True
+        self._scan(st.st_size)
+        self.mtime = st.st_mtime
+        return True
+
+    def _scan(self, size):
+        with open(self.path, 'rb') as f:
+            f.seek(self.indexed_size)
+            position = self.indexed_size
+            while position < size:
+                line = f.readline()
+                # Leave a half-written last line for the next refresh
+                if not line.endswith(b'\n'):
+                    break
+                fields = _index_fields(line)
+                if fields:
+                    number = len(self.offsets)
+                    self.offsets.append(position)
+                    for name, value in zip(('level', 'run_id', 'asin'), fields):
+                        if value is not None:
+                            self.side[name].setdefault(value, array('L')).append(number)
+                    self.counts[fields[0]] = self.counts.get(fields[0], 0) + 1
+                position += len(line)
+            self.indexed_size = position
+
+    def matches(self, filters):
+        """Entry numbers matching every filter ({field: value}), oldest first"""
+        if not filters:
+            return range(len(self.offsets))
+        lists = [self.side[name].get(value, array('L')) for name, value in filters.items()]
+        lists.sort(key=len)
+        if len(lists) == 1:
+            return lists[0]
+        others = [set(other) for other in lists[1:]]
+        return [number for number in lists[0] if all(number in other for other in others)]
+
+    def read(self, entry_numbers):
+        entries = []
+        with open(self.path, 'rb') as f:
+            for number in entry_numbers:
+                f.seek(self.offsets[number])
+                entry = parse_entry(f.readline().decode('utf-8', 'replace'))
+                if entry:
+                    entries.append(entry)
+        return entries
+
+_indexes = {}   # (st_dev, st_ino) -> LogIndex
+_lock = threading.Lock()
+
+def log_files(path):
+    """Existing files of a rotating log, oldest backup first and the live file last"""
+    files = []
+    number = 1
+    while os.path.exists(f"{path}.{number}"):
+        files.insert(0, f"{path}.{number}")
+        number += 1
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+def _file_indexes(path):
+    indexes = []
+    for file_path in log_files(path):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            continue
+        key = (st.st_dev, st.st_ino)
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LogIndex(file_path)
+        # A rotated file keeps its inode (and its index) under a new name
+        index.path = file_path
+        if index.refresh():
+            indexes.append((key, index))
+    return indexes
+
+def page_logs(path, page=1, level='all', run_id=None, asin=None, per_page=100):
+    """
+    One page of entries from a log and its backups, newest page first (page 1 is the tail).
+
+    Returns:
+        (entries, info_count, warning_count, error_count, total_entries, total_pages)
+    """
+    filters = {}
+    if level and level != 'all':
+        filters['level'] = level.upper()
+    if run_id:
+        filters['run_id'] = str(run_id)
+    if asin:
+        filters['asin'] = asin.strip().upper()
+
+    with _lock:
+        indexes = _file_indexes(path)
+        # Forget indexes of files that rotated away
+        live = {key for key, _ in indexes}
+        for key in [key for key in _indexes if key not in live and _indexes[key].path.startswith(path)]:
+            del _indexes[key]
+
+        selected = [(index, index.matches(filters)) for _, index in indexes]
+        total = sum(len(numbers) for _, numbers in selected)
+        counts = {}
+        for index, _ in selected:
+            for log_level, count in index.counts.items():
+                counts[log_level] = counts.get(log_level, 0) + count
+
+        total_pages = max(1, (total + per_page - 1) // per_page)
+        page = max(1, min(page, total_pages))
+        end = total - (page - 1) * per_page
+        start = max(0, end - per_page)
+
+        # Walk the files oldest first, reading only the slice that falls on this page
+        entries = []
+        offset = 0
+        for index, numbers in selected:
+            lo, hi = max(start - offset, 0), min(end - offset, len(numbers))
+            if lo < hi:
+                entries.extend(index.read(numbers[lo:hi]))
+            offset += len(numbers)
+
+        return (entries, counts.get('INFO', 0), counts.get('WARNING', 0),
+                counts.get('ERROR', 0), total, total_pages)
+
+def recent_run_ids(path, limit=20):
+    """Run ids seen in a log and its backups, newest first"""
+    with _lock:
+        runs = []
+        for _, index in reversed(_file_indexes(path)):
+            latest = sorted(index.side['run_id'].items(), key=lambda item: item[1][-1], reverse=True)
+            runs.extend(run for run, _ in latest if run not in runs)
+        return runs[:limit]
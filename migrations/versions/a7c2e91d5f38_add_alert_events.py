@@ -0,0 +1,48 @@
+"""Add alert_events table for per-user alert digests
+
+Revision ID: a7c2e91d5f38
+Revises: f19b3d7a2c60
+Create Date: 2026-10-19 15:40:12.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e91d5f38'
+down_revision = 'f19b3d7a2c60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app runs db.create_all() on import, before flask db upgrade gets here
+    if sa.inspect(op.get_bind()).has_table('alert_events'):
+        return
+    op.create_table('alert_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.Column('product_name', sa.String(length=255), nullable=False),
+        sa.Column('product_url', sa.String(length=1024), nullable=True),
+        sa.Column('old_price', sa.Float(), nullable=False),
+        sa.Column('new_price', sa.Float(), nullable=False),
+        sa.Column('target_price', sa.Float(), nullable=True),
+        sa.Column('event_type', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('digest_id', sa.String(length=32), nullable=True),
+        sa.Column('digested_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('alert_events', schema=None) as batch_op:
+        batch_op.create_index('ix_alert_events_pending', ['digest_id', 'user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('alert_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_alert_events_pending')
+
+    op.drop_table('alert_events')
@@ -0,0 +1,42 @@
+"""Add notification_archive table for the notification retention job
+
+Revision ID: b2d7e5c19a64
+Revises: e6b2f9a41c73
+Create Date: 2026-10-19 16:40:27.104518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d7e5c19a64'
+down_revision = 'e6b2f9a41c73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app runs db.create_all() on import, before flask db upgrade gets here
+    if sa.inspect(op.get_bind()).has_table('notification_archive'):
+        return
+    op.create_table('notification_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.Column('notification_type', sa.String(length=50), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_archive_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_archive_user_id'))
+
+    op.drop_table('notification_archive')
@@ -0,0 +1,32 @@
+"""Add alert_events indexes for the notification policy
+
+Revision ID: b5d8f3a61e27
+Revises: a7c2e91d5f38
+Create Date: 2026-10-19 16:52:37.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d8f3a61e27'
+down_revision = 'a7c2e91d5f38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() on app import may have built alert_events with these indexes already
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('alert_events')}
+    with op.batch_alter_table('alert_events', schema=None) as batch_op:
+        if 'ix_alert_events_user_product_created_at' not in existing:
+            batch_op.create_index('ix_alert_events_user_product_created_at', ['user_id', 'product_id', 'created_at'], unique=False)
+        if 'ix_alert_events_user_created_at' not in existing:
+            batch_op.create_index('ix_alert_events_user_created_at', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('alert_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_alert_events_user_created_at')
+        batch_op.drop_index('ix_alert_events_user_product_created_at')
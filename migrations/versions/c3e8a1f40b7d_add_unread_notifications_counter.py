@@ -0,0 +1,34 @@
+"""Add unread_notifications counter to User model
+
+Revision ID: c3e8a1f40b7d
+Revises: 552961c7e03a
+Create Date: 2026-10-19 10:12:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a1f40b7d'
+down_revision = '552961c7e03a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the existing notification rows; NULL read counts as unread, as in the listeners
+    op.execute("""
+        UPDATE users SET unread_notifications = (
+            SELECT COUNT(*) FROM notifications
+            WHERE notifications.user_id = users.id AND COALESCE(notifications.read, false) = false
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
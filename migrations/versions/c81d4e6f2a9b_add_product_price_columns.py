@@ -0,0 +1,82 @@
+"""Add materialized initial/lowest price and discount columns to products
+
+Revision ID: c81d4e6f2a9b
+Revises: b5d8f3a61e27
+Create Date: 2026-10-19 17:41:06.382915
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81d4e6f2a9b'
+down_revision = 'b5d8f3a61e27'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+
+def _price_columns(price, price_history):
+    """Same values Product.refresh_price_columns computes for a new row"""
+    prices = []
+    try:
+        history = json.loads(price_history) if price_history else []
+    except ValueError:
+        history = []
+    for point in history if isinstance(history, list) else []:
+        try:
+            prices.append(float(point['price']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    prices = [value for value in prices if value > 0]
+    current = price if price is not None else (prices[-1] if prices else None)
+    if current is not None:
+        prices.append(current)
+    if not prices:
+        return None
+    initial = prices[0]
+    discount = round((initial - current) * 100 / initial, 1) if current is not None and initial > current else 0.0
+    return {'initial_price': initial, 'lowest_price': min(prices), 'discount_pct': discount}
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('initial_price', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('lowest_price', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('discount_pct', sa.Float(), nullable=True))
+        batch_op.create_index('ix_products_user_discount_pct', ['user_id', 'discount_pct'], unique=False)
+
+    # Backfill from the stored price histories, a batch of rows at a time
+    conn = op.get_bind()
+    products = sa.table('products',
+                        sa.column('id', sa.Integer),
+                        sa.column('price', sa.Float),
+                        sa.column('price_history', sa.Text),
+                        sa.column('initial_price', sa.Float),
+                        sa.column('lowest_price', sa.Float),
+                        sa.column('discount_pct', sa.Float))
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.select(products.c.id, products.c.price, products.c.price_history)
+                            .where(products.c.id > last_id)
+                            .order_by(products.c.id)
+                            .limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        for product_id, price, price_history in rows:
+            values = _price_columns(price, price_history)
+            if values:
+                conn.execute(products.update().where(products.c.id == product_id).values(**values))
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_user_discount_pct')
+        batch_op.drop_column('discount_pct')
+        batch_op.drop_column('lowest_price')
+        batch_op.drop_column('initial_price')
@@ -0,0 +1,51 @@
+"""Add composite and unique indexes for hot queries
+
+Revision ID: d71f2b9c4e05
+Revises: c3e8a1f40b7d
+Create Date: 2026-10-19 11:40:03.517290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd71f2b9c4e05'
+down_revision = 'c3e8a1f40b7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A reset token shared by several users can't identify any of them; clear it
+    # (they can request a new link) so the unique index can be built
+    op.execute(
+        "UPDATE users SET reset_token = NULL, reset_token_expiry = NULL "
+        "WHERE reset_token IN (SELECT reset_token FROM users WHERE reset_token IS NOT NULL "
+        "GROUP BY reset_token HAVING COUNT(*) > 1)"
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('uq_users_reset_token', ['reset_token'], unique=True)
+
+    # Not unique: existing databases may already hold duplicate products, and
+    # add_product checks for one before inserting
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_user_url', ['user_id', 'url'], unique=False)
+        batch_op.create_index('ix_products_user_created_at', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_user_read_created_at', ['user_id', 'read', 'created_at'], unique=False)
+        batch_op.create_index('ix_notifications_user_created_at_id', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_created_at_id')
+        batch_op.drop_index('ix_notifications_user_read_created_at')
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_user_created_at')
+        batch_op.drop_index('ix_products_user_url')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('uq_users_reset_token')
@@ -0,0 +1,65 @@
+"""Store verification tokens as indexed hashes
+
+Revision ID: e4a90c2d6b13
+Revises: d71f2b9c4e05
+Create Date: 2026-10-19 13:05:27.640918
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a90c2d6b13'
+down_revision = 'd71f2b9c4e05'
+branch_labels = None
+depends_on = None
+
+PREFIX_LENGTH = 20
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('verification_token_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('verification_token_prefix_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('uq_users_verification_token_hash', ['verification_token_hash'], unique=True)
+        batch_op.create_index('ix_users_verification_token_prefix_hash', ['verification_token_prefix_hash'], unique=False)
+
+    # A token shared by several users can't be hashed into the unique column;
+    # clear it (they can request a new link)
+    op.execute(
+        "UPDATE users SET verification_token = NULL "
+        "WHERE verification_token IN (SELECT verification_token FROM users WHERE verification_token IS NOT NULL "
+        "GROUP BY verification_token HAVING COUNT(*) > 1)"
+    )
+
+    # Move outstanding plaintext tokens to their hashes so existing links keep working
+    conn = op.get_bind()
+    users = sa.table('users',
+                     sa.column('id', sa.Integer),
+                     sa.column('verification_token', sa.String),
+                     sa.column('verification_token_hash', sa.String),
+                     sa.column('verification_token_prefix_hash', sa.String))
+    rows = conn.execute(sa.select(users.c.id, users.c.verification_token)
+                        .where(users.c.verification_token.isnot(None))).fetchall()
+    for user_id, token in rows:
+        conn.execute(users.update().where(users.c.id == user_id).values(
+            verification_token=None,
+            verification_token_hash=_hash(token),
+            verification_token_prefix_hash=_hash(token[:PREFIX_LENGTH])
+        ))
+
+
+def downgrade():
+    # Plaintext tokens cannot be recovered from their hashes; users can request a new link
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_verification_token_prefix_hash')
+        batch_op.drop_index('uq_users_verification_token_hash')
+        batch_op.drop_column('verification_token_prefix_hash')
+        batch_op.drop_column('verification_token_hash')
@@ -0,0 +1,26 @@
+"""Add the products index for keyset-paginated dashboard pages
+
+Revision ID: e6b2f9a41c73
+Revises: c81d4e6f2a9b
+Create Date: 2026-10-19 18:24:53.917240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b2f9a41c73'
+down_revision = 'c81d4e6f2a9b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_user_track_created_at', ['user_id', 'track_price', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_user_track_created_at')
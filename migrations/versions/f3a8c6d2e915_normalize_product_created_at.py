@@ -0,0 +1,37 @@
+"""Normalize products.created_at for keyset pagination and make it NOT NULL
+
+Revision ID: f3a8c6d2e915
+Revises: b2d7e5c19a64
+Create Date: 2026-10-19 16:52:14.302877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c6d2e915'
+down_revision = 'b2d7e5c19a64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        # The old func.now() default stored 'YYYY-MM-DD HH:MM:SS' without the
+        # microseconds SQLAlchemy writes, so those rows never equal a cursor
+        # value and /products kept returning the first page
+        op.execute("UPDATE products SET created_at = COALESCE(last_checked, strftime('%Y-%m-%d %H:%M:%f000', 'now')) "
+                   "WHERE created_at IS NULL")
+        op.execute("UPDATE products SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+    else:
+        op.execute("UPDATE products SET created_at = COALESCE(last_checked, CURRENT_TIMESTAMP) WHERE created_at IS NULL")
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
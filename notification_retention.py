@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Notification retention job
+
+Moves read notifications older than a retention window into the
+notification_archive table in small batches. Each batch is copied and
+deleted in one transaction, so a row is only deleted once its archive
+copy is written, and locks are held only briefly. Unread notifications
+are never touched.
+
+Usage:
+    python notification_retention.py [--days 90] [--batch-size 1000] [--dry-run]
+"""
+
+import os
+import sys
+import time
+import argparse
+import traceback
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+DEFAULT_BATCH_SIZE = int(os.environ.get('NOTIFICATION_RETENTION_BATCH_SIZE', 1000))
+
+def archive_row(notification):
+    """Compact archive representation of a notification"""
+    return {
+        'id': notification.id,
+        'user_id': notification.user_id,
+        'product_id': notification.product_id,
+        'notification_type': notification.notification_type,
+        'message': notification.message,
+        'created_at': notification.created_at,
+        'archived_at': datetime.utcnow()
+    }
+
+def prune_notifications(retention_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Archive and delete read notifications older than retention_days.
+
+    Returns:
+        Dict with archived/deleted row counts, batch count and elapsed seconds
+    """
+    if os.environ.get('RENDER') and not os.environ.get('DATABASE_URL'):
+        # The default SQLite file lives on the job's throwaway disk
+        raise RuntimeError("DATABASE_URL is not set; refusing to prune a temporary database")
+
+    from app import app, db
+    from app.models import Notification, NotificationArchive
+
+    started = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    report = {
+        'cutoff': cutoff.isoformat(),
+        'archived': 0,
+        'deleted': 0,
+        'batches': 0,
+        'seconds': 0.0
+    }
+
+    with app.app_context():
+        candidates = Notification.query.filter(
+            Notification.read == True,  # noqa: E712
+            Notification.created_at < cutoff
+        )
+
+        if dry_run:
+            report['archived'] = candidates.count()
+            report['seconds'] = round(time.monotonic() - started, 3)
+            return report
+
+        last_id = 0
+        while True:
+            # Walk by primary key so each batch is an index range scan
+            batch = (candidates
+                     .filter(Notification.id > last_id)
+                     .order_by(Notification.id)
+                     .limit(batch_size)
+                     .all())
+            if not batch:
+                break
+
+            ids = [notification.id for notification in batch]
+            last_id = ids[-1]
+            try:
+                db.session.execute(NotificationArchive.__table__.insert(), [archive_row(n) for n in batch])
+                archived = NotificationArchive.query.filter(NotificationArchive.id.in_(ids)).count()
+                if archived != len(ids):
+                    raise RuntimeError(f"Archived {archived} of {len(ids)} notifications; not deleting this batch")
+                # Read rows do not affect the unread counter, so a bulk delete is safe
+                deleted = Notification.query.filter(Notification.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.expunge_all()
+
+            report['archived'] += archived
+            report['deleted'] += deleted
+            report['batches'] += 1
+
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive and delete old read notifications')
+    parser.add_argument('--days', type=int, default=DEFAULT_RETENTION_DAYS, help='Keep read notifications newer than this many days')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows deleted per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be archived')
+    args = parser.parse_args()
+
+    try:
+        report = prune_notifications(args.days, args.batch_size, args.dry_run)
+        if args.dry_run:
+            print(f"Dry run: {report['archived']} read notifications older than {report['cutoff']} would be archived")
+        else:
+            print(f"Archived {report['archived']} and deleted {report['deleted']} notifications "
+                  f"in {report['batches']} batches ({report['seconds']}s)")
+        return 0
+    except Exception as e:
+        print(f"Notification retention failed: {str(e)}")
+        traceback.print_exc()
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
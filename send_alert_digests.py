@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Alert digest job
+
+Delivers one summary email, notification and push to every user whose
+oldest pending price alert is older than the digest window. Target-price
+hits are delivered as they happen and do not wait for this job.
+
+Usage:
+    python send_alert_digests.py [--window 60]
+"""
+
+import os
+import sys
+import argparse
+import traceback
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# The queued emails are drained below; no background sender in a short-lived job
+os.environ['EMAIL_WORKER_IN_PROCESS'] = 'false'
+
+def main():
+    if os.environ.get('RENDER') and not os.environ.get('DATABASE_URL'):
+        # The default SQLite file lives on the job's throwaway disk and has no pending alerts
+        raise RuntimeError("DATABASE_URL is not set; refusing to send digests from a temporary database")
+
+    from app import app
+    from app.digests import flush_due_digests, ALERT_DIGEST_WINDOW_MINUTES
+    from app.outbox import OutboxSender
+
+    parser = argparse.ArgumentParser(description='Send pending price alert digests')
+    parser.add_argument('--window', type=int, default=ALERT_DIGEST_WINDOW_MINUTES,
+                        help='Minutes a user\'s oldest pending alert waits before its digest is sent')
+    args = parser.parse_args()
+
+    sender = OutboxSender()
+    try:
+        with app.app_context():
+            report = flush_due_digests(args.window)
+            # Deliver the queued digest emails over one SMTP connection
+            while sender.process_batch()[1]:
+                pass
+        print(f"Sent {report['users']} digests covering {report['events']} alerts "
+              f"({report['errors']} errors)")
+        return 1 if report['errors'] else 0
+    except Exception as e:
+        print(f"Alert digest job failed: {str(e)}")
+        traceback.print_exc()
+        return 1
+    finally:
+        sender.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,11 +11,14 @@ CREATE TABLE IF NOT EXISTS public.users (
     reset_token_expiry TIMESTAMP,
     verification_token VARCHAR(100),
     verification_token_expiry TIMESTAMP,
+    verification_token_hash VARCHAR(64),
+    verification_token_prefix_hash VARCHAR(64),
     email_verified BOOLEAN DEFAULT FALSE,
     is_admin BOOLEAN DEFAULT FALSE,
     push_subscription TEXT,
     notifications_enabled BOOLEAN DEFAULT FALSE,
-    device_info TEXT
+    device_info TEXT,
+    unread_notifications INTEGER NOT NULL DEFAULT 0
 );
 
 -- Create products table
@@ -32,7 +35,10 @@ CREATE TABLE IF NOT EXISTS public.products (
     notify_on_any_change BOOLEAN DEFAULT FALSE,
     last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     user_id INTEGER NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    initial_price FLOAT,
+    lowest_price FLOAT,
+    discount_pct FLOAT
 );
 
 -- Create notifications table
@@ -45,7 +51,88 @@ CREATE TABLE IF NOT EXISTS public.notifications (
 );
 
 -- Create indexes for performance
-CREATE INDEX IF NOT EXISTS idx_products_user_id ON public.products(user_id);
-CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON public.notifications(user_id);
-CREATE INDEX IF NOT EXISTS idx_notifications_read ON public.notifications(read);
-CREATE INDEX IF NOT EXISTS idx_products_tracking_enabled ON public.products(tracking_enabled); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_products_tracking_enabled ON public.products(tracking_enabled);
+
+-- Composite and unique indexes for the hot lookups (see test_query_plans.py).
+-- They cover the leading user_id column, so the old single-column
+-- products(user_id), notifications(user_id) and notifications(read) indexes are dropped.
+CREATE INDEX IF NOT EXISTS ix_products_user_url ON public.products(user_id, url);
+CREATE INDEX IF NOT EXISTS ix_products_user_created_at ON public.products(user_id, created_at);
+-- Dashboard pages are keyset-paginated on (created_at, id), which needs a created_at on every row
+UPDATE public.products SET created_at = COALESCE(last_checked, CURRENT_TIMESTAMP) WHERE created_at IS NULL;
+ALTER TABLE public.products ALTER COLUMN created_at SET NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_products_user_tracking_created_at ON public.products(user_id, tracking_enabled, created_at, id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_users_verification_token_hash ON public.users(verification_token_hash);
+CREATE INDEX IF NOT EXISTS ix_users_verification_token_prefix_hash ON public.users(verification_token_prefix_hash);
+UPDATE public.users SET reset_token = NULL, reset_token_expiry = NULL
+WHERE reset_token IN (SELECT reset_token FROM public.users WHERE reset_token IS NOT NULL
+                      GROUP BY reset_token HAVING COUNT(*) > 1);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_users_reset_token ON public.users(reset_token);
+CREATE INDEX IF NOT EXISTS ix_notifications_user_read_created_at ON public.notifications(user_id, read, created_at);
+CREATE INDEX IF NOT EXISTS ix_notifications_user_created_at_id ON public.notifications(user_id, created_at, id);
+DROP INDEX IF EXISTS public.idx_products_user_id;
+DROP INDEX IF EXISTS public.uq_products_user_url;
+-- Verification links are looked up by verification_token_hash
+DROP INDEX IF EXISTS public.uq_users_verification_token;
+DROP INDEX IF EXISTS public.idx_notifications_user_id;
+DROP INDEX IF EXISTS public.idx_notifications_read;
+
+-- Keep users.unread_notifications in step with notification writes, in the same transaction
+CREATE OR REPLACE FUNCTION public.maintain_unread_notifications() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NOT COALESCE(NEW.read, FALSE) THEN
+            UPDATE public.users SET unread_notifications = unread_notifications + 1 WHERE id = NEW.user_id;
+        END IF;
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF COALESCE(OLD.read, FALSE) <> COALESCE(NEW.read, FALSE) THEN
+            UPDATE public.users
+            SET unread_notifications = GREATEST(unread_notifications + CASE WHEN NEW.read THEN -1 ELSE 1 END, 0)
+            WHERE id = NEW.user_id;
+        END IF;
+    ELSIF TG_OP = 'DELETE' THEN
+        IF NOT COALESCE(OLD.read, FALSE) THEN
+            UPDATE public.users SET unread_notifications = GREATEST(unread_notifications - 1, 0) WHERE id = OLD.user_id;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifications_unread_count ON public.notifications;
+CREATE TRIGGER trg_notifications_unread_count
+    AFTER INSERT OR UPDATE OF read OR DELETE ON public.notifications
+    FOR EACH ROW EXECUTE FUNCTION public.maintain_unread_notifications();
+
+-- Keep products.initial_price (first recorded price), lowest_price and
+-- discount_pct (current price below initial_price) in step with price writes
+ALTER TABLE public.products ADD COLUMN IF NOT EXISTS initial_price FLOAT;
+ALTER TABLE public.products ADD COLUMN IF NOT EXISTS lowest_price FLOAT;
+ALTER TABLE public.products ADD COLUMN IF NOT EXISTS discount_pct FLOAT;
+CREATE INDEX IF NOT EXISTS ix_products_user_discount_pct ON public.products(user_id, discount_pct);
+
+CREATE OR REPLACE FUNCTION public.maintain_product_prices() RETURNS TRIGGER AS $$
+DECLARE
+    history_low FLOAT;
+BEGIN
+    IF NEW.initial_price IS NULL THEN
+        NEW.initial_price := COALESCE((NEW.price_history::jsonb -> 0 ->> 'price')::FLOAT, NEW.current_price);
+    END IF;
+    SELECT MIN((point ->> 'price')::FLOAT) INTO history_low
+    FROM jsonb_array_elements(COALESCE(NULLIF(NEW.price_history, ''), '[]')::jsonb) AS point
+    WHERE (point ->> 'price')::FLOAT > 0;
+    NEW.lowest_price := LEAST(NEW.lowest_price, history_low, NEW.current_price);
+    NEW.discount_pct := CASE WHEN NEW.initial_price > NEW.current_price
+                             THEN ROUND(((NEW.initial_price - NEW.current_price) * 100 / NEW.initial_price)::NUMERIC, 1)
+                             ELSE 0 END;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_products_price_columns ON public.products;
+CREATE TRIGGER trg_products_price_columns
+    BEFORE INSERT OR UPDATE OF current_price, price_history ON public.products
+    FOR EACH ROW EXECUTE FUNCTION public.maintain_product_prices();
+
+-- One-off backfill: the trigger fills in rows that don't have the columns yet
+UPDATE public.products SET price_history = price_history WHERE initial_price IS NULL;
@@ -0,0 +1,58 @@
+"""
+Bot pipeline tests: a run that stops early (limit reached or cancelled)
+must still return instead of leaving its fetch workers waiting.
+
+Usage:
+    python -m pytest -q test_bot_pipeline.py
+"""
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot_pipeline import run_pipeline  # noqa: E402
+
+# Simulated product page fetch
+FETCH_DELAY = 0.1
+
+def slow_fetch(candidate):
+    time.sleep(FETCH_DELAY)
+    return candidate
+
+def run_in_thread(**kwargs):
+    """Run the pipeline on a daemon thread so a hang fails the test instead of the suite"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(run_pipeline(**kwargs)), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), 'pipeline did not finish'
+    return result
+
+def test_run_stops_at_limit():
+    written = []
+
+    def write_batch(batch):
+        written.extend(batch)
+        return len(batch)
+
+    stats = run_in_thread(candidates=list(range(10)), validate=slow_fetch, write_batch=write_batch,
+                          limit=2, workers=3, batch_size=1)
+
+    assert stats['written'] == 2
+    assert len(written) == 2
+
+def test_cancelled_run_returns():
+    cancel = threading.Event()
+
+    def cancelling_fetch(candidate):
+        # Discovery has finished and queued its end markers by now
+        cancel.set()
+        return slow_fetch(candidate)
+
+    stats = run_in_thread(candidates=list(range(3)), validate=cancelling_fetch, write_batch=len,
+                          limit=10, workers=3, batch_size=1, cancel=cancel)
+
+    assert stats['written'] == 0
@@ -0,0 +1,161 @@
+"""
+Push dispatcher tests against a local stand-in push service.
+
+A throwaway HTTP server plays the push service: endpoints under /gone/
+answer 410, everything else 201. The tests check that a batch is fanned
+out concurrently, that VAPID headers are signed once per push service and
+reused, and that expired subscriptions are cleared in one bulk update.
+
+Usage:
+    python -m pytest -q test_push_dispatcher.py
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import secrets
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('pywebpush')
+pytest.importorskip('flask_sqlalchemy')
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import ec  # noqa: E402
+from py_vapid import Vapid  # noqa: E402
+
+# Importing the app initializes its own database; keep that out of the repo
+_scratch_dir = tempfile.mkdtemp(prefix='zonar_push_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_scratch_dir, 'app.db')}")
+os.environ['EMAIL_WORKER_IN_PROCESS'] = 'false'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db  # noqa: E402
+from app import push  # noqa: E402
+from app.models import User  # noqa: E402
+
+# Simulated push service latency, so concurrency is visible in wall time
+PUSH_SERVICE_DELAY = 0.05
+
+class StandInPushService(BaseHTTPRequestHandler):
+    requests_seen = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.lock:
+            StandInPushService.requests_seen.append({
+                'path': self.path,
+                'authorization': self.headers.get('Authorization'),
+                'encoding': self.headers.get('Content-Encoding'),
+                'size': len(body)
+            })
+        time.sleep(PUSH_SERVICE_DELAY)
+        self.send_response(410 if self.path.startswith('/gone/') else 201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def make_subscription(base_url, path):
+    """Subscription info with real client keys, as a browser would register"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    public = key.public_key().public_bytes(serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+    return {
+        'endpoint': f'{base_url}{path}',
+        'keys': {'p256dh': _b64(public), 'auth': _b64(secrets.token_bytes(16))}
+    }
+
+def _pywebpush_can_encrypt():
+    """pywebpush 1.14 passes a curve class to cryptography, which newer releases reject"""
+    from pywebpush import WebPusher
+    try:
+        WebPusher(make_subscription('http://127.0.0.1', '/probe')).encode('probe')
+        return True
+    except TypeError:
+        return False
+
+requires_encryption = pytest.mark.skipif(
+    not _pywebpush_can_encrypt(),
+    reason='installed cryptography is incompatible with pywebpush payload encryption'
+)
+
+@pytest.fixture(scope='module')
+def push_service():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInPushService)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+@pytest.fixture
+def dispatcher():
+    vapid = Vapid()
+    vapid.generate_keys()
+    dispatcher = push.PushDispatcher(vapid, pool_size=8, timeout=5)
+    StandInPushService.requests_seen = []
+    yield dispatcher
+    dispatcher.close()
+
+@requires_encryption
+def test_batch_is_sent_concurrently_with_one_vapid_signature(push_service, dispatcher):
+    messages = [(i, make_subscription(push_service, f'/push/{i}'), {'title': 'ZONAR', 'body': f'drop {i}'})
+                for i in range(40)]
+
+    started = time.monotonic()
+    report = dispatcher.send_batch(messages)
+    elapsed = time.monotonic() - started
+
+    assert report == {'sent': 40, 'failed': 0, 'expired': []}
+    assert len(StandInPushService.requests_seen) == 40
+    # 40 sequential sends would take at least 40 * delay
+    assert elapsed < 40 * PUSH_SERVICE_DELAY / 2
+    # One push service audience: every request carries the same signed token
+    assert len({r['authorization'] for r in StandInPushService.requests_seen}) == 1
+    assert all(r['encoding'] == 'aes128gcm' and r['size'] > 0 for r in StandInPushService.requests_seen)
+
+def test_vapid_headers_are_resigned_near_expiry(push_service, dispatcher):
+    endpoint = f'{push_service}/push/1'
+    first = dispatcher.vapid.headers_for(endpoint)
+    assert dispatcher.vapid.headers_for(endpoint) == first
+
+    # Pretend the cached token is inside the refresh margin
+    aud = dispatcher.vapid.audience(endpoint)
+    headers, _ = dispatcher.vapid._headers[aud]
+    dispatcher.vapid._headers[aud] = (headers, int(time.time()) + 60)
+    time.sleep(1)
+    assert dispatcher.vapid.headers_for(endpoint) != first
+
+@requires_encryption
+def test_expired_subscriptions_are_pruned_in_bulk(push_service, dispatcher):
+    with app.app_context():
+        db.create_all()
+        User.query.delete()
+        users = []
+        for i in range(6):
+            path = f'/gone/{i}' if i % 2 else f'/push/{i}'
+            user = User(username=f'push{i}', email=f'push{i}@example.com', password_hash='x',
+                        notifications_enabled=True,
+                        push_subscription=json.dumps(make_subscription(push_service, path)))
+            db.session.add(user)
+            users.append(user)
+        db.session.commit()
+
+        report = push.dispatch(push.build_messages(users, {'title': 'ZONAR', 'body': 'hi'}), dispatcher)
+
+        assert report['sent'] == 3
+        assert sorted(report['expired']) == sorted(u.id for u in users if u.username in ('push1', 'push3', 'push5'))
+        remaining = {u.username: u.push_subscription for u in User.query.order_by(User.id)}
+        assert [name for name, sub in remaining.items() if sub is None] == ['push1', 'push3', 'push5']
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(['-q', __file__]))
@@ -0,0 +1,251 @@
+"""
+Query-plan regression tests for the hot lookups.
+
+Seeds a realistic volume of rows into a throwaway database built from the
+real models, then asserts via EXPLAIN that each hot query is answered from
+an index rather than a full table scan.
+
+Runs against a temporary SQLite file by default. Set QUERY_PLAN_PG_URL to a
+scratch PostgreSQL database to run the same checks there.
+
+Usage:
+    python -m pytest -q test_query_plans.py
+    QUERY_PLAN_PRODUCTS=100000 python test_query_plans.py
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+pytest.importorskip('flask_sqlalchemy')
+
+from sqlalchemy import create_engine, text
+
+# Importing the app initializes its own database; keep that out of the repo
+_scratch_dir = tempfile.mkdtemp(prefix='zonar_plans_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_scratch_dir, 'app.db')}")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import db  # noqa: E402
+from app import models  # noqa: E402,F401  (registers the tables on db.metadata)
+
+NUM_USERS = int(os.environ.get('QUERY_PLAN_USERS', 1000))
+NUM_PRODUCTS = int(os.environ.get('QUERY_PLAN_PRODUCTS', 100000))
+NUM_NOTIFICATIONS = int(os.environ.get('QUERY_PLAN_NOTIFICATIONS', 100000))
+
+# name -> (sql, params); every statement here must be served by an index
+HOT_QUERIES = {
+    'add_product duplicate check': (
+        'SELECT id FROM products WHERE user_id = :user_id AND url = :url',
+        {'user_id': 42, 'url': 'https://www.amazon.sa/dp/B000000042'}
+    ),
+    'verify_email token lookup': (
+        'SELECT id FROM users WHERE verification_token_hash = :token',
+        {'token': 'verify-42'}
+    ),
+    'verify_email prefix fallback': (
+        'SELECT id FROM users WHERE verification_token_prefix_hash = :token',
+        {'token': 'prefix-42'}
+    ),
+    'reset_password token lookup': (
+        'SELECT id FROM users WHERE reset_token = :token',
+        {'token': 'reset-42'}
+    ),
+    'products added since': (
+        'SELECT COUNT(*) FROM products WHERE user_id = :user_id AND created_at >= :since',
+        {'user_id': 42, 'since': datetime(2025, 1, 1)}
+    ),
+    'recent products': (
+        'SELECT id, name FROM products WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 10',
+        {'user_id': 42}
+    ),
+    'dashboard page': (
+        'SELECT id FROM products WHERE user_id = :user_id ORDER BY created_at DESC, id DESC LIMIT 13',
+        {'user_id': 42}
+    ),
+    'dashboard tracked page after cursor': (
+        'SELECT id FROM products WHERE user_id = :user_id AND track_price = :track '
+        'AND (created_at < :created_at OR (created_at = :created_at AND id < :id)) '
+        'ORDER BY created_at DESC, id DESC LIMIT 13',
+        {'user_id': 42, 'track': True, 'created_at': datetime(2025, 1, 2), 'id': 500}
+    ),
+    'average product discount': (
+        'SELECT AVG(discount_pct) FROM products WHERE user_id = :user_id AND discount_pct > 0',
+        {'user_id': 42}
+    ),
+    'unread notifications': (
+        'SELECT id FROM notifications WHERE user_id = :user_id AND read = :read ORDER BY created_at DESC',
+        {'user_id': 42, 'read': False}
+    ),
+    'notification feed page': (
+        'SELECT id FROM notifications WHERE user_id = :user_id ORDER BY created_at DESC, id DESC LIMIT 21',
+        {'user_id': 42}
+    ),
+    'alert policy last alerted price': (
+        'SELECT new_price FROM alert_events WHERE user_id = :user_id AND product_id = :product_id '
+        'ORDER BY created_at DESC LIMIT 1',
+        {'user_id': 42, 'product_id': 42}
+    ),
+    'alert policy user hourly cap': (
+        'SELECT COUNT(id) FROM alert_events WHERE user_id = :user_id AND created_at >= :since',
+        {'user_id': 42, 'since': datetime(2025, 1, 1)}
+    ),
+}
+
+# Bot SQLite database (instance/amazon_tracker.db) uses the legacy `product` table
+BOT_HOT_QUERIES = {
+    'bot duplicate check': (
+        'SELECT id FROM product WHERE user_id = ? AND url = ?',
+        (1, 'https://www.amazon.sa/dp/B000000042')
+    ),
+    'bot products today': (
+        'SELECT COUNT(*) FROM product WHERE user_id = ? AND created_at >= ?',
+        (1, '2025-01-01T00:00:00')
+    ),
+    'bot recent products': (
+        'SELECT id, name FROM product WHERE user_id = ? ORDER BY created_at DESC LIMIT 10',
+        (1,)
+    ),
+    'bot average discount': (
+        'SELECT AVG(discount_pct) FROM product WHERE user_id = ? AND discount_pct > 0',
+        (1,)
+    ),
+}
+
+def seed(engine):
+    """Create the schema from the models and fill it with representative rows"""
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    base = datetime(2025, 1, 1)
+
+    users = [{
+        'id': i,
+        'username': f'user{i}',
+        'email': f'user{i}@example.com',
+        'password_hash': 'x',
+        'verification_token_hash': f'verify-{i}' if i % 3 else None,
+        'verification_token_prefix_hash': f'prefix-{i}' if i % 3 else None,
+        'reset_token': f'reset-{i}' if i % 7 == 0 else None,
+        'unread_notifications': 0,
+    } for i in range(1, NUM_USERS + 1)]
+
+    products = [{
+        'id': i,
+        'name': f'Product {i}',
+        'url': f'https://www.amazon.sa/dp/B{i:09d}',
+        'price': 100.0,
+        'price_history': '[]',
+        'discount_pct': float(i % 40),
+        'track_price': i % 3 != 0,
+        'user_id': (i % NUM_USERS) + 1,
+        'created_at': base + timedelta(minutes=i),
+    } for i in range(1, NUM_PRODUCTS + 1)]
+
+    notifications = [{
+        'id': i,
+        'user_id': (i % NUM_USERS) + 1,
+        'message': f'Price dropped {i}',
+        'read': i % 4 == 0,
+        'created_at': base + timedelta(minutes=i),
+        'notification_type': 'price_drop',
+    } for i in range(1, NUM_NOTIFICATIONS + 1)]
+
+    alert_events = [{
+        'id': i,
+        'user_id': (i % NUM_USERS) + 1,
+        'product_id': (i % NUM_PRODUCTS) + 1,
+        'product_name': f'Product {i}',
+        'old_price': 100.0,
+        'new_price': 90.0,
+        'event_type': 'price_drop',
+        'created_at': base + timedelta(minutes=i),
+        'digest_id': f'digest-{i}',
+    } for i in range(1, NUM_NOTIFICATIONS // 10 + 1)]
+
+    with engine.begin() as conn:
+        conn.execute(db.metadata.tables['users'].insert(), users)
+        conn.execute(db.metadata.tables['products'].insert(), products)
+        conn.execute(db.metadata.tables['notifications'].insert(), notifications)
+        conn.execute(db.metadata.tables['alert_events'].insert(), alert_events)
+        conn.execute(text('ANALYZE'))
+
+def explain(conn, sql, params):
+    """Return the query plan as one lowercase string"""
+    if conn.dialect.name == 'postgresql':
+        rows = conn.execute(text(f'EXPLAIN {sql}'), params).fetchall()
+        return '\n'.join(row[0] for row in rows).lower()
+    rows = conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+    return '\n'.join(row[-1] for row in rows).lower()
+
+def uses_index(plan, dialect):
+    if dialect == 'postgresql':
+        return 'index' in plan and 'seq scan' not in plan
+    # SQLite: every table access must be a SEARCH ... USING INDEX, or a SCAN
+    # that walks an index in order (used for ORDER BY ... LIMIT)
+    for line in plan.splitlines():
+        if line.startswith('scan') and 'using' not in line and 'index' not in line:
+            return False
+    return 'index' in plan
+
+def engines():
+    scratch = os.path.join(_scratch_dir, 'plans.db')
+    urls = [f'sqlite:///{scratch}']
+    if os.environ.get('QUERY_PLAN_PG_URL'):
+        urls.append(os.environ['QUERY_PLAN_PG_URL'])
+    return urls
+
+@pytest.fixture(scope='module', params=engines())
+def seeded_engine(request):
+    engine = create_engine(request.param)
+    seed(engine)
+    yield engine
+    db.metadata.drop_all(engine)
+    engine.dispose()
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(seeded_engine, name):
+    sql, params = HOT_QUERIES[name]
+    with seeded_engine.connect() as conn:
+        plan = explain(conn, sql, params)
+    assert uses_index(plan, seeded_engine.dialect.name), f"{name} does not use an index:\n{plan}"
+
+def test_bot_queries_use_index():
+    amazon_bot_direct = pytest.importorskip('amazon_bot_direct')
+
+    conn = sqlite3.connect(os.path.join(_scratch_dir, 'bot.db'))
+    conn.execute('DROP TABLE IF EXISTS product')
+    conn.execute('''
+        CREATE TABLE product (
+            id INTEGER PRIMARY KEY, url TEXT, name TEXT, custom_name TEXT,
+            current_price REAL, image_url TEXT, price_history TEXT,
+            tracking_enabled BOOLEAN, notify_on_any_change BOOLEAN,
+            last_checked TEXT, user_id INTEGER, created_at TEXT
+        )
+    ''')
+    base = datetime(2025, 1, 1)
+    conn.executemany(
+        'INSERT INTO product (url, name, current_price, price_history, user_id, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(f'https://www.amazon.sa/dp/B{i:09d}', f'Product {i}', 80.0, '[{"price": 100.0}, {"price": 80.0}]',
+          (i % 50) + 1, (base + timedelta(minutes=i)).isoformat()) for i in range(NUM_PRODUCTS // 10)]
+    )
+    for statement in amazon_bot_direct.BOT_DB_INDEXES:
+        conn.execute(statement)
+    # Adds the price columns and their index, and backfills them from price_history
+    amazon_bot_direct.ensure_price_columns(conn)
+    assert conn.execute('SELECT initial_price, lowest_price, discount_pct FROM product LIMIT 1').fetchone() == (100.0, 80.0, 20.0)
+    conn.execute('ANALYZE')
+
+    try:
+        for name, (sql, params) in BOT_HOT_QUERIES.items():
+            plan = '\n'.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)).lower()
+            assert uses_index(plan, 'sqlite'), f"{name} does not use an index:\n{plan}"
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main(['-q', __file__]))
@@ -20,12 +20,10 @@ def test_send_verification_email():
         # Set language for translation context
         g.lang = user.language if user.language else 'ar'
         
-        # Generate test verification token
-        user.verification_token = secrets.token_urlsafe(64)
-        user.verification_token_expiry = datetime.now() + timedelta(days=7)
-        db.session.commit()
+        # Generate test verification token (only its hash is stored on the user)
+        verification_token = user.generate_verification_token()
         
-        print(f"Generated verification token: {user.verification_token[:15]}...")
+        print(f"Generated verification token: {verification_token[:15]}...")
         
         # Create verification link - hardcoded for testing
         timestamp = int(datetime.now().timestamp())
@@ -34,7 +32,7 @@ def test_send_verification_email():
         app.config['PREFERRED_URL_SCHEME'] = 'https'
         
         with app.test_request_context():
-            verification_link = url_for('verify_email', token=user.verification_token, v=timestamp, _external=True)
+            verification_link = url_for('verify_email', token=verification_token, v=timestamp, _external=True)
         
         # Import the function directly from routes
         from app.routes import send_localized_email
@@ -50,6 +48,8 @@ def test_send_verification_email():
         )
         
         if success:
+            # Commits the token and the queued email
+            db.session.commit()
             print(f"Verification email sent successfully to {user.email}")
             print(f"Check your email to find the new orange-branded template")
             print(f"You can verify your email by visiting: {verification_link}")
@@ -145,6 +145,15 @@ translations = {
         'verification_email_body': 'Please verify your email address to activate all features of your ZONAR account.\n\nClick the link below to verify your email:\n{verification_link}\n\nThis link is valid for 7 days.',
         'verification_email_footer': 'If you did not create this account, please ignore this email.\n\nBest regards,\nThe ZONAR Team',
         
+        'price_digest_subject': '📉 {count} price changes on your tracked products',
+        'price_digest_greeting': 'Hello {username},',
+        'price_digest_intro': 'Here is a summary of the price changes we found for your tracked products:',
+        'price_digest_previous': 'Previous',
+        'price_digest_current': 'Current',
+        'price_digest_view': 'View product',
+        'price_digest_notification': '{count} price changes: {summary}',
+        'price_digest_footer': 'We\'ll continue monitoring the prices for you.\n\nBest regards,\nThe ZONAR Team',
+        
         'verification_success': 'Your email has been verified successfully! You can now receive email notifications.',
         'verification_failed': 'Email verification failed. The verification link may be expired or invalid.',
         'verification_required': 'Please verify your email to receive notifications. Check your inbox or request a new verification email.',
@@ -213,6 +222,13 @@ translations = {
         'hunted': 'HUNTED',
         'hunted_tooltip': 'Price has dropped or reached target',
         'price_drop_save': 'Save {amount}',
+        
+        # Product dashboard
+        'load_more': 'Load more',
+        'all_products': 'All products',
+        'sort_newest': 'Newest first',
+        'sort_oldest': 'Oldest first',
+        'no_matching_products': 'No products match these filters',
     },
     'ar': {
         'app_name': 'متتبع أسعار أمازون السعودية',
@@ -385,6 +401,15 @@ translations = {
         'verification_email_body': 'يرجى التحقق من عنوان بريدك الإلكتروني لتفعيل جميع ميزات حساب زونار الخاص بك.\n\nانقر على الرابط أدناه للتحقق من بريدك الإلكتروني:\n{verification_link}\n\nهذا الرابط صالح لمدة 7 أيام.',
         'verification_email_footer': 'إذا لم تقم بإنشاء هذا الحساب، يرجى تجاهل هذا البريد الإلكتروني.\n\nمع أطيب التحيات،\nفريق زونار',
         
+        'price_digest_subject': '📉 {count} تغييرات في أسعار منتجاتك المتتبعة',
+        'price_digest_greeting': 'مرحباً {username}،',
+        'price_digest_intro': 'إليك ملخص تغييرات الأسعار التي وجدناها لمنتجاتك المتتبعة:',
+        'price_digest_previous': 'السابق',
+        'price_digest_current': 'الحالي',
+        'price_digest_view': 'عرض المنتج',
+        'price_digest_notification': '{count} تغييرات في الأسعار: {summary}',
+        'price_digest_footer': 'سنواصل مراقبة الأسعار من أجلك.\n\nمع أطيب التحيات،\nفريق زونار',
+        
         'verification_success': 'تم التحقق من بريدك الإلكتروني بنجاح! يمكنك الآن تلقي إشعارات البريد الإلكتروني.',
         'verification_failed': 'فشل التحقق من البريد الإلكتروني. قد تكون رابط التحقق منتهي الصلاحية أو غير صالح.',
         'verification_required': 'يرجى التحقق من بريدك الإلكتروني لتلقي الإشعارات. تحقق من صندوق الوارد الخاص بك أو اطلب بريد تحقق جديد.',
@@ -448,5 +473,12 @@ translations = {
         'hunted': 'تم اصطياده',
         'hunted_tooltip': 'انخفض السعر أو وصل للهدف',
         'price_drop_save': 'وفر {amount}',
+        
+        # Product dashboard
+        'load_more': 'عرض المزيد',
+        'all_products': 'كل المنتجات',
+        'sort_newest': 'الأحدث أولاً',
+        'sort_oldest': 'الأقدم أولاً',
+        'no_matching_products': 'لا توجد منتجات مطابقة لهذه الفلاتر',
     }
 } 
\ No newline at end of file
@@ -15,10 +15,8 @@ print(f"PYTHONPATH: {os.getenv('PYTHONPATH')}")
 
 from app import app
 
-# Health check endpoint for Render
-@app.route('/health')
-def health_check():
-    return {'status': 'healthy'}, 200
+# /health, /health/live and /health/ready are served by the app package from a
+# background-probed snapshot
 
 if __name__ == '__main__':
     app.run() 
\ No newline at end of file